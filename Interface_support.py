@@ -1,5 +1,5 @@
 import tkinter as tk
-from typing import Union
+from typing import Optional, Union
 
 from constants import TEXT_FONT
 
@@ -76,6 +76,23 @@ class AbstractGrid(tk.Canvas):
         y_pos = row * cell_height + cell_height // 2
         return x_pos, y_pos
 
+    def get_position(self, x: int, y: int) -> Optional[tuple[int, int]]:
+        """ Returns the (row, col) position of the cell containing the given
+            pixel, or None if the pixel is outside the grid.
+
+        Parameters:
+            x: The x pixel position.
+            y: The y pixel position.
+        """
+        rows, cols = self._dimensions
+        cell_width, cell_height = self.get_cell_size()
+        if x < 0 or y < 0 or cell_width == 0 or cell_height == 0:
+            return None
+        row, col = y // cell_height, x // cell_width
+        if row >= rows or col >= cols:
+            return None
+        return row, col
+
     def annotate_position(self, position: tuple[int, int], text: str) -> None:
         """ Annotates the cell at the given (row, col) position with the
             provided text.
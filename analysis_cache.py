@@ -0,0 +1,257 @@
+""" A persistent cache of level analyses, shared between processes.
+
+Analyses of a level (routes, validation, ...) depend only on its content, so
+their results are stored in an SQLite database keyed by the analysis's name and
+version and the level's digest. Bumping an analysis's version when its results
+change makes old results unreachable; they are evicted like any other entry.
+The database is kept under a size limit by evicting the least recently used
+results. Hits are recorded in memory and written in batches (with the next
+store, or every TOUCH_BATCH hits), so readers don't queue for the write lock
+on every hit. Results that can no longer be unpickled are treated as missing
+and deleted.
+
+The database runs in write-ahead logging mode, so any number of processes
+(e.g. the workers of a process pool running over games/) can read while one
+writes, and writers wait their turn rather than failing. Each process opens its
+own connection on first use, so a cache can be passed to, or inherited by,
+worker processes.
+"""
+from __future__ import annotations
+import os
+import pickle
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from constants import *
+
+if TYPE_CHECKING:
+    from game import Level
+
+T = TypeVar('T')
+_MISSING = object() # Stands in for a result that isn't stored
+
+BUSY_TIMEOUT = 30 # Seconds to wait for another process's write to finish
+TOUCH_BATCH = 64 # Hits remembered before their times of use are written
+TOUCH = 'UPDATE results SET used = ? ' \
+    'WHERE analysis = ? AND version = ? AND digest = ?'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    analysis TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (analysis, version, digest)
+);
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+"""
+
+
+class AnalysisCache:
+    """ Results of level analyses, stored on disk and shared between processes.
+    """
+    def __init__(
+        self,
+        path: str = ANALYSIS_CACHE_FILE,
+        max_bytes: int = ANALYSIS_CACHE_BYTES
+    ) -> None:
+        """ Sets up a cache in a database file, which is created on first use.
+
+        Parameters:
+            path: The database file.
+            max_bytes: The most bytes of results to keep.
+        """
+        self._path = path
+        self._max_bytes = max_bytes
+        self._connection = None
+        self._pid = None # The process the connection was opened in
+        self._touched = {} # Maps keys of results hit to when, until written
+
+    def __getstate__(self) -> dict:
+        """ Returns the cache's state without its connection, which can't be
+            sent to another process.
+        """
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_touched'] = {}
+        return state
+
+    def get_path(self) -> str:
+        """ Returns the database file. """
+        return self._path
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Returns this process's connection to the database, opening it (and
+            creating the database) on first use.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self) -> None:
+        """ Closes this process's connection to the database (it is reopened if
+            the cache is used again).
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            self._write_touched(self._connection)
+            self._connection.close()
+        self._connection = None
+
+    def get(
+        self,
+        analysis: str,
+        version: int,
+        digest: str,
+        default: Optional[Any] = None
+    ) -> Optional[Any]:
+        """ Returns a stored result, or default if there isn't one.
+
+        Parameters:
+            analysis: The name of the analysis.
+            version: The version of the analysis that produced the result.
+            digest: The digest of the level analyzed.
+            default: The value to return if no result is stored.
+        """
+        connection = self._connect()
+        key = (analysis, version, digest)
+        row = connection.execute(
+            'SELECT value FROM results '
+            'WHERE analysis = ? AND version = ? AND digest = ?', key
+        ).fetchone()
+        if row is None:
+            return default
+        try:
+            value = pickle.loads(row[0])
+        except Exception: # e.g. a class that has since moved or gone
+            connection.execute(
+                'DELETE FROM results '
+                'WHERE analysis = ? AND version = ? AND digest = ?', key
+            )
+            return default
+        self._touched[key] = time.time_ns()
+        if len(self._touched) >= TOUCH_BATCH:
+            self._write_touched(connection)
+        return value
+
+    def _write_touched(self, connection: sqlite3.Connection) -> None:
+        """ Writes the times of use of the results hit since the last write.
+
+        Parameters:
+            connection: This process's connection to the database.
+        """
+        if not self._touched:
+            return
+        updates = [(used,) + key for key, used in self._touched.items()]
+        self._touched = {}
+        if connection.in_transaction:
+            connection.executemany(TOUCH, updates)
+            return
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(TOUCH, updates)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def put(self, analysis: str, version: int, digest: str, value: Any) -> None:
+        """ Stores a result, evicting the least recently used results if the
+            cache grows beyond its size limit. Results larger than the limit are
+            not stored.
+
+        Parameters:
+            analysis: The name of the analysis.
+            version: The version of the analysis that produced the result.
+            digest: The digest of the level analyzed.
+            value: The result (anything that can be pickled).
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self._max_bytes:
+            return
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._write_touched(connection) # So eviction sees recent hits
+            connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (analysis, version, digest, data, len(data), time.time_ns())
+            )
+            self._evict(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """ Deletes the least recently used results until the rest fit in the
+            size limit. Called inside a write transaction.
+
+        Parameters:
+            connection: This process's connection to the database.
+        """
+        excess = connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results'
+        ).fetchone()[0] - self._max_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key_and_size in connection.execute(
+            'SELECT analysis, version, digest, size FROM results ORDER BY used'
+        ):
+            doomed.append(key_and_size[:3])
+            excess -= key_and_size[3]
+            if excess <= 0:
+                break
+        connection.executemany(
+            'DELETE FROM results '
+            'WHERE analysis = ? AND version = ? AND digest = ?', doomed
+        )
+
+    def get_or_compute(
+        self,
+        analysis: str,
+        version: int,
+        level: Level,
+        compute: Callable[[Level], T]
+    ) -> T:
+        """ Returns the result of an analysis of a level, computing and storing
+            it if it isn't stored already.
+
+        Parameters:
+            analysis: The name of the analysis.
+            version: The version of the analysis.
+            level: The level to analyze.
+            compute: Returns the result for a level (e.g. the analysis itself).
+        """
+        digest = level.get_digest()
+        value = self.get(analysis, version, digest, _MISSING)
+        if value is _MISSING:
+            value = compute(level)
+            self.put(analysis, version, digest, value)
+        return value
+
+    def get_size(self) -> int:
+        """ Returns the number of bytes of results stored. """
+        return self._connect().execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results'
+        ).fetchone()[0]
+
+    def get_num_results(self) -> int:
+        """ Returns the number of results stored. """
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM results'
+        ).fetchone()[0]
+
+    def clear(self) -> None:
+        """ Deletes every stored result. """
+        self._touched = {}
+        self._connect().execute('DELETE FROM results')
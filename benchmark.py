@@ -0,0 +1,429 @@
+""" Benchmarks for the main game operations on generated mazes of increasing
+size and on the bundled games.
+
+Usage:
+    python benchmark.py [--sizes 10 100 1000] [--save PATH]
+                        [--compare PATH] [--threshold 0.2]
+
+Results are seconds per operation. With --compare, any benchmark that is slower
+than the baseline by more than the threshold is reported as a regression and
+the exit status is 1.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import deque
+from time import perf_counter
+from typing import Callable, Optional
+
+from game import load_game, Maze, Model, TextInterface
+from corridor import CorridorGraph
+from hpa import HierarchicalPathService
+from pathfinding import cell_costs, distance_field, BLOCKED
+from reachability import Bitboard, validate_level
+from constants import *
+
+DEFAULT_SIZES = (10, 100, 500, 1000, 2000, 4000)
+BUNDLED_GAMES = 'games/*.txt'
+NUM_MOVES = 2000
+MIN_TIME = 0.2 # Minimum seconds to spend timing each benchmark
+TK_MAX_CELLS = 200 * 200 # Larger mazes are too slow to draw on a Tk canvas
+
+
+def generate_maze(rows: int, cols: int, seed: int = 0) -> list[str]:
+    """ Generates the rows of a random maze level. The maze is a perfect maze
+        with some extra openings, sprinkled with lava, coins and consumables.
+        The player starts on the left edge and the door is on the right edge.
+
+    Parameters:
+        rows: The number of rows in the maze (at least 5).
+        cols: The number of columns in the maze (at least 5).
+        seed: The seed for the random generator.
+    """
+    rng = random.Random(seed)
+    grid = [bytearray(WALL * cols, 'ascii') for _ in range(rows)]
+    cell_rows, cell_cols = (rows - 1) // 2, (cols - 1) // 2
+
+    # Carve a perfect maze with an iterative depth first search over the cells
+    # at odd (row, column) positions
+    visited = [bytearray(cell_cols) for _ in range(cell_rows)]
+    stack = [(0, 0)]
+    visited[0][0] = 1
+    grid[1][1] = ord(EMPTY)
+    while stack:
+        row, col = stack[-1]
+        neighbours = [
+            (row + d_row, col + d_col)
+            for d_row, d_col in MOVE_DELTAS.values()
+            if 0 <= row + d_row < cell_rows and 0 <= col + d_col < cell_cols
+            and not visited[row + d_row][col + d_col]
+        ]
+        if not neighbours:
+            stack.pop()
+            continue
+        next_row, next_col = rng.choice(neighbours)
+        visited[next_row][next_col] = 1
+        grid[row + next_row + 1][col + next_col + 1] = ord(EMPTY)
+        grid[2 * next_row + 1][2 * next_col + 1] = ord(EMPTY)
+        stack.append((next_row, next_col))
+
+    # Knock through some extra walls so there are loops, then scatter entities
+    for row in range(1, rows - 1):
+        line = grid[row]
+        for col in range(1, cols - 1):
+            roll = rng.random()
+            if line[col] == ord(WALL):
+                if roll < 0.05 and (row % 2 == 1) != (col % 2 == 1):
+                    line[col] = ord(EMPTY)
+            elif roll < 0.02:
+                line[col] = ord(LAVA)
+            elif roll < 0.03:
+                line[col] = ord(COIN)
+            elif roll < 0.035:
+                line[col] = ord(rng.choice((APPLE, HONEY, WATER, POTION)))
+
+    door_row = 2 * (cell_rows - 1) + 1
+    for col in range(2 * (cell_cols - 1) + 1, cols - 1):
+        grid[door_row][col] = ord(EMPTY)
+    grid[door_row][cols - 1] = ord(DOOR)
+    grid[1][0] = ord(PLAYER)
+    return [line.decode('ascii') for line in grid]
+
+
+def write_game(path: str, levels: list[list[str]]) -> None:
+    """ Writes levels to a game file in the format read by load_game.
+
+    Parameters:
+        path: The file to write.
+        levels: The rows of each level, in order.
+    """
+    with open(path, 'w') as file:
+        for num, rows in enumerate(levels, start=1):
+            file.write(f'Maze {num} - {len(rows)} {len(rows[0])}\n')
+            file.write('\n'.join(rows))
+            file.write('\n\n')
+
+
+def _time(func: Callable[[], object]) -> float:
+    """ Returns the best time (in seconds) for one call of func. Fast functions
+        are called in batches until MIN_TIME has passed.
+
+    Parameters:
+        func: The operation to time.
+    """
+    best, spent, number = None, 0.0, 1
+    while spent < MIN_TIME:
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = perf_counter() - start
+        spent += elapsed
+        best = elapsed / number if best is None else min(best, elapsed / number)
+        if elapsed < MIN_TIME / 10:
+            number *= 10
+    return best
+
+
+def _random_moves(num_moves: int, seed: int = 0) -> list[tuple[int, int]]:
+    """ Returns a repeatable sequence of random move deltas.
+
+    Parameters:
+        num_moves: The number of moves to generate.
+        seed: The seed for the random generator.
+    """
+    rng = random.Random(seed)
+    deltas = list(MOVE_DELTAS.values())
+    return [rng.choice(deltas) for _ in range(num_moves)]
+
+
+def bench_load_game(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times parsing the game file. """
+    return {'load_game': _time(lambda: load_game(game_file))}
+
+
+def bench_model(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times constructing a Model from the game file. """
+    return {'Model': _time(lambda: Model(game_file))}
+
+
+def bench_move_player(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times a random walk of moves, reporting the time per move. """
+    moves = _random_moves(NUM_MOVES)
+    best = None
+    for _ in range(3):
+        model = Model(game_file)
+        start = perf_counter()
+        num_done = 0
+        for delta in moves:
+            model.move_player(delta)
+            num_done += 1
+            if model.has_won():
+                break
+        elapsed = (perf_counter() - start) / num_done
+        best = elapsed if best is None else min(best, elapsed)
+    return {'move_player': best}
+
+
+def bench_unlock_door(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times attempting to unlock the door, with and without coins left. A
+        level's doors only unlock once, so without coins each attempt is made
+        on a fresh copy of the level, and the time to copy it is taken off.
+    """
+    level = load_game(game_file)[0]
+    results = {'attempt_unlock_door[coins]': _time(level.attempt_unlock_door)}
+    for position, item in list(level.get_items().items()):
+        if item.get_id() == COIN:
+            level.remove_item(position)
+    unlock = _time(lambda: level.copy().attempt_unlock_door())
+    results['attempt_unlock_door[no coins]'] = \
+        max(0.0, unlock - _time(level.copy))
+    return results
+
+
+def bench_text_draw(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times a full TextInterface draw, discarding the output. """
+    model = Model(game_file)
+    view = TextInterface()
+
+    def draw():
+        with contextlib.redirect_stdout(io.StringIO()):
+            view.draw(
+                model.get_current_maze(),
+                model.get_current_items(),
+                model.get_player().get_position(),
+                model.get_player_inventory(),
+                model.get_player_stats()
+            )
+    return {'TextInterface.draw': _time(draw)}
+
+
+def bench_level_views(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times LevelView and ImageLevelView draws on an offscreen Tk root. """
+    model = Model(game_file)
+    rows, cols = model.get_current_maze().get_dimensions()
+    if tk_root is None or rows * cols > TK_MAX_CELLS:
+        return {}
+    try:
+        import interface
+    except ImportError as error:
+        print(f'Skipping Tk views: {error}', file=sys.stderr)
+        return {}
+
+    results = {}
+    for view_class in (interface.LevelView, interface.ImageLevelView):
+        view = view_class(tk_root, (rows, cols), (MAZE_WIDTH, MAZE_HEIGHT))
+        draw = lambda: view.draw(
+            model.get_current_maze().get_tiles(),
+            model.get_entities_in_rect,
+            model.get_player().get_position()
+        )
+        try:
+            results[f'{view_class.__name__}.draw'] = _time(draw)
+        except ImportError as error:
+            print(f'Skipping {view_class.__name__}: {error}', file=sys.stderr)
+        view.destroy()
+    return results
+
+
+def bench_corridor_graph(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times compressing the first level into its corridor graph, and a
+        distance query across the level on the graph and on every cell.
+    """
+    level = load_game(game_file)[0]
+    graph = CorridorGraph(level)
+    start = level.get_player_start()
+    doors = level.get_maze().get_doors()
+    target = next(position for position in map(
+        graph.get_position, reversed(range(graph.get_num_nodes()))
+    ) if position not in doors)
+    costs = cell_costs(level.get_maze())
+    dimensions = level.get_dimensions()
+    index = target[0] * dimensions[1] + target[1]
+    return {
+        'CorridorGraph': _time(lambda: CorridorGraph(level)),
+        'CorridorGraph.get_distance':
+            _time(lambda: graph.get_distance(start, target)),
+        'distance_field': _time(lambda: distance_field(costs, dimensions, index)),
+    }
+
+
+def bench_hierarchical_paths(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times placing the first level's cluster transitions, and a path across
+        the level once the paths inside every cluster are known.
+    """
+    level = load_game(game_file)[0]
+    service = HierarchicalPathService(level)
+    service.prepare()
+    start = level.get_player_start()
+    rows, cols = level.get_dimensions()
+    costs = cell_costs(level.get_maze())
+    doors = level.get_maze().get_doors()
+    target = next(divmod(index, cols) for index in reversed(range(rows * cols))
+                  if costs[index] != BLOCKED and divmod(index, cols) not in doors)
+    return {
+        'HierarchicalPathService': _time(lambda: HierarchicalPathService(level)),
+        'HierarchicalPathService.find_path':
+            _time(lambda: service.find_path(start, target)),
+    }
+
+
+def _bfs_reachable(maze: Maze, start: tuple[int, int]) -> set[tuple[int, int]]:
+    """ Returns the positions reachable from a start position, found a cell at
+        a time (the baseline for Bitboard.flood).
+
+    Parameters:
+        maze: The maze to search.
+        start: The (row, column) position to start from.
+    """
+    rows, cols = maze.get_dimensions()
+    reached = {start}
+    queue = deque([start])
+    while queue:
+        row, col = queue.popleft()
+        for d_row, d_col in MOVE_DELTAS.values():
+            position = (row + d_row, col + d_col)
+            if 0 <= position[0] < rows and 0 <= position[1] < cols \
+                    and position not in reached \
+                    and not maze.get_tile(position).is_blocking():
+                reached.add(position)
+                queue.append(position)
+    return reached
+
+
+def bench_reachability(game_file: str, tk_root: Optional[object]) -> dict:
+    """ Times a flood fill from the player's start on the first level, on
+        bitboards and by breadth first search, and validating the level.
+    """
+    level = load_game(game_file)[0]
+    maze = level.get_maze()
+    start = level.get_player_start()
+    board = Bitboard(maze)
+    return {
+        'Bitboard': _time(lambda: Bitboard(maze)),
+        'Bitboard.flood_from': _time(lambda: board.flood_from(start)),
+        'breadth first search': _time(lambda: _bfs_reachable(maze, start)),
+        'validate_level': _time(lambda: validate_level(level)),
+    }
+
+
+BENCHMARKS = [
+    bench_load_game,
+    bench_model,
+    bench_move_player,
+    bench_unlock_door,
+    bench_text_draw,
+    bench_level_views,
+    bench_corridor_graph,
+    bench_hierarchical_paths,
+    bench_reachability,
+]
+
+
+def _create_tk_root() -> Optional[object]:
+    """ Returns a hidden Tk root for the view benchmarks, or None if Tk (or a
+        display) isn't available.
+    """
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as error: # e.g. tkinter.TclError when there's no display
+        print(f'Skipping Tk views: {error}', file=sys.stderr)
+        return None
+    root.withdraw()
+    return root
+
+
+def run(sizes: list[int], games: list[str]) -> dict[str, float]:
+    """ Runs every benchmark on generated mazes of the given sizes and on the
+        given game files.
+
+    Parameters:
+        sizes: The side lengths of the square mazes to generate.
+        games: Paths to existing game files.
+
+    Returns:
+        A mapping from benchmark names to seconds per operation.
+    """
+    results = {}
+    tk_root = _create_tk_root()
+    with tempfile.TemporaryDirectory() as directory:
+        targets = []
+        for size in sizes:
+            path = os.path.join(directory, f'generated{size}.txt')
+            write_game(path, [generate_maze(size, size, seed=size)])
+            targets.append((f'{size}x{size}', path))
+        targets.extend((os.path.basename(game), game) for game in games)
+
+        for label, game_file in targets:
+            for benchmark in BENCHMARKS:
+                for name, seconds in benchmark(game_file, tk_root).items():
+                    key = f'{name} {label}'
+                    results[key] = seconds
+                    print(f'{key:50} {seconds * 1e6:14.2f} us', flush=True)
+    if tk_root is not None:
+        tk_root.destroy()
+    return results
+
+
+def compare(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    threshold: float
+) -> list[str]:
+    """ Returns a description of every result slower than its baseline by more
+        than threshold (a fraction, e.g. 0.2 for 20%).
+
+    Parameters:
+        results: The results of this run.
+        baseline: Previously saved results.
+        threshold: The allowed slowdown.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        previous = baseline.get(name)
+        if previous and seconds > previous * (1 + threshold):
+            regressions.append(
+                f'{name}: {previous * 1e6:.2f} us -> {seconds * 1e6:.2f} us '
+                f'(+{(seconds / previous - 1) * 100:.0f}%)'
+            )
+    return regressions
+
+
+def main():
+    """ Runs the benchmarks from the command line. """
+    parser = argparse.ArgumentParser(description='Benchmark MazeRunner.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES,
+                        help='side lengths of the generated mazes')
+    parser.add_argument('--no-bundled', action='store_true',
+                        help=f'skip the bundled {BUNDLED_GAMES} games')
+    parser.add_argument('--save', help='write the results to a JSON baseline')
+    parser.add_argument('--compare', help='compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    games = [] if args.no_bundled else sorted(glob.glob(BUNDLED_GAMES))
+    results = run(args.sizes, games)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
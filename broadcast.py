@@ -0,0 +1,418 @@
+""" Spectators watching live games.
+
+A Broadcaster follows one game through its model's change events. At the end of
+each turn it encodes what changed once, as a compact JSON line, and offers the
+same bytes to every viewer's bounded queue:
+
+    q: turn number                  p: player [row, column]
+    r: [[row, column]] of collected items
+    u: 1 if the door was unlocked   s: [HP, hunger, thirst]
+    l: the new level, after levelling up
+    w: 1 if the game was won        x: 1 if the game was lost
+    en: [[row, column]] of the enemies, when they move or appear
+
+Every KEYFRAME_INTERVAL turns a keyframe (k: 1) restates the player, stats,
+door, enemies and the items collected so far in the level, without the maze
+itself. A viewer
+that joins late, or falls so far behind that its queue fills up, is sent the
+level as it was when it started (encoded once per level) and the latest
+keyframe instead of the deltas it missed, so the broadcaster never waits for a
+slow viewer and its cost per turn does not depend on the maze size.
+
+Players connect to the game server as usual and are told their session id.
+Spectators connect to the spectator port and send the id of the session to
+watch.
+
+Usage:
+    python broadcast.py GAME_FILE [--host HOST] [--port PORT]
+                        [--spectator-port PORT]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+from typing import Optional
+
+from game import (Level, Model, ModelEvent, PlayerMoved, ItemCollected,
+                  DoorUnlocked, StatsChanged, LevelChanged)
+from server import (encode_level, encode_enemies, Session, GameServer, DEFAULT_HOST,
+                    DEFAULT_PORT, BACKLOG, _encode)
+from constants import *
+
+DEFAULT_SPECTATOR_PORT = 8766
+KEYFRAME_INTERVAL = 50 # Turns between keyframes
+VIEWER_QUEUE_SIZE = 64 # Messages a viewer can fall behind before resyncing
+
+
+class Viewer:
+    """ One spectator's queue of encoded messages. """
+    def __init__(self, max_queued: int = VIEWER_QUEUE_SIZE) -> None:
+        """ Sets up an empty queue.
+
+        Parameters:
+            max_queued: The number of messages that can wait to be read.
+        """
+        self._queue = asyncio.Queue(max_queued)
+        self._num_resyncs = 0
+
+    async def get(self) -> bytes:
+        """ Returns the next message, waiting for one if necessary. Returns b''
+            once the broadcast has ended.
+        """
+        return await self._queue.get()
+
+    def get_num_resyncs(self) -> int:
+        """ Returns the number of times this viewer fell behind and skipped to
+            a keyframe.
+        """
+        return self._num_resyncs
+
+    def offer(self, message: bytes) -> bool:
+        """ Queues a message unless the queue is full.
+
+        Parameters:
+            message: The encoded message.
+
+        Returns:
+            True iff the message was queued.
+        """
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def reset(self, message: bytes) -> None:
+        """ Drops every queued message and queues one in their place.
+
+        Parameters:
+            message: The encoded message that replaces the queued ones.
+        """
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(message)
+        self._num_resyncs += 1
+
+
+class Broadcaster:
+    """ Encodes each turn of a game once and fans it out to viewers. """
+    def __init__(
+        self,
+        model: Model,
+        keyframe_interval: int = KEYFRAME_INTERVAL,
+        max_queued: int = VIEWER_QUEUE_SIZE
+    ) -> None:
+        """ Starts following a game that has not been played yet.
+
+        Parameters:
+            model: The game to broadcast.
+            keyframe_interval: The number of turns between keyframes.
+            max_queued: The number of messages each viewer can fall behind.
+        """
+        self._model = model
+        self._keyframe_interval = keyframe_interval
+        self._max_queued = max_queued
+        self._viewers = []
+        self._turn = 0
+        self._level_num = 0
+        self._level_line = _encode({'l': encode_level(model.get_level(), 0)})
+        self._position = model.get_player().get_position()
+        self._stats = model.get_player_stats()
+        self._enemies = encode_enemies(model)
+        self._removed = [] # Items collected in the current level
+        self._unlocked = False
+        self._over = False
+        self._delta = {}
+        self._keyframe = None # The encoded keyframe for self._turn, once built
+        model.subscribe(self._handle_event)
+
+    def _handle_event(self, event: ModelEvent) -> None:
+        """ Records a change to the game in the current turn's delta.
+
+        Parameters:
+            event: The change made to the model.
+        """
+        delta = self._delta
+        if isinstance(event, PlayerMoved):
+            self._position = event.position
+            delta['p'] = list(event.position)
+        elif isinstance(event, ItemCollected):
+            self._removed.append(event.position)
+            delta.setdefault('r', []).append(list(event.position))
+        elif isinstance(event, DoorUnlocked):
+            self._unlocked = True
+            delta['u'] = 1
+        elif isinstance(event, StatsChanged):
+            self._stats = event.stats
+            delta['s'] = list(event.stats)
+        elif isinstance(event, LevelChanged):
+            if event.level is None:
+                delta['w'] = 1
+                return
+            # The new level is sent whole, so the old level's changes are moot
+            level = encode_level(event.level, event.level_num)
+            self._level_num = event.level_num
+            self._level_line = _encode({'l': level})
+            self._removed = []
+            self._unlocked = False
+            delta.pop('r', None)
+            delta.pop('u', None)
+            delta['l'] = level
+
+    def subscribe(self) -> Viewer:
+        """ Returns a new viewer, already sent the current level and state. """
+        viewer = Viewer(self._max_queued)
+        viewer.offer(self._get_sync())
+        self._viewers.append(viewer)
+        return viewer
+
+    def unsubscribe(self, viewer: Viewer) -> None:
+        """ Stops sending messages to a viewer (if the broadcast has not already
+            ended).
+
+        Parameters:
+            viewer: A viewer returned by subscribe.
+        """
+        if viewer in self._viewers:
+            self._viewers.remove(viewer)
+
+    def get_num_viewers(self) -> int:
+        """ Returns the number of viewers subscribed. """
+        return len(self._viewers)
+
+    def _get_keyframe(self) -> bytes:
+        """ Returns the encoded keyframe for the current turn, building it on
+            first use.
+        """
+        if self._keyframe is None:
+            keyframe = {
+                'k': 1,
+                'q': self._turn,
+                'n': self._level_num,
+                'p': list(self._position),
+                's': list(self._stats),
+                'r': [list(position) for position in self._removed],
+            }
+            if self._enemies:
+                keyframe['en'] = self._enemies
+            if self._unlocked:
+                keyframe['u'] = 1
+            self._keyframe = _encode(keyframe)
+        return self._keyframe
+
+    def _get_sync(self) -> bytes:
+        """ Returns everything a viewer needs to catch up: the current level as
+            it started and the latest keyframe.
+        """
+        return self._level_line + self._get_keyframe()
+
+    def publish(self) -> Optional[bytes]:
+        """ Ends the turn, sending what changed during it (and a keyframe, every
+            keyframe_interval turns) to every viewer. Viewers whose queues are
+            full are resynced instead.
+
+        Returns:
+            The encoded delta, or None if nothing changed.
+        """
+        if self._over:
+            return None
+        delta = self._delta
+        if 'w' not in delta:
+            # Enemies move without events, so their positions are compared
+            enemies = encode_enemies(self._model)
+            if enemies != self._enemies or ('l' in delta and enemies):
+                self._enemies = delta['en'] = enemies
+            if self._model.has_lost():
+                delta['x'] = 1
+        if not delta:
+            return None
+        self._over = 'w' in delta or 'x' in delta
+        self._turn += 1
+        self._keyframe = None
+        delta['q'] = self._turn
+        self._delta = {}
+
+        message = _encode(delta)
+        if self._turn % self._keyframe_interval == 0:
+            message += self._get_keyframe()
+        for viewer in self._viewers:
+            if not viewer.offer(message):
+                viewer.reset(self._get_sync())
+        if self._over:
+            self.close()
+        return message
+
+    def close(self) -> None:
+        """ Ends the broadcast, telling every viewer (after the messages they
+            have queued) and stopping following the game.
+        """
+        self._model.unsubscribe(self._handle_event)
+        self._over = True
+        for viewer in self._viewers:
+            if not viewer.offer(b''):
+                viewer.reset(b'')
+        self._viewers = []
+
+
+async def stream_to(viewer: Viewer, writer: asyncio.StreamWriter) -> None:
+    """ Writes a viewer's messages to a connection until the broadcast ends.
+        Waiting for the connection to drain is what lets a slow spectator's
+        queue fill up, so it resyncs instead of holding up the game.
+
+    Parameters:
+        viewer: The viewer to stream.
+        writer: The connection to the spectator.
+    """
+    while True:
+        message = await viewer.get()
+        if not message:
+            break
+        writer.write(message)
+        await writer.drain()
+
+
+class BroadcastSession(Session):
+    """ A session whose turns are broadcast to spectators. """
+    def __init__(
+        self,
+        game_file: str,
+        session_id: int,
+        templates: Optional[list[Level]] = None
+    ) -> None:
+        """ Starts a new game and its broadcast.
+
+        Parameters:
+            game_file: The file containing the levels for this game.
+            session_id: The id spectators use to watch this session.
+            templates: Levels already loaded from game_file to copy.
+        """
+        super().__init__(game_file, templates)
+        self._id = session_id
+        self._broadcaster = Broadcaster(self._model)
+
+    def get_id(self) -> int:
+        """ Returns the id spectators use to watch this session. """
+        return self._id
+
+    def get_broadcaster(self) -> Broadcaster:
+        """ Returns the broadcaster spectators subscribe to. """
+        return self._broadcaster
+
+    def get_state(self) -> dict:
+        """ Returns the full state of the game, with the session's id. """
+        state = super().get_state()
+        state['id'] = self._id
+        return state
+
+    def handle_command(self, command: str) -> dict:
+        """ Applies a command from the client, broadcasts what changed and
+            returns the client's delta.
+
+        Parameters:
+            command: 'w', 'a', 's', 'd', a string of moves or 'i <item name>'.
+        """
+        delta = super().handle_command(command)
+        self._broadcaster.publish()
+        return delta
+
+
+class BroadcastServer(GameServer):
+    """ A game server whose sessions can be watched by spectators. """
+    def __init__(self, game_file: str) -> None:
+        """ Parses the game's levels once for every session to copy.
+
+        Parameters:
+            game_file: The file containing the levels for the game.
+        """
+        super().__init__(game_file)
+        self._sessions = {} # Maps session ids to the sessions being played
+        self._next_id = 0
+
+    def _start_session(self) -> BroadcastSession:
+        """ Returns a new session, registered for spectators to watch. """
+        self._next_id += 1
+        session = BroadcastSession(self._game_file, self._next_id,
+                                   self._templates)
+        self._sessions[self._next_id] = session
+        return session
+
+    def _end_session(self, session: BroadcastSession) -> None:
+        """ Ends a session's broadcast.
+
+        Parameters:
+            session: The session whose connection closed.
+        """
+        self._sessions.pop(session.get_id(), None)
+        session.get_broadcaster().close()
+        super()._end_session(session)
+
+    async def handle_spectator(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """ Streams a session to a spectator, who first sends its id.
+
+        Parameters:
+            reader: The stream holding the id of the session to watch.
+            writer: The stream of levels, deltas and keyframes to the spectator.
+        """
+        try:
+            line = await reader.readline()
+            session = self._sessions.get(int(line)) if line.strip().isdigit() \
+                else None
+            if session is None:
+                writer.write(_encode({'e': 'No such session'}))
+                await writer.drain()
+                return
+            broadcaster = session.get_broadcaster()
+            viewer = broadcaster.subscribe()
+            try:
+                await stream_to(viewer, writer)
+            finally:
+                broadcaster.unsubscribe(viewer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        spectator_port: int = DEFAULT_SPECTATOR_PORT
+    ) -> None:
+        """ Accepts players and spectators until cancelled.
+
+        Parameters:
+            host: The address to listen on.
+            port: The port players connect to.
+            spectator_port: The port spectators connect to.
+        """
+        spectators = await asyncio.start_server(
+            self.handle_spectator, host, spectator_port, backlog=BACKLOG
+        )
+        async with spectators:
+            await super().serve(host, port)
+
+
+def main():
+    """ Runs a game server with spectators from the command line. """
+    parser = argparse.ArgumentParser(
+        description='Host MazeRunner sessions that spectators can watch.'
+    )
+    parser.add_argument('game_file')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--spectator-port', type=int,
+                        default=DEFAULT_SPECTATOR_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(BroadcastServer(args.game_file).serve(
+            args.host, args.port, args.spectator_port
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+""" An index of the game files in a directory.
+
+The catalog records each game's level count, level dimensions, coin and item
+counts and a content hash in a JSON index file kept next to the games. Updating
+the catalog only rescans files whose modification time or size has changed, so
+pickers can list and filter thousands of games without parsing any of them.
+
+Usage:
+    python catalog.py [DIRECTORY] [FILTER]
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sys
+from typing import Optional
+
+from game import Maze
+from constants import *
+
+INDEX_VERSION = 2
+NON_ITEMS = set(Maze.TILES) | {PLAYER, ENEMY}
+
+
+def scan_game(path: str) -> dict:
+    """ Returns the catalog entry for a game file, read in a single pass over
+        its text without building any levels.
+
+    Parameters:
+        path: The path to the game file.
+    """
+    digest = hashlib.sha256()
+    levels = []
+    with open(path, 'rb') as file:
+        for raw_line in file:
+            digest.update(raw_line)
+            line = raw_line.decode().strip()
+            if line.startswith('Maze'):
+                _, _, dimensions = line[5:].partition(' - ')
+                levels.append({
+                    'dimensions': [int(item) for item in dimensions.split()],
+                    'coins': 0,
+                    'items': {},
+                })
+            elif len(line) > 0 and len(levels) > 0:
+                items = levels[-1]['items']
+                for char in set(line) - NON_ITEMS:
+                    items[char] = items.get(char, 0) + line.count(char)
+
+    for level in levels:
+        level['coins'] = level['items'].pop(COIN, 0)
+    stat = os.stat(path)
+    return {
+        'name': os.path.basename(path),
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'hash': digest.hexdigest(),
+        'levels': levels,
+    }
+
+
+class Catalog:
+    """ The games in a directory, indexed in a JSON file that is updated
+        incrementally.
+    """
+    def __init__(
+        self,
+        directory: str = GAMES_DIRECTORY,
+        index_path: Optional[str] = None
+    ) -> None:
+        """ Loads the index for a directory (without updating it).
+
+        Parameters:
+            directory: The directory containing the game files.
+            index_path: The index file (default: CATALOG_FILE in directory).
+        """
+        self._directory = directory
+        self._index_path = index_path or os.path.join(directory, CATALOG_FILE)
+        self._entries = {} # Maps game file names to their entries
+        try:
+            with open(self._index_path) as file:
+                index = json.load(file)
+            if index.get('version') == INDEX_VERSION:
+                self._entries = index['games']
+        except (OSError, ValueError, KeyError):
+            pass # A missing or unreadable index is rebuilt by update
+
+    def get_directory(self) -> str:
+        """ Returns the directory this catalog indexes. """
+        return self._directory
+
+    def update(self) -> int:
+        """ Rescans new and modified game files, drops deleted ones and saves
+            the index if anything changed.
+
+        Returns:
+            The number of files that were (re)scanned.
+        """
+        entries = {}
+        num_scanned = 0
+        with os.scandir(self._directory) as directory:
+            for entry in directory:
+                if not entry.name.endswith(GAME_EXTENSION) \
+                        or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                old = self._entries.get(entry.name)
+                if old is not None and old['mtime'] == stat.st_mtime_ns \
+                        and old['size'] == stat.st_size:
+                    entries[entry.name] = old
+                    continue
+                try:
+                    entries[entry.name] = scan_game(entry.path)
+                    num_scanned += 1
+                except (OSError, ValueError):
+                    pass # Not a readable game file
+
+        if num_scanned or entries.keys() != self._entries.keys():
+            self._entries = entries
+            self._save()
+        return num_scanned
+
+    def _save(self) -> None:
+        """ Writes the index, replacing the old one atomically. If it can't be
+            written (e.g. the directory is read-only or the disk is full), the
+            index is only kept in memory.
+        """
+        temp_path = self._index_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump({'version': INDEX_VERSION, 'games': self._entries},
+                          file)
+            os.replace(temp_path, self._index_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass # It was never created
+
+    def get_path(self, name: str) -> str:
+        """ Returns the path to a game file in the catalog.
+
+        Parameters:
+            name: The file name of the game.
+        """
+        return os.path.join(self._directory, name)
+
+    def get_games(self, text: str = '') -> list[dict]:
+        """ Returns the entries of the games whose names contain the given text
+            (ignoring case), sorted by name.
+
+        Parameters:
+            text: The text to filter by.
+        """
+        text = text.lower()
+        return [self._entries[name] for name in sorted(self._entries)
+                if text in name.lower()]
+
+
+def describe_game(entry: dict) -> str:
+    """ Returns a one line summary of a catalog entry.
+
+    Parameters:
+        entry: The catalog entry of a game.
+    """
+    levels = entry['levels']
+    sizes = ', '.join('x'.join(str(size) for size in level['dimensions'])
+                      for level in levels[:3])
+    if len(levels) > 3:
+        sizes += ', ...'
+    coins = sum(level['coins'] for level in levels)
+    return f"{entry['name']} - {len(levels)} levels ({sizes}), {coins} coins"
+
+
+def main():
+    """ Updates the catalog of a directory and lists its (filtered) games. """
+    directory = sys.argv[1] if len(sys.argv) > 1 else GAMES_DIRECTORY
+    catalog = Catalog(directory)
+    catalog.update()
+    for entry in catalog.get_games(sys.argv[2] if len(sys.argv) > 2 else ''):
+        print(describe_game(entry))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@ WATER = 'W'
 # Masters entities
 CANDY = 'S'
 LAVA_SHOES = 'J'
+ENEMY = 'X'
 
 APPLE_AMOUNT = -1
 HONEY_AMOUNT = -5
@@ -41,6 +42,71 @@ MAX_HUNGER = 10
 MAX_THIRST = 10
 LAVA_DAMAGE = 5
 
+# Hunger and thirst go up on every STATS_TICK-th move of the game
+STATS_TICK = 5
+
+# Number of moves the timed effects of candy and lava shoes last
+CANDY_DURATION = 10
+LAVA_SHOES_DURATION = 10
+
+# Damage done by an enemy reaching the player, and how far (in path cost)
+# enemies can see the player from
+ENEMY_DAMAGE = 10
+ENEMY_SIGHT = 30
+
+# Side length (in cells) of the square buckets used to index level items
+ITEM_BUCKET_SIZE = 32
+
+# Chunked (disk-backed) maze storage
+MAZE_CHUNK_SIZE = 64
+MAZE_CACHE_BYTES = 16 * 1024 * 1024
+
+# Larger mazes are played without a precomputed move table
+MOVE_TABLE_MAX_CELLS = 1_000_000
+
+# Click-to-walk: distance fields cached per level, and ms between walked steps
+PATH_CACHE_SIZE = 8
+WALK_DELAY = 60
+
+# Levels parsed ahead of the one being played, and cell sizes to keep resized
+# images for
+PREFETCH_LEVELS = 1
+SPRITE_CACHE_SIZES = 4
+IMAGES_DIRECTORY = 'images'
+
+# Texture atlas of every sprite pre-scaled to each size (in pixels)
+ATLAS_SIZES = (16, 24, 32, 48, 64, 96, 128)
+ATLAS_IMAGE = 'atlas.png'
+ATLAS_INDEX = 'atlas.json'
+
+# Cell sizes (in pixels) the level view zooms between, beyond fitting the whole
+# maze. These are the atlas sizes, so zooming never resamples a sprite.
+ZOOM_SIZES = ATLAS_SIZES
+ZOOM_IN_KEYS = '+='
+ZOOM_OUT_KEYS = '-_'
+
+# Number of levels whose corridor graphs are kept
+CORRIDOR_CACHE_SIZE = 16
+
+# Hierarchical pathfinding: the side length of a cluster, the width from which
+# an entrance between clusters gets a transition at each end instead of one in
+# the middle, and the number of cells from which levels use it at all
+HPA_CLUSTER_SIZE = 16
+HPA_WIDE_ENTRANCE = 6
+HPA_MIN_CELLS = 250_000
+
+# Milliseconds per frame of a replayed game saved as an animation
+FRAME_DURATION = 100
+
+# Persistent cache of level analyses, shared by processes, and its size limit
+ANALYSIS_CACHE_FILE = '.analysis_cache.sqlite'
+ANALYSIS_CACHE_BYTES = 64 * 1024 * 1024
+
+# Game catalog used by the New Game picker
+GAMES_DIRECTORY = 'games'
+GAME_EXTENSION = '.txt'
+CATALOG_FILE = '.catalog.json'
+
 WIN_MESSAGE = 'Congratulations! You have finished all levels and won the game!'
 LOSS_MESSAGE = 'You lose :('
 ITEM_UNAVAILABLE_MESSAGE = '\nYou don\'t have any of that item!\n'
@@ -65,6 +131,7 @@ ENTITY_COLOURS = {
     PLAYER: 'pink',
     CANDY: 'pink',
     LAVA_SHOES: 'orange',
+    ENEMY: 'red',
 }
 
 THEME_COLOUR = '#C1E1C1'
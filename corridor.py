@@ -0,0 +1,443 @@
+""" Mazes compressed into graphs of the cells where something can happen.
+
+Most open cells of a maze are corridor cells: they have exactly two open
+neighbours, so a path entering one has only one way to leave. A CorridorGraph
+keeps only the other cells as nodes (junctions, dead ends, item cells, the
+player's start and the doors) and joins nodes that are linked by a corridor
+with an edge holding the number of steps along it and the lava damage taken.
+Searches over the graph visit a node per junction instead of a cell per step.
+
+Doors are treated as open, since they are only ever walked through once the
+level's coins have been collected. Graphs are cached by level digest, so every
+copy of a level shares one graph.
+"""
+from __future__ import annotations
+import heapq
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from pathfinding import BLOCKED
+from constants import *
+
+if TYPE_CHECKING:
+    from game import Level
+
+
+class CorridorGraph:
+    """ The junctions, dead ends and points of interest of a level, joined by
+        the corridors between them.
+    """
+    def __init__(self, level: Level) -> None:
+        """ Compresses a level's maze into its corridor graph.
+
+        Parameters:
+            level: The level to compress.
+        """
+        maze = level.get_maze()
+        rows, cols = self._dimensions = maze.get_dimensions()
+        doors = {row * cols + col for row, col in maze.get_doors()}
+        # Tiles of a class all cost the same, apart from doors (which may be
+        # locked), so each class is only asked once
+        class_costs = {}
+        costs = []
+        for row in maze.get_tiles():
+            for tile in row:
+                cost = class_costs.get(type(tile))
+                if cost is None:
+                    cost = class_costs[type(tile)] = BLOCKED \
+                        if tile.is_blocking() else 1 + tile.damage()
+                costs.append(cost)
+        for door in doors:
+            costs[door] = 1
+        self._costs = costs
+
+        num_cells = rows * cols
+        self._open = open_cells = [()] * num_cells
+        for index, cost in enumerate(costs):
+            if cost == BLOCKED:
+                continue
+            col = index % cols
+            open_cells[index] = [
+                neighbour for neighbour, exists in (
+                    (index - cols, index >= cols),
+                    (index + cols, index + cols < num_cells),
+                    (index - 1, col > 0),
+                    (index + 1, col < cols - 1),
+                ) if exists and costs[neighbour] != BLOCKED
+            ]
+
+        interesting = set(doors)
+        interesting.update(row * cols + col for row, col in level.get_items())
+        start = level.get_player_start()
+        if start is not None:
+            interesting.add(start[0] * cols + start[1])
+        self._nodes = [
+            index for index, cost in enumerate(costs) if cost != BLOCKED
+            and (len(self._open[index]) != 2 or index in interesting)
+        ]
+        self._node_ids = {index: node for node, index in enumerate(self._nodes)}
+
+        # Each edge is (node, steps, damage, first cell along the corridor).
+        # Only the cheapest corridor between two nodes is kept.
+        self._edges = []
+        for node, index in enumerate(self._nodes):
+            cheapest = {}
+            for first in self._open[index]:
+                end, steps, damage = self._walk(index, first)
+                other = self._node_ids.get(end)
+                if other is None or other == node:
+                    continue # A corridor looping back on itself
+                best = cheapest.get(other)
+                if best is None or steps + damage < best[1] + best[2]:
+                    cheapest[other] = (other, steps, damage, first)
+            self._edges.append(list(cheapest.values()))
+
+    def _walk(
+        self,
+        previous: int,
+        index: int,
+        stop: Optional[int] = None
+    ) -> tuple[int, int, int]:
+        """ Follows a corridor to the next node (or the stop cell).
+
+        Parameters:
+            previous: The cell the walk comes from.
+            index: The first cell of the walk.
+            stop: A cell to stop at even if it isn't a node.
+
+        Returns:
+            The cell the walk ended at, and the steps taken and damage done by
+            the cells stepped onto to get there. A walk around a loop with no
+            nodes on it ends back where it came from.
+        """
+        costs, node_ids, open_cells = self._costs, self._node_ids, self._open
+        origin = previous
+        steps = damage = 0
+        while True:
+            steps += 1
+            damage += costs[index] - 1
+            if index in node_ids or index == stop or index == origin:
+                return index, steps, damage
+            first, second = open_cells[index]
+            previous, index = index, (second if first == previous else first)
+
+    def _get_first(self, index: int, end: int) -> int:
+        """ Returns the first cell of the cheapest walk from a corridor cell to
+            a node at one of the corridor's ends.
+
+        Parameters:
+            index: The corridor cell to walk from.
+            end: The cell of the node to walk to.
+        """
+        walks = []
+        for first in self._open[index]:
+            cell, steps, damage = self._walk(index, first)
+            if cell == end:
+                walks.append((steps + damage, first))
+        return min(walks)[1]
+
+    def _trace(self, previous: int, index: int, end: int) -> list[int]:
+        """ Returns the cells stepped onto following a corridor to a cell on it.
+
+        Parameters:
+            previous: The cell the walk comes from.
+            index: The first cell of the walk.
+            end: The last cell of the walk.
+        """
+        cells = [index]
+        while index != end:
+            first, second = self._open[index]
+            previous, index = index, (second if first == previous else first)
+            cells.append(index)
+        return cells
+
+    def get_dimensions(self) -> tuple[int, int]:
+        """ Returns the (#rows, #columns) of the compressed maze. """
+        return self._dimensions
+
+    def get_num_nodes(self) -> int:
+        """ Returns the number of nodes in the graph. """
+        return len(self._nodes)
+
+    def get_num_open_cells(self) -> int:
+        """ Returns the number of open cells in the maze the graph compresses.
+        """
+        return sum(1 for cost in self._costs if cost != BLOCKED)
+
+    def get_position(self, node: int) -> tuple[int, int]:
+        """ Returns the (row, column) position of a node.
+
+        Parameters:
+            node: The node's number.
+        """
+        return divmod(self._nodes[node], self._dimensions[1])
+
+    def get_node(self, position: tuple[int, int]) -> Optional[int]:
+        """ Returns the number of the node at a position, or None if the cell
+            isn't a node.
+
+        Parameters:
+            position: The (row, column) position of the cell.
+        """
+        return self._node_ids.get(position[0] * self._dimensions[1] + position[1])
+
+    def get_edges(self, node: int) -> list[tuple[int, int, int]]:
+        """ Returns the nodes joined to a node, each with the steps and the
+            damage taken walking to it.
+
+        Parameters:
+            node: The node's number.
+        """
+        return [(other, steps, damage)
+                for other, steps, damage, _ in self._edges[node]]
+
+    def _get_index(self, position: tuple[int, int]) -> Optional[int]:
+        """ Returns the cell index of an open position, or None.
+
+        Parameters:
+            position: The (row, column) position of the cell.
+        """
+        rows, cols = self._dimensions
+        row, col = position
+        if not (0 <= row < rows and 0 <= col < cols):
+            return None
+        index = row * cols + col
+        return None if self._costs[index] == BLOCKED else index
+
+    def locate(self, position: tuple[int, int]) -> list[tuple[int, int, int]]:
+        """ Returns the nodes at the ends of the corridor containing a cell,
+            each with the steps and damage taken walking from the cell to it.
+            A node is its own (only) end.
+
+        Parameters:
+            position: The (row, column) position of an open cell.
+        """
+        index = self._get_index(position)
+        if index is None:
+            return []
+        node = self._node_ids.get(index)
+        if node is not None:
+            return [(node, 0, 0)]
+        ends = []
+        for first in self._open[index]:
+            end, steps, damage = self._walk(index, first)
+            if end != index:
+                ends.append((self._node_ids[end], steps, damage))
+        return ends
+
+    def get_distances(
+        self,
+        start: tuple[int, int]
+    ) -> dict[int, tuple[int, int]]:
+        """ Returns the steps and damage along the cheapest path (each step
+            costing 1 plus its damage) from a cell to every node it can reach.
+
+        Parameters:
+            start: The (row, column) position to search from.
+        """
+        return self._search(self.locate(start))[0]
+
+    def _search(
+        self,
+        sources: list[tuple[int, int, int]],
+        targets: Optional[set[int]] = None
+    ) -> tuple[dict[int, tuple[int, int]], dict[int, int]]:
+        """ Runs Dijkstra's algorithm over the graph.
+
+        Parameters:
+            sources: The starting nodes, each with its steps and damage so far.
+            targets: If given, stop once all of these nodes are settled.
+
+        Returns:
+            The (steps, damage) to each settled node, and the node each settled
+            node was reached from (absent for sources).
+        """
+        edges = self._edges
+        settled, parents, best = {}, {}, {}
+        queue = []
+        for node, steps, damage in sources:
+            if node not in best or steps + damage < sum(best[node]):
+                best[node] = (steps, damage)
+                heapq.heappush(queue, (steps + damage, steps, node))
+        remaining = None if targets is None else set(targets)
+        while queue:
+            cost, steps, node = heapq.heappop(queue)
+            if node in settled:
+                continue
+            settled[node] = best[node]
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+            damage = cost - steps
+            for other, edge_steps, edge_damage, _ in edges[node]:
+                if other in settled:
+                    continue
+                new_steps, new_damage = steps + edge_steps, damage + edge_damage
+                old = best.get(other)
+                if old is None or new_steps + new_damage < old[0] + old[1]:
+                    best[other] = (new_steps, new_damage)
+                    parents[other] = node
+                    heapq.heappush(
+                        queue, (new_steps + new_damage, new_steps, other)
+                    )
+        return settled, parents
+
+    def _get_approaches(
+        self,
+        target: tuple[int, int]
+    ) -> list[tuple[int, int, int]]:
+        """ Returns the nodes a cell can be reached from without passing
+            another node, each with the steps and damage from it to the cell.
+
+        Parameters:
+            target: The (row, column) position of an open cell.
+        """
+        index = self._get_index(target)
+        cost = self._costs[index]
+        # Walking the other way steps onto the target instead of the node
+        return [
+            (node, steps, damage - (self._costs[self._nodes[node]] - 1)
+             + (cost - 1))
+            for node, steps, damage in self.locate(target)
+        ]
+
+    def _get_direct(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[tuple[int, int, int]]:
+        """ Returns the steps and damage along the corridor from start to a
+            target on the same corridor (not passing a node), and the first
+            cell of that walk, or None.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        start_index, target_index = self._get_index(start), self._get_index(target)
+        if start_index in self._node_ids:
+            return None
+        for first in self._open[start_index]:
+            end, steps, damage = self._walk(start_index, first, target_index)
+            if end == target_index:
+                return steps, damage, first
+        return None
+
+    def get_distance(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[tuple[int, int]]:
+        """ Returns the steps and damage along the cheapest path between two
+            cells, or None if there is no path.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        route = self._route(start, target)
+        return None if route is None else route[0]
+
+    def _route(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[tuple[tuple[int, int], Optional[int], dict[int, int]]]:
+        """ Finds the cheapest path between two cells.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+
+        Returns:
+            The (steps, damage) of the path, the node it reaches the target
+            from (None if it follows a corridor directly) and the parents of
+            the nodes searched, or None if there is no path.
+        """
+        if self._get_index(start) is None or self._get_index(target) is None:
+            return None
+        if start == target:
+            return (0, 0), None, {}
+        approaches = self._get_approaches(target)
+        settled, parents = self._search(
+            self.locate(start), {node for node, _, _ in approaches}
+        )
+        best, via = None, None
+        direct = self._get_direct(start, target)
+        if direct is not None:
+            best = direct[:2]
+        for node, steps, damage in approaches:
+            if node in settled:
+                total = (settled[node][0] + steps, settled[node][1] + damage)
+                if best is None or sum(total) < sum(best):
+                    best, via = total, node
+        if best is None:
+            return None
+        return best, via, parents
+
+    def find_path(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> list[tuple[int, int]]:
+        """ Returns the positions stepped onto along the cheapest path between
+            two cells (ending with target), or [] if there is none.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        route = self._route(start, target)
+        if route is None or start == target:
+            return []
+        _, via, parents = route
+        cols = self._dimensions[1]
+        start_index, target_index = self._get_index(start), self._get_index(target)
+        if via is None:
+            _, _, first = self._get_direct(start, target)
+            cells = self._trace(start_index, first, target_index)
+            return [divmod(index, cols) for index in cells]
+
+        # The nodes from the target's approach back to one next to the start
+        nodes = [via]
+        while nodes[-1] in parents:
+            nodes.append(parents[nodes[-1]])
+        nodes.reverse()
+
+        cells = []
+        first_node = self._nodes[nodes[0]]
+        if start_index != first_node:
+            first = self._get_first(start_index, first_node)
+            cells += self._trace(start_index, first, first_node)
+        for node, next_node in zip(nodes, nodes[1:]):
+            first = next(edge[3] for edge in self._edges[node]
+                         if edge[0] == next_node)
+            cells += self._trace(self._nodes[node], first, self._nodes[next_node])
+        if target_index != self._nodes[via]:
+            # The cheapest walk from the target is also the cheapest walk to it
+            first = self._get_first(target_index, self._nodes[via])
+            back = self._trace(target_index, first, self._nodes[via])
+            cells += back[-2::-1] + [target_index]
+        return [divmod(index, cols) for index in cells]
+
+
+_graphs = OrderedDict() # Maps level digests to their graphs, least recent first
+
+
+def get_corridor_graph(level: Level) -> CorridorGraph:
+    """ Returns the corridor graph of a level, shared by every level with the
+        same digest.
+
+    Parameters:
+        level: The level to compress.
+    """
+    digest = level.get_digest()
+    graph = _graphs.get(digest)
+    if graph is None:
+        graph = _graphs[digest] = CorridorGraph(level)
+        if len(_graphs) > CORRIDOR_CACHE_SIZE:
+            _graphs.popitem(last=False)
+    else:
+        _graphs.move_to_end(digest)
+    return graph
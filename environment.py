@@ -0,0 +1,361 @@
+""" A Gym-style environment API for training agents on MazeRunner.
+
+VectorMazeEnv runs several games in lock-step and returns batched observations:
+
+    tiles:  (N, rows, cols) uint8 tile codes (see TILE_CODES and
+            UNLOCKED_DOOR_CODE)
+    items:  (N, rows, cols) uint8 item codes (see ITEM_CODES)
+    enemies: (N, rows, cols) uint8 1 where an enemy is, otherwise 0
+    player: (N, 2) int32 player (row, column)
+    stats:  (N, 3) int32 player (HP, hunger, thirst)
+
+rows and cols are the largest level dimensions in the game; the space beyond a
+smaller level is filled with walls. The arrays are allocated once and updated in
+place: a step only writes the cells it changed (the player, a collected item,
+an unlocked door, the enemies that moved) and rewrites the grids only when a level changes. With
+num_processes > 0 the games are split across worker processes that write
+straight into the same arrays through shared memory.
+
+Actions are indices into ACTIONS: moves, then applying an item by name.
+"""
+from __future__ import annotations
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from game import load_game, Level, Model
+from constants import *
+
+TILE_CODES = {EMPTY: 0, WALL: 1, LAVA: 2, DOOR: 3}
+UNLOCKED_DOOR_CODE = 4
+ITEM_CODES = {
+    COIN: 1, POTION: 2, HONEY: 3, APPLE: 4, WATER: 5, CANDY: 6, LAVA_SHOES: 7
+}
+ACTIONS = [
+    UP, DOWN, LEFT, RIGHT,
+    'i Potion', 'i Honey', 'i Apple', 'i Water', 'i Candy', 'i LavaShoes'
+]
+
+COIN_REWARD = 1.0
+LEVEL_REWARD = 10.0
+WIN_REWARD = 100.0
+LOSS_REWARD = -100.0
+
+
+def observation_shapes(
+    num_envs: int,
+    templates: list[Level]
+) -> dict[str, tuple[tuple[int, ...], type]]:
+    """ Returns the shape and dtype of each observation array.
+
+    Parameters:
+        num_envs: The number of environments in the batch.
+        templates: The levels of the game.
+    """
+    rows = max(level.get_dimensions()[0] for level in templates)
+    cols = max(level.get_dimensions()[1] for level in templates)
+    return {
+        'tiles': ((num_envs, rows, cols), np.uint8),
+        'items': ((num_envs, rows, cols), np.uint8),
+        'enemies': ((num_envs, rows, cols), np.uint8),
+        'player': ((num_envs, 2), np.int32),
+        'stats': ((num_envs, 3), np.int32),
+    }
+
+
+class MazeEnv:
+    """ A single game writing its observation into one slot of batched
+        observation arrays.
+    """
+    def __init__(
+        self,
+        game_file: str,
+        templates: list[Level],
+        observations: dict[str, np.ndarray],
+        index: int
+    ) -> None:
+        """ Sets up the environment. Call reset before the first step.
+
+        Parameters:
+            game_file: The file the levels were loaded from.
+            templates: The levels of the game, copied for every episode.
+            observations: The batched observation arrays.
+            index: The slot in the arrays belonging to this environment.
+        """
+        self._game_file = game_file
+        self._templates = templates
+        self._tiles = observations['tiles'][index]
+        self._items = observations['items'][index]
+        self._enemies = observations['enemies'][index]
+        self._player = observations['player'][index]
+        self._stats = observations['stats'][index]
+        self._model = None
+        self._enemy_positions = set() # Where enemies are written, if anywhere
+
+    def reset(self) -> None:
+        """ Starts a new episode and writes its observation. """
+        self._model = Model(self._game_file, self._templates)
+        self._write_level()
+
+    def _is_door_unlocked(self) -> bool:
+        """ Returns True iff the current level's door has been unlocked. """
+        maze = self._level.get_maze()
+        return any(not maze.get_tile(position).is_blocking()
+                   for position in maze.get_doors())
+
+    def _write_level(self) -> None:
+        """ Rewrites the whole observation for the current level. """
+        model = self._model
+        self._level = model.get_level()
+        self._unlocked = self._is_door_unlocked()
+
+        self._tiles.fill(TILE_CODES[WALL])
+        self._items.fill(0)
+        for row, tiles in enumerate(model.get_current_maze().get_tiles()):
+            self._tiles[row, :len(tiles)] = [
+                TILE_CODES[tile.get_id()] for tile in tiles
+            ]
+        if self._unlocked:
+            for door in self._level.get_maze().get_doors():
+                self._tiles[door] = UNLOCKED_DOOR_CODE
+        for (row, col), item in model.get_current_items().items():
+            self._items[row, col] = ITEM_CODES[item.get_id()]
+        self._enemies.fill(0)
+        self._enemy_positions = set()
+        self._write_enemies()
+        self._player[:] = model.get_player().get_position()
+        self._stats[:] = model.get_player_stats()
+
+    def _write_enemies(self) -> None:
+        """ Moves the enemies in the observation to where they are now. """
+        positions = self._model.get_current_enemies().keys()
+        if positions == self._enemy_positions:
+            return
+        for position in self._enemy_positions - positions:
+            self._enemies[position] = 0
+        for position in positions - self._enemy_positions:
+            self._enemies[position] = 1
+        self._enemy_positions = set(positions)
+
+    def step(self, action: int) -> tuple[float, bool, dict]:
+        """ Applies an action, updating the observation in place. A finished
+            episode is reset automatically.
+
+        Parameters:
+            action: An index into ACTIONS.
+
+        Returns:
+            The reward, whether the episode finished and an info dictionary.
+        """
+        model = self._model
+        command = ACTIONS[action]
+        reward = 0.0
+        if command in MOVE_DELTAS:
+            row, col = model.get_player().get_position()
+            d_row, d_col = MOVE_DELTAS[command]
+            target = row + d_row, col + d_col
+            target_item = model.get_current_items().get(target)
+            model.move_player((d_row, d_col))
+
+            if model.has_won():
+                reward += WIN_REWARD
+            elif model.did_level_up():
+                reward += LEVEL_REWARD
+                self._write_level()
+            else:
+                position = model.get_player().get_position()
+                self._player[:] = position
+                if target_item is not None and position == target \
+                        and target not in model.get_current_items():
+                    self._items[target] = 0
+                    if target_item.get_id() == COIN:
+                        reward += COIN_REWARD
+                if not self._unlocked and self._is_door_unlocked():
+                    self._unlocked = True
+                    for door in self._level.get_maze().get_doors():
+                        self._tiles[door] = UNLOCKED_DOOR_CODE
+        else:
+            model.apply_item(command.partition(' ')[-1])
+
+        info = {}
+        done = model.has_won() or model.has_lost()
+        if done:
+            if model.has_lost():
+                reward += LOSS_REWARD
+            info = {'won': model.has_won(), 'stats': model.get_player_stats()}
+            self.reset()
+        else:
+            self._stats[:] = model.get_player_stats()
+            self._write_enemies()
+        return reward, done, info
+
+
+def _allocate(
+    shapes: dict[str, tuple[tuple[int, ...], type]],
+    shared: bool
+) -> tuple[dict[str, np.ndarray], list[shared_memory.SharedMemory]]:
+    """ Allocates the observation arrays, in shared memory if requested.
+
+    Parameters:
+        shapes: The shape and dtype of each array.
+        shared: Whether the arrays must be visible to worker processes.
+
+    Returns:
+        The arrays and the shared memory blocks backing them (if any).
+    """
+    arrays, blocks = {}, []
+    for name, (shape, dtype) in shapes.items():
+        if shared:
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            block = shared_memory.SharedMemory(create=True, size=size)
+            arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+            blocks.append(block)
+        else:
+            arrays[name] = np.zeros(shape, dtype)
+    return arrays, blocks
+
+
+def _worker_main(
+    game_file: str,
+    shapes: dict[str, tuple[tuple[int, ...], type]],
+    names: dict[str, str],
+    indices: list[int],
+    connection
+) -> None:
+    """ Runs a subset of the environments in a worker process.
+
+    Parameters:
+        game_file: The file containing the levels for the game.
+        shapes: The shape and dtype of each observation array.
+        names: The name of the shared memory block behind each array.
+        indices: The slots of the environments this worker runs.
+        connection: The worker's end of the pipe to the parent.
+    """
+    blocks = {name: shared_memory.SharedMemory(name=block_name)
+              for name, block_name in names.items()}
+    observations = {
+        name: np.ndarray(shape, dtype, buffer=blocks[name].buf)
+        for name, (shape, dtype) in shapes.items()
+    }
+    templates = load_game(game_file)
+    envs = [MazeEnv(game_file, templates, observations, index)
+            for index in indices]
+    while True:
+        command, actions = connection.recv()
+        if command == 'reset':
+            for env in envs:
+                env.reset()
+            connection.send(None)
+        elif command == 'step':
+            connection.send([env.step(action)
+                             for env, action in zip(envs, actions)])
+        else:
+            break
+
+    envs.clear()
+    observations.clear()
+    for block in blocks.values():
+        block.close()
+
+
+class VectorMazeEnv:
+    """ Runs several MazeRunner games in lock-step with batched observations. """
+    def __init__(
+        self,
+        game_file: str,
+        num_envs: int,
+        num_processes: int = 0
+    ) -> None:
+        """ Sets up the environments. Call reset before the first step.
+
+        Parameters:
+            game_file: The file containing the levels for the game.
+            num_envs: The number of games to run.
+            num_processes: The number of worker processes to split the games
+                across, or 0 to run them all in this process.
+        """
+        templates = load_game(game_file)
+        shapes = observation_shapes(num_envs, templates)
+        self._num_envs = num_envs
+        self._observations, self._blocks = _allocate(shapes, num_processes > 0)
+        self._rewards = np.zeros(num_envs, np.float32)
+        self._dones = np.zeros(num_envs, np.bool_)
+        self._envs = []
+        self._workers = []
+
+        if num_processes == 0:
+            self._envs = [
+                MazeEnv(game_file, templates, self._observations, index)
+                for index in range(num_envs)
+            ]
+            return
+
+        names = {name: block.name
+                 for name, block in zip(shapes, self._blocks)}
+        for worker_num in range(min(num_processes, num_envs)):
+            indices = list(range(worker_num, num_envs, num_processes))
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(game_file, shapes, names, indices, worker_connection),
+                daemon=True
+            )
+            process.start()
+            self._workers.append((connection, process, indices))
+
+    def get_num_envs(self) -> int:
+        """ Returns the number of games in the batch. """
+        return self._num_envs
+
+    def reset(self) -> dict[str, np.ndarray]:
+        """ Starts a new episode in every game and returns the observations. """
+        for env in self._envs:
+            env.reset()
+        for connection, _, _ in self._workers:
+            connection.send(('reset', None))
+        for connection, _, _ in self._workers:
+            connection.recv()
+        return self._observations
+
+    def step(
+        self,
+        actions: list[int]
+    ) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray, list[dict]]:
+        """ Applies one action to each game.
+
+        Parameters:
+            actions: An index into ACTIONS for each game.
+
+        Returns:
+            The observations, rewards, done flags and info dictionaries. The
+            observation and reward arrays are reused by the next step; finished
+            games have already been reset.
+        """
+        infos = [{}] * self._num_envs
+        results = [None] * self._num_envs
+        for index, (env, action) in enumerate(zip(self._envs, actions)):
+            results[index] = env.step(int(action))
+        for connection, _, indices in self._workers:
+            connection.send(('step', [int(actions[index]) for index in indices]))
+        for connection, _, indices in self._workers:
+            for index, result in zip(indices, connection.recv()):
+                results[index] = result
+
+        for index, (reward, done, info) in enumerate(results):
+            self._rewards[index] = reward
+            self._dones[index] = done
+            infos[index] = info
+        return self._observations, self._rewards, self._dones, infos
+
+    def close(self) -> None:
+        """ Stops any worker processes and frees shared memory. """
+        for connection, process, _ in self._workers:
+            connection.send(('close', None))
+            process.join()
+        self._workers = []
+        self._observations = {} # Release the views before closing the blocks
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
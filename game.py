@@ -1,6 +1,12 @@
 from __future__ import annotations
-from typing import Optional
+import hashlib
+import heapq
+import re
+import sys
+from array import array
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence, Union
 from game_support import UserInterface, TextInterface
+from pathfinding import FlowField
 from constants import *
 
 
@@ -172,6 +178,80 @@ class Water(Item):
         player.change_thirst(WATER_AMOUNT)
 
 
+class Candy(Item):
+    """ Candy stops the player getting hungrier for a number of moves. """
+    _id = CANDY
+
+    def apply(self, player: 'Player') -> None:
+        """ Pauses the player's hunger for CANDY_DURATION moves. """
+        player.get_effects().add(CANDY, CANDY_DURATION)
+
+
+class LavaShoes(Item):
+    """ Lava shoes protect the player from lava damage for a number of moves. """
+    _id = LAVA_SHOES
+
+    def apply(self, player: 'Player') -> None:
+        """ Cancels lava damage for LAVA_SHOES_DURATION moves. """
+        player.get_effects().add(LAVA_SHOES, LAVA_SHOES_DURATION)
+
+
+class Effects:
+    """ Timed effects on a player, each lasting a number of moves. Expiry moves
+        are kept in a heap, so a move only does work for the effects that
+        expire on it.
+    """
+    def __init__(self) -> None:
+        """ Sets up with no active effects. """
+        self._num_moves = 0
+        self._expiries = {} # Maps each active effect to the move it expires on
+        self._heap = [] # (expiry move, effect) pairs, including stale ones
+
+    def add(self, effect: str, duration: int) -> None:
+        """ Starts an effect, or extends it if it is already active.
+
+        Parameters:
+            effect: The ID of the effect (the ID of the item causing it).
+            duration: The number of moves to extend the effect by.
+        """
+        expiry = self._expiries.get(effect, self._num_moves) + duration
+        self._expiries[effect] = expiry
+        heapq.heappush(self._heap, (expiry, effect))
+
+    def is_active(self, effect: str) -> bool:
+        """ Returns True iff the effect is active for the current move.
+
+        Parameters:
+            effect: The ID of the effect.
+        """
+        return effect in self._expiries
+
+    def get_remaining(self, effect: str) -> int:
+        """ Returns the number of moves left on an effect (0 if inactive).
+
+        Parameters:
+            effect: The ID of the effect.
+        """
+        return self._expiries.get(effect, self._num_moves) - self._num_moves
+
+    def advance(self) -> list[str]:
+        """ Ends the current move, expiring the effects that have run out.
+
+        Returns:
+            The IDs of the expired effects.
+        """
+        self._num_moves += 1
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= self._num_moves:
+            expiry, effect = heapq.heappop(heap)
+            # Extended effects leave stale entries behind
+            if self._expiries.get(effect) == expiry:
+                del self._expiries[effect]
+                expired.append(effect)
+        return expired
+
+
 class Inventory:
     """ A collection of items. """
     def __init__(self, initial_items: Optional[list[Item]] = None) -> None:
@@ -265,6 +345,7 @@ class Player(DynamicEntity):
         self._hunger = 0
         self._thirst = 0
         self._inventory = Inventory()
+        self._effects = Effects()
     
     def get_hunger(self) -> int:
         """ Returns the player's current hunger. """
@@ -328,6 +409,85 @@ class Player(DynamicEntity):
         """ Returns the players inventory. """
         return self._inventory
 
+    def get_effects(self) -> Effects:
+        """ Returns the timed effects on this player. """
+        return self._effects
+
+
+class Enemy(DynamicEntity):
+    """ An enemy that chases the player, hurting them when it reaches them. """
+    _id = ENEMY
+
+
+class Enemies:
+    """ The enemies in one level. They step towards the player through one
+        shared flow field, and a mapping from positions to enemies stops two
+        enemies sharing a cell. A turn visits the cells of the field (not every
+        enemy), so its cost barely grows with the number of enemies, and memory
+        grows with the number of enemies rather than the size of the maze.
+
+        The field only reaches ENEMY_SIGHT from the player, so enemies further
+        away than that haven't seen the player and stay where they are until
+        the player comes within sight.
+    """
+    def __init__(self, level: 'Level') -> None:
+        """ Places an enemy at each enemy start in a level.
+
+        Parameters:
+            level: The level the enemies are in.
+        """
+        self._dimensions = level.get_dimensions()
+        self._field = FlowField(level)
+        self._enemies = {} # Maps positions to the enemies there
+        for position in level.get_enemy_starts():
+            self._enemies[position] = Enemy(position)
+
+    def get_enemies(self) -> dict[tuple[int, int], Enemy]:
+        """ Returns a mapping from positions to the enemies at them. """
+        return self._enemies
+
+    def get_enemy(self, position: tuple[int, int]) -> Optional[Enemy]:
+        """ Returns the enemy at a position, if any.
+
+        Parameters:
+            position: The (row, column) position.
+        """
+        return self._enemies.get(position)
+
+    def take_turn(self, player_position: tuple[int, int]) -> int:
+        """ Moves every enemy that can see the player one step towards them.
+            Enemies nearest the player move first, freeing cells for those
+            behind them.
+
+        Parameters:
+            player_position: The (row, column) position of the player.
+
+        Returns:
+            The number of enemies that reached the player this turn.
+        """
+        cols = self._dimensions[1]
+        self._field.set_target(player_position)
+        target = player_position[0] * cols + player_position[1]
+        enemies = self._enemies
+        num_attacks = 0
+        for index in self._field.get_cells():
+            position = divmod(index, cols)
+            enemy = enemies.get(position)
+            if enemy is None:
+                continue
+            next_index = self._field.get_next(index)
+            if next_index is None:
+                continue
+            if next_index == target:
+                num_attacks += 1
+                continue
+            next_position = divmod(next_index, cols)
+            if next_position not in enemies:
+                del enemies[position]
+                enemy.set_position(next_position)
+                enemies[next_position] = enemy
+        return num_attacks
+
 
 def load_game(filename: str) -> list['Level']:
     """ Reads a game file and creates a list of all the levels in order.
@@ -338,17 +498,29 @@ def load_game(filename: str) -> list['Level']:
     Returns:
         A list of all Level instances to play in the game
     """
-    levels = []
+    return list(iter_levels(filename))
+
+def iter_levels(filename: str) -> Iterator['Level']:
+    """ Reads a game file one level at a time, yielding each level once all of
+        its rows have been read.
+
+    Parameters:
+        filename: The path to the game file
+    """
+    level = None
     with open(filename, 'r') as file:
         for line in file:
             line = line.strip()
             if line.startswith('Maze'):
+                if level is not None:
+                    yield level
                 _, _, dimensions = line[5:].partition(' - ')
                 dimensions = [int(item) for item in dimensions.split()]
-                levels.append(Level(dimensions))
-            elif len(line) > 0 and len(levels) > 0:
-                levels[-1].add_row(line)
-    return levels
+                level = Level(dimensions)
+            elif len(line) > 0 and level is not None:
+                level.add_row(line)
+    if level is not None:
+        yield level
 
 class Maze:
     """ Models a single map for one level. Only includes ground information,
@@ -368,6 +540,7 @@ class Maze:
         """
         self._dimensions = dimensions
         self._tiles = []
+        self._doors = [] # Positions of every door, in the order they were added
     
     def get_dimensions(self) -> tuple[int, int]:
         """ Returns the dimensions of this maze. """
@@ -380,7 +553,12 @@ class Maze:
             row: String of the tile IDs from which to construct Tile instances.
         """
         # If there is an entity in a spot, assume the ground underneath is empty
+        row_num = len(self._tiles)
         self._tiles.append([self.TILES.get(tile, Empty)() for tile in row])
+        col = row.find(DOOR)
+        while col != -1:
+            self._doors.append((row_num, col))
+            col = row.find(DOOR, col + 1)
 
     def get_tiles(self) -> list[list[Tile]]:
         """ Returns the Tile instances in this maze. Each element is a row of
@@ -388,12 +566,31 @@ class Maze:
         """
         return self._tiles
     
+    def get_doors(self) -> list[tuple[int, int]]:
+        """ Returns the (row, column) positions of every door in the maze. """
+        return self._doors
+
     def unlock_door(self) -> None:
         """ Unlocks any doors that exist in the maze. """
-        for row in self._tiles:
-            for tile in row:
-                if isinstance(tile, Door):
-                    tile.unlock()
+        for position in self._doors:
+            self.get_tile(position).unlock()
+
+    def copy(self) -> Maze:
+        """ Returns a copy of this maze whose doors can be unlocked without
+            affecting this maze. Rows without doors are shared with the copy,
+            since the other tiles never change.
+        """
+        maze = Maze(self._dimensions)
+        maze._tiles = list(self._tiles)
+        maze._doors = list(self._doors)
+        for row_num in {row for row, _ in self._doors}:
+            maze._tiles[row_num] = list(self._tiles[row_num])
+        for row_num, col_num in self._doors:
+            door = Door()
+            if not self._tiles[row_num][col_num].is_blocking():
+                door.unlock()
+            maze._tiles[row_num][col_num] = door
+        return maze
     
     def get_tile(self, position: tuple[int, int]) -> Tile:
         """ Returns the Tile instance at the given position.
@@ -415,6 +612,193 @@ class Maze:
         return f"Maze({self._dimensions})"
 
 
+class MoveTable:
+    """ A precomputed table of where each move leads from every cell of a
+        maze, and the damage done by stepping onto each cell. Cells are indexed
+        row by row (index = row * #columns + column).
+    """
+    # Indices of each move delta in the table
+    DIRECTIONS = {delta: index for index, delta in enumerate(MOVE_DELTAS.values())}
+    BLOCKED = -1 # The move is onto a blocking tile
+    OUTSIDE = -2 # The move leaves the maze
+
+    def __init__(self, maze: Maze) -> None:
+        """ Builds the table for the current state of a maze.
+
+        Parameters:
+            maze: The maze to build the table for.
+        """
+        self._maze = maze
+        rows, cols = self._dimensions = maze.get_dimensions()
+        tiles = maze.get_tiles()
+        self._damage = array('B', [
+            tile.damage() for row in tiles for tile in row
+        ])
+        self._next = array('i', [self.OUTSIDE]) * (rows * cols * 4)
+        # The entry for a move onto each cell, ignoring the maze's edges
+        cells = [
+            self.BLOCKED if tile.is_blocking() else index
+            for index, tile in enumerate(tile for row in tiles for tile in row)
+        ]
+        for (d_row, d_col), direction in self.DIRECTIONS.items():
+            self._next[direction::4] = array('i', self._get_targets(
+                cells, d_row, d_col
+            ))
+
+    def _get_targets(self, cells: list[int], d_row: int, d_col: int) -> list[int]:
+        """ Returns the table entries for one move from every cell.
+
+        Parameters:
+            cells: The entry for a move onto each cell.
+            d_row: The change in row made by the move.
+            d_col: The change in column made by the move.
+        """
+        rows, cols = self._dimensions
+        outside = [self.OUTSIDE]
+        targets = []
+        for row in range(rows):
+            if not 0 <= row + d_row < rows:
+                targets.extend(outside * cols)
+                continue
+            start = (row + d_row) * cols
+            line = cells[start:start + cols]
+            if d_col > 0:
+                line = line[d_col:] + outside * d_col
+            elif d_col < 0:
+                line = outside * -d_col + line[:d_col]
+            targets.extend(line)
+        return targets
+
+    def get_dimensions(self) -> tuple[int, int]:
+        """ Returns the dimensions of the maze this table was built for. """
+        return self._dimensions
+
+    def get_target(self, index: int, direction: int) -> int:
+        """ Returns the index of the cell a move leads to, or BLOCKED or
+            OUTSIDE.
+
+        Parameters:
+            index: The index of the cell moved from.
+            direction: The index of the move in DIRECTIONS.
+        """
+        return self._next[index * 4 + direction]
+
+    def get_damage(self, index: int) -> int:
+        """ Returns the damage done by stepping onto a cell.
+
+        Parameters:
+            index: The index of the cell.
+        """
+        return self._damage[index]
+
+    def get_max_damage(self) -> int:
+        """ Returns the most damage done by stepping onto any cell. """
+        return max(self._damage, default=0)
+
+    def update_cells(self, positions: list[tuple[int, int]]) -> None:
+        """ Patches every move onto the given cells after their tiles change
+            (e.g. a door unlocks).
+
+        Parameters:
+            positions: The (row, column) positions of the changed cells.
+        """
+        rows, cols = self._dimensions
+        for row, col in positions:
+            index = row * cols + col
+            tile = self._maze.get_tile((row, col))
+            self._set_damage(index, tile.damage())
+            target = self.BLOCKED if tile.is_blocking() else index
+            for (d_row, d_col), direction in self.DIRECTIONS.items():
+                # The neighbour that reaches this cell by moving in direction
+                from_row, from_col = row - d_row, col - d_col
+                if 0 <= from_row < rows and 0 <= from_col < cols:
+                    self._set_target(
+                        (from_row * cols + from_col) * 4 + direction, target
+                    )
+
+    def _set_target(self, slot: int, target: int) -> None:
+        """ Changes one entry of the table.
+
+        Parameters:
+            slot: The index of the entry (cell index * 4 + direction).
+            target: The new entry.
+        """
+        self._next[slot] = target
+
+    def _set_damage(self, index: int, damage: int) -> None:
+        """ Changes the damage done by stepping onto a cell.
+
+        Parameters:
+            index: The index of the cell.
+            damage: The new damage.
+        """
+        self._damage[index] = damage
+
+    def overlay(self, maze: Maze) -> MoveTableOverlay:
+        """ Returns a table for a copy of this table's maze that reads through
+            to this table, keeping its own changes (e.g. unlocked doors) to
+            itself. This table must not change while it is overlaid.
+
+        Parameters:
+            maze: The copied maze the new table describes.
+        """
+        return MoveTableOverlay(self, maze)
+
+
+class MoveTableOverlay(MoveTable):
+    """ A move table that shares another table's entries, holding the entries
+        it changes in small mappings that are looked up first. Copies of a
+        level share one table this way, so unlocking the doors of one copy
+        costs memory for the door cells only.
+    """
+    def __init__(self, table: MoveTable, maze: Maze) -> None:
+        """ Sets up an overlay with no changes of its own.
+
+        Parameters:
+            table: The table to read through to.
+            maze: The copied maze the overlay describes.
+        """
+        self._maze = maze
+        self._dimensions = table._dimensions
+        self._next = table._next
+        self._damage = table._damage
+        # Overlays of overlays start from the same changes
+        self._next_changes = dict(getattr(table, '_next_changes', {}))
+        self._damage_changes = dict(getattr(table, '_damage_changes', {}))
+
+    def get_target(self, index: int, direction: int) -> int:
+        """ Returns the index of the cell a move leads to, or BLOCKED or
+            OUTSIDE.
+
+        Parameters:
+            index: The index of the cell moved from.
+            direction: The index of the move in DIRECTIONS.
+        """
+        slot = index * 4 + direction
+        target = self._next_changes.get(slot)
+        return self._next[slot] if target is None else target
+
+    def get_damage(self, index: int) -> int:
+        """ Returns the damage done by stepping onto a cell.
+
+        Parameters:
+            index: The index of the cell.
+        """
+        damage = self._damage_changes.get(index)
+        return self._damage[index] if damage is None else damage
+
+    def get_max_damage(self) -> int:
+        """ Returns the most damage done by stepping onto any cell. """
+        return max(self._damage_changes.values(),
+                   default=super().get_max_damage())
+
+    def _set_target(self, slot: int, target: int) -> None:
+        self._next_changes[slot] = target
+
+    def _set_damage(self, index: int, damage: int) -> None:
+        self._damage_changes[index] = damage
+
+
 class Level:
     """ Models one level of a game, including maze and entities. """
     ENTITIES = {
@@ -423,17 +807,40 @@ class Level:
         APPLE: Apple,
         HONEY: Honey,
         WATER: Water,
+        CANDY: Candy,
+        LAVA_SHOES: LavaShoes,
     }
 
-    def __init__(self, dimensions: tuple[int, int]) -> None:
+    # Matches every character of a row that isn't a plain tile
+    _ENTITY_PATTERN = re.compile(
+        '[^' + re.escape(''.join(Maze.TILES)) + ']'
+    )
+
+    def __init__(
+        self,
+        dimensions: tuple[int, int],
+        maze: Optional[Maze] = None,
+        filled: bool = False
+    ) -> None:
         """ Sets up a new level with empty maze and no items or player.
         
         Parameters:
             dimensions: The (#rows, #columns) in the maze for this level.
+            maze: An optional empty maze to use instead of a new in-memory Maze
+            filled: True iff maze already holds all of its rows (e.g. a maze
+                over shared memory), so none will be added with add_row.
         """
-        self._maze = Maze(dimensions)
+        self._maze = Maze(dimensions) if maze is None else maze
+        self._num_rows = dimensions[0] if filled else 0
+        self._move_table = None # Built on first use by get_move_table
+        self._owns_move_table = True # False while shared with other copies
+        self._doors_unlocked = False
         self._items = {} # Maps positions to Item instances
+        self._buckets = {} # Maps bucket positions to {position: Item}
+        self._item_buckets = {} # Maps item IDs to {bucket: set of positions}
         self._player_start = None
+        self._enemy_starts = []
+        self._digest = None # Cached by get_digest until the level changes
     
     def get_maze(self) -> Maze:
         """ Returns the Maze instance for this level. """
@@ -441,12 +848,38 @@ class Level:
     
     def _contains_coins(self) -> bool:
         """ Returns True iff there are any more coins left in this level. """
-        return any([item.get_id() == COIN for item in self._items.values()])
+        return len(self._item_buckets.get(COIN, {})) > 0
 
-    def attempt_unlock_door(self) -> None:
-        """ Unlocks the doors in the maze if there are no coins remaining. """
-        if not self._contains_coins():
+    def attempt_unlock_door(self) -> bool:
+        """ Unlocks the doors in the maze if there are no coins remaining.
+
+        Returns:
+            True iff this call unlocked the doors.
+        """
+        if not self._contains_coins() and not self._doors_unlocked:
             self._maze.unlock_door()
+            self._doors_unlocked = True
+            self._digest = None
+            if self._move_table is not None:
+                if not self._owns_move_table:
+                    self._move_table = self._move_table.overlay(self._maze)
+                    self._owns_move_table = True
+                self._move_table.update_cells(self._maze.get_doors())
+            return True
+        return False
+
+    def get_move_table(self) -> Optional[MoveTable]:
+        """ Returns the move table for this level's maze, building it on first
+            use. Returns None for mazes larger than MOVE_TABLE_MAX_CELLS, which
+            are played directly from their tiles instead.
+        """
+        if self._move_table is None:
+            rows, cols = self.get_dimensions()
+            if rows * cols > MOVE_TABLE_MAX_CELLS or self._num_rows < rows:
+                return None
+            self._move_table = MoveTable(self._maze)
+            self._owns_move_table = True
+        return self._move_table
     
     def add_row(self, row: str) -> None:
         """ Adds the tiles and entities from the row to this level.
@@ -454,10 +887,12 @@ class Level:
         Parameters:
             row: A string of tile or entity IDs.
         """
-        row_num = len(self._maze.get_tiles())
+        row_num = self._num_rows
+        self._num_rows += 1
+        self._digest = None
         self._maze.add_row(row)
-        for col_num, char in enumerate(row):
-            self.add_entity((row_num, col_num), char)
+        for match in self._ENTITY_PATTERN.finditer(row):
+            self.add_entity((row_num, match.start()), match.group())
     
     def add_entity(self, position: tuple[int, int], entity_id: str) -> None:
         """ Adds a new entity to this level.
@@ -466,10 +901,20 @@ class Level:
             position: The (row, column) position at which to add the entity.
             entity_id: The ID of the entity to add.
         """
+        self._digest = None
         if self.ENTITIES.get(entity_id) is not None:
-            self._items[position] = self.ENTITIES.get(entity_id)(position)
+            if position in self._items:
+                self.remove_item(position)
+            item = self.ENTITIES.get(entity_id)(position)
+            bucket = self._get_bucket(position)
+            self._items[position] = item
+            self._buckets.setdefault(bucket, {})[position] = item
+            self._item_buckets.setdefault(entity_id, {}) \
+                .setdefault(bucket, set()).add(position)
         if entity_id == PLAYER:
             self.add_player_start(position)
+        elif entity_id == ENEMY:
+            self._enemy_starts.append(position)
 
     def get_dimensions(self) -> tuple[int, int]:
         """ Returns the (#rows, #columns) in the level maze. """
@@ -490,7 +935,134 @@ class Level:
         Parameters:
             position: the (row, column) position from which to delete an item.
         """
-        del self._items[position]
+        item = self._items.pop(position)
+        self._digest = None
+        bucket = self._get_bucket(position)
+        del self._buckets[bucket][position]
+        if not self._buckets[bucket]:
+            del self._buckets[bucket]
+        type_buckets = self._item_buckets[item.get_id()]
+        type_buckets[bucket].discard(position)
+        if not type_buckets[bucket]:
+            del type_buckets[bucket]
+
+    def _get_bucket(self, position: tuple[int, int]) -> tuple[int, int]:
+        """ Returns the (row, column) of the item bucket covering a position.
+
+        Parameters:
+            position: The (row, column) position to find the bucket for.
+        """
+        row, col = position
+        return row // ITEM_BUCKET_SIZE, col // ITEM_BUCKET_SIZE
+
+    def _get_bucket_ring(
+        self,
+        origin: tuple[int, int],
+        radius: int
+    ) -> list[tuple[int, int]]:
+        """ Returns the buckets exactly radius buckets away from origin.
+
+        Parameters:
+            origin: The (row, column) of the bucket at the centre of the ring.
+            radius: The distance (in buckets) of the ring from the origin.
+        """
+        origin_row, origin_col = origin
+        if radius == 0:
+            return [origin]
+        top, bottom = origin_row - radius, origin_row + radius
+        left, right = origin_col - radius, origin_col + radius
+        ring = []
+        for col in range(left, right + 1):
+            ring.append((top, col))
+            ring.append((bottom, col))
+        for row in range(top + 1, bottom):
+            ring.append((row, left))
+            ring.append((row, right))
+        return ring
+
+    def items_in_rect(
+        self,
+        top_left: tuple[int, int],
+        bottom_right: tuple[int, int]
+    ) -> dict[tuple[int, int], Item]:
+        """ Returns the items inside a rectangle of the maze. Only the buckets
+            overlapping the rectangle are visited.
+
+        Parameters:
+            top_left: The (row, column) of the top left corner (inclusive).
+            bottom_right: The (row, column) of the bottom right corner
+                (inclusive).
+
+        Returns:
+            A mapping from position to the Item at that position for each item
+            inside the rectangle.
+        """
+        min_row, min_col = top_left
+        max_row, max_col = bottom_right
+        min_bucket_row, min_bucket_col = self._get_bucket((min_row, min_col))
+        max_bucket_row, max_bucket_col = self._get_bucket((max_row, max_col))
+        found = {}
+        for bucket_row in range(min_bucket_row, max_bucket_row + 1):
+            for bucket_col in range(min_bucket_col, max_bucket_col + 1):
+                bucket = self._buckets.get((bucket_row, bucket_col))
+                if bucket is None:
+                    continue
+                inside = min_bucket_row < bucket_row < max_bucket_row \
+                    and min_bucket_col < bucket_col < max_bucket_col
+                if inside:
+                    found.update(bucket)
+                    continue
+                for (row, col), item in bucket.items():
+                    if min_row <= row <= max_row and min_col <= col <= max_col:
+                        found[(row, col)] = item
+        return found
+
+    def nearest_item(
+        self,
+        position: tuple[int, int],
+        item_id: str
+    ) -> Optional[Item]:
+        """ Returns the item of the given type closest to a position, by
+            number of steps ignoring walls. Buckets are searched in rings
+            outwards from the position, so only nearby buckets holding that
+            type of item are visited.
+
+        Parameters:
+            position: The (row, column) position to search from.
+            item_id: The ID of the type of item to find.
+
+        Returns:
+            The closest matching item, or None if there are none in the level.
+        """
+        buckets = self._item_buckets.get(item_id)
+        if not buckets:
+            return None
+        row, col = position
+        origin_row, origin_col = self._get_bucket(position)
+        best, best_distance = None, None
+        radius = 0
+        while best is None or best_distance > (radius - 1) * ITEM_BUCKET_SIZE:
+            # Once a ring is as large as the set of occupied buckets, it is
+            # cheaper to check every occupied bucket and stop
+            searched_all = 8 * radius >= len(buckets)
+            if searched_all:
+                candidates = buckets
+            else:
+                candidates = [
+                    bucket for bucket in self._get_bucket_ring(
+                        (origin_row, origin_col), radius
+                    ) if bucket in buckets
+                ]
+            for bucket in candidates:
+                for item_row, item_col in buckets[bucket]:
+                    distance = abs(item_row - row) + abs(item_col - col)
+                    if best is None or distance < best_distance:
+                        best = self._items[(item_row, item_col)]
+                        best_distance = distance
+            if searched_all:
+                break
+            radius += 1
+        return best
     
     def add_player_start(self, position: tuple[int, int]) -> None:
         """ Adds the start position for the player in this level.
@@ -499,11 +1071,67 @@ class Level:
             position: The position at which the player starts.
         """
         self._player_start = position
+        self._digest = None
     
     def get_player_start(self) -> tuple[int, int]:
         """ Returns the starting position of the player for this level. """
         return self._player_start
 
+    def get_enemy_starts(self) -> list[tuple[int, int]]:
+        """ Returns the starting positions of the enemies in this level. """
+        return self._enemy_starts
+
+    def get_digest(self) -> str:
+        """ Returns a hash of the level's current tiles, items, player start and
+            enemy starts, identifying the level to caches of its analyses (e.g.
+            its corridor graph). It is cached until the level changes.
+        """
+        if self._digest is None:
+            digest = hashlib.sha256(str(self._maze).encode())
+            items = sorted((position, item.get_id())
+                           for position, item in self._items.items())
+            digest.update(repr(
+                (items, self._player_start, self._enemy_starts)
+            ).encode())
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def copy(self) -> Level:
+        """ Returns a copy of this level that can be played without affecting
+            this level. The copy shares this level's (unchanging) tiles and
+            items.
+        """
+        level = Level(self.get_dimensions(), self._maze.copy())
+        level._num_rows = self._num_rows
+        level._doors_unlocked = self._doors_unlocked
+        level._digest = self._digest
+        # Share the move table; a level unlocking its doors overlays it
+        level._move_table = self.get_move_table()
+        level._owns_move_table = False
+        self._owns_move_table = False
+        level._items = dict(self._items)
+        level._buckets = {
+            bucket: dict(items) for bucket, items in self._buckets.items()
+        }
+        level._item_buckets = {
+            item_id: {
+                bucket: set(positions) for bucket, positions in buckets.items()
+            }
+            for item_id, buckets in self._item_buckets.items()
+        }
+        level._player_start = self._player_start
+        level._enemy_starts = self._enemy_starts
+        return level
+
+    def close(self) -> None:
+        """ Releases the file behind this level's maze, if it has one (e.g. a
+            ChunkedMaze, whose changed chunks are written back first). Closing
+            a copy leaves the file open for the level it was copied from.
+        """
+        close = getattr(self._maze, 'close', None)
+        if close is not None:
+            close()
+
     def __str__(self):
         """ Returns a string representation of this level. """
         maze, items, player_start = self._maze, self._items, self._player_start
@@ -514,21 +1142,117 @@ class Level:
         return f"Level({self.get_dimensions()})"
 
 
+class PlayerMoved(NamedTuple):
+    """ The player moved (or was placed at the start of a new level). """
+    old_position: tuple[int, int]
+    position: tuple[int, int]
+
+
+class ItemCollected(NamedTuple):
+    """ The player picked up the item at a position. """
+    position: tuple[int, int]
+    item: Item
+
+
+class ItemApplied(NamedTuple):
+    """ The player applied an item from their inventory. """
+    item: Item
+
+
+class DoorUnlocked(NamedTuple):
+    """ The doors of the current level were unlocked. """
+    positions: list[tuple[int, int]]
+
+
+class StatsChanged(NamedTuple):
+    """ The player's (HP, hunger, thirst) changed. """
+    old_stats: tuple[int, int, int]
+    stats: tuple[int, int, int]
+
+
+class LevelChanged(NamedTuple):
+    """ The game moved on to a new level, or was won (level is None). """
+    level_num: int
+    level: Optional[Level]
+
+
+ModelEvent = Union[PlayerMoved, ItemCollected, ItemApplied, DoorUnlocked,
+                   StatsChanged, LevelChanged]
+
+
 class Model:
-    """ The overall model for a game of MazeRunner """
-    def __init__(self, game_file: str) -> None:
+    """ The overall model for a game of MazeRunner.
+
+        Views can subscribe to the model to be told what each change was,
+        instead of redrawing everything. Events are only built while someone
+        is subscribed.
+    """
+    def __init__(
+        self,
+        game_file: str,
+        templates: Optional[list[Level]] = None,
+        levels: Optional[Sequence[Level]] = None
+    ) -> None:
         """ Constructs a new game.
         
         Parameters:
             game_file: The file containing the levels for this game.
+            templates: Levels already loaded from game_file. If given, the game
+                is played on copies of them instead of reading the file.
+            levels: The levels of game_file to play directly (e.g. a
+                PrefetchedLevels that parses them in the background).
         """
-        self._levels = load_game(game_file)
+        if levels is not None:
+            self._levels = levels
+        elif templates is None:
+            self._levels = load_game(game_file)
+        else:
+            self._levels = [level.copy() for level in templates]
         self._level_num = 0
         self._player = Player(self.get_level().get_player_start())
         self._won = False
         self._did_level_up = False
         self._num_moves = 0
         self._game_file = game_file
+        self._enemies = None # The enemies of the current level, once created
+        self._enemies_level = None
+        self._listeners = []
+
+    def subscribe(self, listener: Callable[[ModelEvent], None]) -> None:
+        """ Calls listener with each change event from now on.
+
+        Parameters:
+            listener: Called with a PlayerMoved, ItemCollected, ItemApplied,
+                DoorUnlocked, StatsChanged or LevelChanged event.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[ModelEvent], None]) -> None:
+        """ Stops calling a subscribed listener.
+
+        Parameters:
+            listener: A listener previously passed to subscribe.
+        """
+        self._listeners.remove(listener)
+
+    def _emit(self, event: ModelEvent) -> None:
+        """ Sends an event to every listener. Callers check self._listeners
+            first, so no event is built when no one is subscribed.
+
+        Parameters:
+            event: The change that happened.
+        """
+        for listener in list(self._listeners):
+            listener(event)
+
+    def close(self) -> None:
+        """ Stops any background work on the game's levels (e.g. a
+            PrefetchedLevels still parsing them). Call when the game is
+            replaced.
+        """
+        close = getattr(self._levels, 'close', None)
+        if close is not None:
+            close()
 
     def has_won(self) -> bool:
         """ Returns True iff the game has been won (i.e. all levels have been
@@ -561,14 +1285,97 @@ class Model:
         self._level_num += 1
         if self._level_num >= len(self._levels):
             self._won = True
+            if self._listeners:
+                self._emit(LevelChanged(self._level_num, None))
         else:
+            old_position = self._player.get_position()
             self._player.set_position(self.get_level().get_player_start())
             self._did_level_up = True
+            if self._listeners:
+                self._emit(LevelChanged(self._level_num, self.get_level()))
+                self._emit(PlayerMoved(old_position,
+                                       self._player.get_position()))
 
     def move_player(self, delta: tuple[int, int]) -> None:
         """ Tries to move the player by the requested amount. Levels up if the
             user finishes the maze, """
         self._did_level_up = False
+        table = self.get_level().get_move_table()
+        direction = MoveTable.DIRECTIONS.get(delta)
+        row, col = self._player.get_position()
+        if table is not None and direction is not None:
+            rows, cols = table.get_dimensions()
+            if 0 <= row < rows and 0 <= col < cols:
+                target = table.get_target(row * cols + col, direction)
+                if target == MoveTable.BLOCKED:
+                    return
+                if target != MoveTable.OUTSIDE:
+                    self._step_player(divmod(target, cols), table.get_damage(target))
+                    return
+
+        # Leaving the maze (or a maze without a move table)
+        self._move_player_by_tiles(delta)
+
+    def _step_player(self, position: tuple[int, int], damage: int) -> None:
+        """ Moves the player onto a non-blocking tile and updates their stats.
+
+        Parameters:
+            position: The position to move to.
+            damage: The damage done by the tile at position.
+        """
+        listening = bool(self._listeners)
+        if listening:
+            old_position = self._player.get_position()
+            old_stats = self.get_player_stats()
+        self._num_moves += 1
+        effects = self._player.get_effects()
+
+        if self._num_moves % STATS_TICK == 0:
+            if not effects.is_active(CANDY):
+                self._player.change_hunger(1)
+            self._player.change_thirst(1)
+        if effects.is_active(LAVA_SHOES):
+            damage = 0
+        self._player.change_health(-1 - damage)
+        effects.advance()
+
+        self._player.set_position(position)
+        if listening:
+            self._emit(PlayerMoved(old_position, position))
+        self.attempt_collect_item(position)
+        if self.get_level().get_enemy_starts():
+            self._move_enemies()
+        if listening:
+            stats = self.get_player_stats()
+            if stats != old_stats:
+                self._emit(StatsChanged(old_stats, stats))
+
+    def _get_enemies(self) -> Enemies:
+        """ Returns the enemies in the current level, placing them on first use.
+        """
+        level = self.get_level()
+        if self._enemies is None or self._enemies_level is not level:
+            self._enemies = Enemies(level)
+            self._enemies_level = level
+        return self._enemies
+
+    def _move_enemies(self) -> None:
+        """ Hurts the player for walking into an enemy, then gives the enemies
+            their turn, hurting the player for each enemy that reaches them.
+        """
+        enemies = self._get_enemies()
+        position = self._player.get_position()
+        num_hits = 1 if enemies.get_enemy(position) is not None else 0
+        num_hits += enemies.take_turn(position)
+        if num_hits:
+            self._player.change_health(-ENEMY_DAMAGE * num_hits)
+
+    def _move_player_by_tiles(self, delta: tuple[int, int]) -> None:
+        """ Tries to move the player by looking up the tiles directly.
+
+        Parameters:
+            delta: The (row, column) change in position.
+        """
         old_pos = self._player.get_position()
         position = row, col = old_pos[0] + delta[0], old_pos[1] + delta[1]
         max_row, max_col = self.get_level().get_dimensions()
@@ -582,15 +1389,23 @@ class Model:
         else:
             tile = self.get_current_maze().get_tile(position)
             if not tile.is_blocking():
-                self._num_moves += 1
-        
-                if self._num_moves % 5 == 0:
-                    self._player.change_hunger(1)
-                    self._player.change_thirst(1)
-                self._player.change_health(-1 - tile.damage())
+                self._step_player(position, tile.damage())
 
-                self._player.set_position(position)
-                self.attempt_collect_item(position)
+    def apply_moves(self, moves: str) -> int:
+        """ Applies a string of moves (e.g. 'wwddss') in order, stopping early
+            if the game is won or lost.
+
+        Parameters:
+            moves: A string of UP, DOWN, LEFT and RIGHT characters.
+
+        Returns:
+            The number of moves applied.
+        """
+        for num, move in enumerate(moves, start=1):
+            self.move_player(MOVE_DELTAS[move])
+            if self.has_won() or self.has_lost():
+                return num
+        return len(moves)
     
     def attempt_collect_item(self, position: tuple[int, int]) -> None:
         """ Collect the item at the given position if one exists. Unlock door if
@@ -599,11 +1414,39 @@ class Model:
         Parameters:
             position: The position from which to attempt to collect an item.
         """
-        item = self.get_level().get_items().get(position)
+        level = self.get_level()
+        item = level.get_items().get(position)
         if item is not None:
             self._player.add_item(item)
-            self.get_level().remove_item(position)
-        self.get_level().attempt_unlock_door()
+            level.remove_item(position)
+            if self._listeners:
+                self._emit(ItemCollected(position, item))
+        if level.attempt_unlock_door() and self._listeners:
+            self._emit(DoorUnlocked(list(level.get_maze().get_doors())))
+
+    def apply_item(self, item_name: str) -> bool:
+        """ Removes one item with the given name from the player's inventory
+            and applies it to the player.
+
+        Parameters:
+            item_name: The name of the item to apply.
+
+        Returns:
+            True iff the player had an item with that name.
+        """
+        item = self._player.get_inventory().remove_item(item_name)
+        if item is None:
+            return False
+        if not self._listeners:
+            item.apply(self._player)
+            return True
+        old_stats = self.get_player_stats()
+        item.apply(self._player)
+        self._emit(ItemApplied(item))
+        stats = self.get_player_stats()
+        if stats != old_stats:
+            self._emit(StatsChanged(old_stats, stats))
+        return True
         
     def get_player(self) -> Player:
         """ Returns the player in the game. """
@@ -627,6 +1470,43 @@ class Model:
             positions in the current maze. """
         return self.get_level().get_items()
 
+    def get_current_enemies(self) -> dict[tuple[int, int], Enemy]:
+        """ Returns a mapping from positions to the enemies at those positions
+            in the current maze. """
+        if not self.get_level().get_enemy_starts():
+            return {}
+        return self._get_enemies().get_enemies()
+
+    def get_current_entities(self) -> dict[tuple[int, int], Entity]:
+        """ Returns the current items and enemies by position, with enemies
+            drawn over any item they are standing on. """
+        enemies = self.get_current_enemies()
+        if not enemies:
+            return self.get_current_items()
+        return {**self.get_current_items(), **enemies}
+
+    def get_entities_in_rect(
+        self,
+        top_left: tuple[int, int],
+        bottom_right: tuple[int, int]
+    ) -> dict[tuple[int, int], Entity]:
+        """ Returns the current items and enemies inside a rectangle of the
+            maze, with enemies over any item they are standing on. Only the
+            item buckets overlapping the rectangle are visited.
+
+        Parameters:
+            top_left: The (row, column) of the top left corner (inclusive).
+            bottom_right: The (row, column) of the bottom right corner
+                (inclusive).
+        """
+        entities = self.get_level().items_in_rect(top_left, bottom_right)
+        (min_row, min_col), (max_row, max_col) = top_left, bottom_right
+        for position, enemy in self.get_current_enemies().items():
+            if min_row <= position[0] <= max_row \
+                    and min_col <= position[1] <= max_col:
+                entities[position] = enemy
+        return entities
+
     def __str__(self):
         return f"Model('{self._game_file}')"
     
@@ -651,7 +1531,7 @@ class MazeRunner:
         model = self._model
         self._view.draw(
             model.get_current_maze(),
-            model.get_current_items(),
+            model.get_current_entities(),
             model.get_player().get_position(),
             model.get_player_inventory(),
             model.get_player_stats()
@@ -663,8 +1543,8 @@ class MazeRunner:
         self._handle_move(move)
 
     def _handle_move(self, move: str) -> None:
-        """ Handles a model update after a single move. Reprompts if move is
-            invalid.
+        """ Handles a model update after a move (or string of moves). Reprompts
+            if move is invalid.
 
         Parameters:
             move: The users input from a move prompt.
@@ -672,14 +1552,15 @@ class MazeRunner:
         # Player has attempted to move
         if move in (UP, DOWN, LEFT, RIGHT):
             self._model.move_player(MOVE_DELTAS.get(move))
+
+        # Player has entered a string of moves, applied before one redraw
+        elif len(move) > 1 and all(char in MOVE_DELTAS for char in move):
+            self._model.apply_moves(move)
         
         # Player has attempted to use an item
         elif len(move) > 1 and move.split()[0] == 'i':
             item_name = move.partition(' ')[-1]
-            item = self._model.get_player().get_inventory().remove_item(item_name)
-            if item is not None:
-                item.apply(self._model.get_player())
-            else:
+            if not self._model.apply_item(item_name):
                 print('\nNo item with that name!\n')
     
         # Invalid; reprompt
@@ -700,9 +1581,12 @@ class MazeRunner:
                 break
 
 def main():
-    """ Entry-point to gameplay """
+    """ Entry-point to text gameplay. Never imports tkinter or PIL. """
     view = TextInterface()
-    game_file = input('Enter game file: ')
+    if len(sys.argv) > 1:
+        game_file = sys.argv[1]
+    else:
+        game_file = input('Enter game file: ')
     maze_runner = MazeRunner(game_file, view)
     maze_runner.play()
 
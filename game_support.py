@@ -1,4 +1,8 @@
-from constants import PLAYER
+import sys
+from typing import Optional
+
+from sprites import SpriteCache, get_tile_ids
+from constants import *
 
 class UserInterface:
     """ Abstract class providing an interface for any MazeRunner View class. """
@@ -81,3 +85,187 @@ class TextInterface(UserInterface):
     def _draw_player_stats(self, player_stats: tuple[int, int, int]) -> None:
         hp, hunger, thirst = player_stats
         print(f'HP: {hp}\nhunger: {hunger}\nthirst: {thirst}')
+
+
+class FrameInterface(UserInterface):
+    """ A MazeRunner interface that renders each draw to an in-memory PIL image,
+        with no Tk or display. Sprites and the maze background come from a
+        sprite cache, so a frame is just a copy of the cached background with
+        the entities pasted on and the stats written underneath.
+    """
+    def __init__(
+        self,
+        size: tuple[int, int] = (MAZE_WIDTH, MAZE_HEIGHT),
+        sprites: Optional[SpriteCache] = None,
+        record: bool = False
+    ) -> None:
+        """ Sets up the interface. PIL is only imported once a frame is drawn.
+
+        Parameters:
+            size: The (width, height) of the maze in pixels. The stats are
+                drawn in a further STATS_HEIGHT pixels below it.
+            sprites: The cache of resized images (shared with other views).
+            record: Whether to keep every frame, for save_animation.
+        """
+        self._size = size
+        self._sprites = SpriteCache() if sprites is None else sprites
+        self._record = record
+        self._frames = []
+        self._frame = None
+        self._cell_size = (0, 0)
+
+    def draw(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int],
+        inventory: 'Inventory',
+        player_stats: tuple[int, int, int]
+    ) -> None:
+        """ Renders the current game state to a new frame.
+
+        Parameters:
+            maze: The current Maze instance
+            items: The items on the maze
+            player_position: The position of the player
+            inventory: The player's current inventory
+            player_stats: The (HP, hunger, thirst) of the player
+        """
+        super().draw(maze, items, player_position, inventory, player_stats)
+        if self._record:
+            self._frames.append(self._frame)
+
+    def _draw_level(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int]
+    ) -> None:
+        from PIL import Image, ImageDraw
+
+        rows, cols = maze.get_dimensions()
+        width, height = self._size
+        cell_width, cell_height = self._cell_size = (width // cols,
+                                                     height // rows)
+        background = self._sprites.get_background_image(
+            get_tile_ids(maze.get_tiles()), self._cell_size
+        )
+        self._frame = Image.new('RGBA', (width, height + STATS_HEIGHT),
+                                THEME_COLOUR)
+        self._frame.paste(background, (0, 0))
+
+        # Entities without an image (such as enemies) are drawn as ovals
+        entities = [(position, item.get_id())
+                    for position, item in items.items()]
+        for (row, col), entity_id in entities + [(player_position, PLAYER)]:
+            x_min, y_min = col * cell_width, row * cell_height
+            name = ENTITY_IMAGES.get(entity_id)
+            if name is None:
+                ImageDraw.Draw(self._frame).ellipse(
+                    (x_min, y_min, x_min + cell_width, y_min + cell_height),
+                    fill=ENTITY_COLOURS[entity_id], outline='black'
+                )
+            else:
+                sprite = self._sprites.get_image(name, self._cell_size)
+                self._frame.alpha_composite(sprite.convert('RGBA'),
+                                            (x_min, y_min))
+
+    def _draw_inventory(self, inventory: 'Inventory') -> None:
+        from PIL import ImageDraw
+
+        items = inventory.get_items()
+        num_coins = len(items.get('Coin', []))
+        text = ', '.join(f'{name}: {len(found)}'
+                         for name, found in items.items() if name != 'Coin')
+        ImageDraw.Draw(self._frame).text(
+            (10, self._size[1] + STATS_HEIGHT // 2),
+            f'Coins: {num_coins}   Inventory: {text or "Empty"}', fill='black'
+        )
+
+    def _draw_player_stats(self, player_stats: tuple[int, int, int]) -> None:
+        from PIL import ImageDraw
+
+        hp, hunger, thirst = player_stats
+        ImageDraw.Draw(self._frame).text(
+            (10, self._size[1] + 10),
+            f'HP: {hp}   Hunger: {hunger}   Thirst: {thirst}', fill='black'
+        )
+
+    def get_frame(self):
+        """ Returns the most recently drawn frame as a PIL image (or None if
+            nothing has been drawn).
+        """
+        return self._frame
+
+    def get_frames(self) -> list:
+        """ Returns every recorded frame, in the order they were drawn. """
+        return self._frames
+
+    def save_frame(self, path: str) -> None:
+        """ Saves the most recently drawn frame, e.g. as a PNG.
+
+        Parameters:
+            path: The file to write (its extension picks the format).
+        """
+        self._frame.save(path)
+
+    def save_animation(self, path: str, duration: int = FRAME_DURATION) -> None:
+        """ Saves the recorded frames as an animation (a GIF, or an APNG if the
+            path ends in .png).
+
+        Parameters:
+            path: The file to write.
+            duration: The milliseconds each frame is shown for.
+        """
+        first, *rest = self._frames
+        first.save(path, save_all=True, append_images=rest, duration=duration,
+                   loop=0)
+
+
+def replay(model: 'Model', moves: str, view: UserInterface) -> int:
+    """ Draws a game's state, then applies a string of moves, drawing the state
+        after each one, until the moves run out or the game is won or lost.
+
+    Parameters:
+        model: The game to replay the moves in.
+        moves: A string of UP, DOWN, LEFT and RIGHT characters.
+        view: The interface to draw each state to.
+
+    Returns:
+        The number of moves applied.
+    """
+    def draw():
+        view.draw(
+            model.get_current_maze(),
+            model.get_current_entities(),
+            model.get_player().get_position(),
+            model.get_player_inventory(),
+            model.get_player_stats()
+        )
+
+    draw()
+    for num, move in enumerate(moves, start=1):
+        model.apply_moves(move)
+        if model.has_won():
+            return num # There is no level left to draw
+        draw()
+        if model.has_lost():
+            return num
+    return len(moves)
+
+
+def main():
+    """ Replays moves from the command line and saves the frames as an
+        animation, e.g. python game_support.py games/game1.txt ddss out.gif
+    """
+    from game import Model
+
+    game_file, moves, path = sys.argv[1:4]
+    view = FrameInterface(record=True)
+    num_moves = replay(Model(game_file), moves, view)
+    view.save_animation(path)
+    print(f'Rendered {len(view.get_frames())} frames for {num_moves} moves')
+
+
+if __name__ == '__main__':
+    main()
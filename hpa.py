@@ -0,0 +1,442 @@
+""" Hierarchical pathfinding (HPA*) for very large levels.
+
+The maze is split into square clusters. Where open cells face each other across
+the border of two clusters, one or two transitions are placed on each run of
+them, and the cells of every transition become nodes of an abstract graph.
+Nodes in different clusters are joined by the single step across the border;
+nodes in the same cluster are joined by the cost of the cheapest path between
+them that stays inside the cluster. A query searches that small graph (A*)
+and then refines each abstract edge into cells with a search confined to one
+cluster, so its cost grows with the length of the path rather than with the
+size of the maze.
+
+Paths are near-optimal rather than always the cheapest: they may only cross
+clusters at transitions. Step costs are the same as in pathfinding (1 plus the
+damage of the tile stepped onto). When cells change (e.g. doors unlock), only
+the clusters around them are rebuilt.
+"""
+from __future__ import annotations
+import heapq
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from pathfinding import cell_costs, BLOCKED
+from constants import *
+
+if TYPE_CHECKING:
+    from game import Level
+
+GOAL = -1 # The abstract search's stand-in for the target
+
+
+class HierarchicalPathService:
+    """ Near-optimal safe paths through one (large) level, found on an
+        abstract graph of cluster transitions.
+    """
+    def __init__(
+        self,
+        level: Level,
+        cluster_size: int = HPA_CLUSTER_SIZE
+    ) -> None:
+        """ Splits a level into clusters and places their transitions. The
+            paths between the transitions of a cluster are found the first time
+            a query needs them.
+
+        Parameters:
+            level: The level to find paths through.
+            cluster_size: The side length of the clusters, in cells.
+        """
+        self._level = level
+        self._dimensions = rows, cols = tuple(level.get_dimensions())
+        self._costs = cell_costs(level.get_maze())
+        self._size = cluster_size
+        self._num_clusters = (-(-rows // cluster_size), -(-cols // cluster_size))
+        self._transitions = {} # Maps borders to their (cell, cell) transitions
+        self._partners = {} # Maps nodes to the nodes across their borders
+        self._edges = {} # Maps nodes to their (node, cost) edges, once found
+        self._linked = {} # Maps clusters whose edges are found to their nodes
+        self._door_state = self._get_door_state()
+        cluster_rows, cluster_cols = self._num_clusters
+        for cluster_row in range(cluster_rows):
+            for cluster_col in range(cluster_cols):
+                for border in self._get_borders((cluster_row, cluster_col)):
+                    if border not in self._transitions:
+                        self._build_border(border)
+
+    def get_level(self) -> Level:
+        """ Returns the level this service finds paths through. """
+        return self._level
+
+    def _get_door_state(self) -> tuple[bool, ...]:
+        """ Returns whether each door in the level is blocking. """
+        maze = self._level.get_maze()
+        return tuple(maze.get_tile(position).is_blocking()
+                     for position in maze.get_doors())
+
+    def _get_cluster(self, index: int) -> tuple[int, int]:
+        """ Returns the (row, column) of the cluster containing a cell.
+
+        Parameters:
+            index: The index of the cell.
+        """
+        row, col = divmod(index, self._dimensions[1])
+        return row // self._size, col // self._size
+
+    def _get_bounds(self, cluster: tuple[int, int]) -> tuple[int, int, int, int]:
+        """ Returns the cells of a cluster as (first row, first column, end
+            row, end column).
+
+        Parameters:
+            cluster: The (row, column) of the cluster.
+        """
+        rows, cols = self._dimensions
+        top, left = cluster[0] * self._size, cluster[1] * self._size
+        return top, left, min(rows, top + self._size), min(cols, left + self._size)
+
+    def _get_borders(
+        self,
+        cluster: tuple[int, int]
+    ) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        """ Returns the borders of a cluster with the clusters next to it, each
+            as (upper or left cluster, lower or right cluster).
+
+        Parameters:
+            cluster: The (row, column) of the cluster.
+        """
+        cluster_rows, cluster_cols = self._num_clusters
+        row, col = cluster
+        borders = []
+        if row > 0:
+            borders.append(((row - 1, col), cluster))
+        if row < cluster_rows - 1:
+            borders.append((cluster, (row + 1, col)))
+        if col > 0:
+            borders.append(((row, col - 1), cluster))
+        if col < cluster_cols - 1:
+            borders.append((cluster, (row, col + 1)))
+        return borders
+
+    def _build_border(
+        self,
+        border: tuple[tuple[int, int], tuple[int, int]]
+    ) -> None:
+        """ Places the transitions across a border, replacing any old ones.
+
+        Parameters:
+            border: The (upper or left cluster, lower or right cluster).
+        """
+        for first, second in self._transitions.get(border, []):
+            self._partners[first].discard(second)
+            self._partners[second].discard(first)
+
+        costs, cols = self._costs, self._dimensions[1]
+        first_cluster, second_cluster = border
+        top, left, bottom, right = self._get_bounds(first_cluster)
+        if first_cluster[0] == second_cluster[0]: # Side by side
+            pairs = [(row * cols + right - 1, row * cols + right)
+                     for row in range(top, bottom)]
+        else: # One above the other
+            pairs = [((bottom - 1) * cols + col, bottom * cols + col)
+                     for col in range(left, right)]
+
+        # Runs of open pairs get a transition in the middle, or one at each
+        # end if they are wide
+        transitions, run = [], []
+        for pair in pairs + [None]:
+            if pair is not None and costs[pair[0]] != BLOCKED \
+                    and costs[pair[1]] != BLOCKED:
+                run.append(pair)
+                continue
+            if len(run) >= HPA_WIDE_ENTRANCE:
+                transitions += [run[0], run[-1]]
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+        self._transitions[border] = transitions
+        for first, second in transitions:
+            self._partners.setdefault(first, set()).add(second)
+            self._partners.setdefault(second, set()).add(first)
+
+    def _get_nodes(self, cluster: tuple[int, int]) -> set[int]:
+        """ Returns the cells of a cluster that are abstract nodes.
+
+        Parameters:
+            cluster: The (row, column) of the cluster.
+        """
+        nodes = set()
+        for border in self._get_borders(cluster):
+            side = 0 if border[0] == cluster else 1
+            nodes.update(pair[side] for pair in self._transitions[border])
+        return nodes
+
+    def _search_cluster(
+        self,
+        cluster: tuple[int, int],
+        source: int,
+        targets: Optional[set[int]] = None,
+        backward: bool = False
+    ) -> tuple[dict[int, int], dict[int, int]]:
+        """ Finds the cheapest paths from (or, backward, to) a cell without
+            leaving its cluster (Dijkstra's algorithm).
+
+        Parameters:
+            cluster: The (row, column) of the cluster to search.
+            source: The cell to search from (or to).
+            targets: If given, stop once all of these cells are settled.
+            backward: Whether to find the costs of reaching source instead.
+
+        Returns:
+            The cost of every settled cell, and the cell each was reached from.
+        """
+        costs, cols = self._costs, self._dimensions[1]
+        top, left, bottom, right = self._get_bounds(cluster)
+        distances, parents, settled = {source: 0}, {}, {}
+        remaining = None if targets is None else set(targets)
+        queue = [(0, source)]
+        while queue:
+            distance, index = heapq.heappop(queue)
+            if index in settled:
+                continue
+            settled[index] = distance
+            if remaining is not None:
+                remaining.discard(index)
+                if not remaining:
+                    break
+            row, col = divmod(index, cols)
+            for neighbour, inside in (
+                (index - cols, row > top),
+                (index + cols, row < bottom - 1),
+                (index - 1, col > left),
+                (index + 1, col < right - 1),
+            ):
+                if not inside or costs[neighbour] == BLOCKED \
+                        or neighbour in settled:
+                    continue
+                step = costs[index] if backward else costs[neighbour]
+                new = distance + step
+                if new < distances.get(neighbour, new + 1):
+                    distances[neighbour] = new
+                    parents[neighbour] = index
+                    heapq.heappush(queue, (new, neighbour))
+        return settled, parents
+
+    def _link(self, cluster: tuple[int, int]) -> None:
+        """ Finds the edges from each node of a cluster: the cheapest path
+            inside the cluster to each of its other nodes, and the step across
+            the border to each of its partners.
+
+        Parameters:
+            cluster: The (row, column) of the cluster.
+        """
+        if cluster in self._linked:
+            return
+        nodes = self._linked[cluster] = self._get_nodes(cluster)
+        costs = self._costs
+        for node in nodes:
+            settled, _ = self._search_cluster(cluster, node, nodes)
+            edges = [(other, cost) for other, cost in settled.items()
+                     if other in nodes and other != node]
+            edges += [(partner, costs[partner])
+                      for partner in self._partners.get(node, ())]
+            self._edges[node] = edges
+
+    def _unlink(self, cluster: tuple[int, int]) -> None:
+        """ Forgets the edges from the nodes of a cluster.
+
+        Parameters:
+            cluster: The (row, column) of the cluster.
+        """
+        for node in self._linked.pop(cluster, ()):
+            del self._edges[node]
+
+    def prepare(self) -> None:
+        """ Finds the paths inside every cluster ahead of time (e.g. on a
+            background thread before the level is played).
+        """
+        cluster_rows, cluster_cols = self._num_clusters
+        for cluster_row in range(cluster_rows):
+            for cluster_col in range(cluster_cols):
+                self._link((cluster_row, cluster_col))
+
+    def update_cells(self, positions: Iterable[tuple[int, int]]) -> None:
+        """ Rebuilds the clusters around cells whose tiles have changed. Door
+            unlocks are picked up automatically.
+
+        Parameters:
+            positions: The (row, column) positions of the changed tiles.
+        """
+        maze = self._level.get_maze()
+        rows, cols = self._dimensions
+        changed = set()
+        for position in positions:
+            row, col = position
+            if not (0 <= row < rows and 0 <= col < cols):
+                continue
+            tile = maze.get_tile(position)
+            cost = BLOCKED if tile.is_blocking() else 1 + tile.damage()
+            index = row * cols + col
+            if cost != self._costs[index]:
+                self._costs[index] = cost
+                changed.add(self._get_cluster(index))
+        for cluster in changed:
+            for border in self._get_borders(cluster):
+                self._build_border(border)
+                self._unlink(border[0])
+                self._unlink(border[1])
+            self._unlink(cluster)
+
+    def _sync(self) -> None:
+        """ Rebuilds the clusters around any doors that have unlocked. """
+        door_state = self._get_door_state()
+        if door_state != self._door_state:
+            self._door_state = door_state
+            self.update_cells(self._level.get_maze().get_doors())
+
+    def _get_index(self, position: tuple[int, int]) -> Optional[int]:
+        """ Returns the index of an open position, or None.
+
+        Parameters:
+            position: The (row, column) position.
+        """
+        rows, cols = self._dimensions
+        row, col = position
+        if 0 <= row < rows and 0 <= col < cols \
+                and self._costs[row * cols + col] != BLOCKED:
+            return row * cols + col
+        return None
+
+    def _search(
+        self,
+        start: int,
+        target: int
+    ) -> Optional[tuple[int, list[int]]]:
+        """ Finds a path on the abstract graph (A*).
+
+        Parameters:
+            start: The index of the cell to start from.
+            target: The index of the cell to reach.
+
+        Returns:
+            The cost of the path and the cells it passes through (from start to
+            target, joined by a path inside one cluster or a single step), or
+            None if there is no path.
+        """
+        cols = self._dimensions[1]
+        start_cluster = self._get_cluster(start)
+        target_cluster = self._get_cluster(target)
+        target_row, target_col = divmod(target, cols)
+
+        def estimate(index: int) -> int:
+            row, col = divmod(index, cols)
+            return abs(row - target_row) + abs(col - target_col)
+
+        # Stand-ins for the start and the target join the abstract graph
+        # through the nodes of their clusters
+        target_nodes = self._get_nodes(target_cluster)
+        to_target, _ = self._search_cluster(
+            target_cluster, target, target_nodes, backward=True
+        )
+        start_nodes = self._get_nodes(start_cluster)
+        if start_cluster == target_cluster:
+            start_nodes.add(target)
+        from_start, _ = self._search_cluster(start_cluster, start, start_nodes)
+
+        edges = self._edges
+        best, parents, done = {}, {}, set()
+        queue = []
+        for node, cost in from_start.items():
+            if node in start_nodes:
+                key = GOAL if node == target else node
+                if cost < best.get(key, cost + 1):
+                    best[key] = cost
+                    parents[key] = start
+                    heapq.heappush(queue, (cost + estimate(node), cost, key))
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == GOAL:
+                path = [target]
+                node = parents[GOAL]
+                while node != start:
+                    if node != path[-1]:
+                        path.append(node)
+                    node = parents[node]
+                path.append(start)
+                return cost, path[::-1]
+            if node in done:
+                continue
+            done.add(node)
+            neighbours = edges.get(node)
+            if neighbours is None:
+                self._link(self._get_cluster(node))
+                neighbours = edges[node]
+            if node in to_target:
+                neighbours = neighbours + [(GOAL, to_target[node])]
+            for other, step in neighbours:
+                if other in done:
+                    continue
+                new = cost + step
+                if new < best.get(other, new + 1):
+                    best[other] = new
+                    parents[other] = node
+                    guess = 0 if other == GOAL else estimate(other)
+                    heapq.heappush(queue, (new + guess, new, other))
+        return None
+
+    def get_distance(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[int]:
+        """ Returns the cost of the path find_path would take from start to
+            target, or None if the target can't be reached.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        self._sync()
+        start_index, target_index = self._get_index(start), self._get_index(target)
+        if start_index is None or target_index is None:
+            return None
+        if start_index == target_index:
+            return 0
+        found = self._search(start_index, target_index)
+        return None if found is None else found[0]
+
+    def find_path(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[list[tuple[int, int]]]:
+        """ Returns the positions along a near-cheapest safe path from start to
+            target (excluding start), or None if the target can't be reached.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        self._sync()
+        start_index, target_index = self._get_index(start), self._get_index(target)
+        if start_index is None or target_index is None:
+            return None
+        if start_index == target_index:
+            return []
+        found = self._search(start_index, target_index)
+        if found is None:
+            return None
+
+        # Refine each abstract edge into the cells along it
+        cols = self._dimensions[1]
+        cells = []
+        waypoints = found[1]
+        for source, destination in zip(waypoints, waypoints[1:]):
+            if destination in self._partners.get(source, ()):
+                cells.append(destination)
+                continue
+            _, parents = self._search_cluster(
+                self._get_cluster(source), source, {destination}
+            )
+            steps = [destination]
+            while steps[-1] != source:
+                steps.append(parents[steps[-1]])
+            cells += steps[-2::-1]
+        return [divmod(index, cols) for index in cells]
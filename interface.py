@@ -1,22 +1,46 @@
 from __future__ import annotations
+import threading
 import tkinter as tk
-from tkinter import *
 from tkinter import messagebox
-from PIL import ImageTk, Image
-from tkinter import filedialog
+from typing import Callable, Optional, Union
 
 from game import *
 from Interface_support import AbstractGrid
+from pathfinding import PathFinder
+from prefetch import PrefetchedLevels
+from sprites import SpriteCache, get_tile_ids
+from catalog import Catalog, describe_game
 from constants import *
 
 #__author__ = "Sebastian Moya"
 
+def get_entities_in_rect(entities: dict[tuple[int, int], Entity]) -> Callable[[tuple[int, int], tuple[int, int]], dict[tuple[int, int], Entity]]:
+    """
+    Returns a function finding the entities of a mapping inside a rectangle, for
+    views given every entity rather than Model.get_entities_in_rect.
+
+    Parameters:
+        entities(dict[tuple[int,int]]): entities by position.
+    """
+    def entities_in_rect(top_left: tuple[int, int], bottom_right: tuple[int, int]) -> dict[tuple[int, int], Entity]:
+        (min_row, min_col), (max_row, max_col) = top_left, bottom_right
+        return {position: entity for position, entity in entities.items()
+                if min_row <= position[0] <= max_row and min_col <= position[1] <= max_col}
+    return entities_in_rect
+
+
 class LevelView(AbstractGrid):
     """ 
         LevelView is a view class that displays the maze tiles and the entities.
         Tiles are drawn as a coloured rectangles at their (row, column) postitions,
         and entities are drawn over the tiles using coloured, annotated ovals at their
         (row, column) positions.
+
+        The view can be zoomed in from fitting the whole maze to each of ZOOM_SIZES,
+        following the player. The tiles and entities are kept as separate canvas
+        layers: only the cells around the visible region are drawn, the tile layer
+        is only redrawn when those cells change, and otherwise the canvas is just
+        scrolled.
     """
     
     def __init__(self, master: [tk.Tk, tk.Frame], dimensions: tuple[int, int], size: tuple[int, int], **kwargs) -> None:
@@ -28,40 +52,204 @@ class LevelView(AbstractGrid):
             dimensions(tuple<int>): The dimensions of the maze.
             size(tuple<int>): width and height.
         """
+        self._zoom_size = None # The zoomed cell size, or None to fit the maze
+        self._drawn = None # What the tile layer was drawn for
         super().__init__(master, dimensions, size, **kwargs)
 
-    def draw(self, tiles: list[list[Tile]], items: dict[tuple[int, int], Item], player_pos: tuple[int, int]) -> None:
+    def set_dimensions(self, dimensions: tuple[int, int]) -> None:
+        """
+        Sets the dimensions of the grid (keeping the zoom if it still applies).
+
+        Parameters:
+            dimensions(tuple<int>): The dimensions of the maze.
+        """
+        super().set_dimensions(dimensions)
+        self._drawn = None
+
+    def get_fit_size(self) -> int:
+        """
+        Returns the largest square cell size that fits the whole maze in the view.
+        """
+        return min(super().get_cell_size())
+
+    def get_cell_size(self) -> tuple[int, int]:
+        """
+        Returns the size of the cells (width, height) in pixels at the current zoom.
+        """
+        if self._zoom_size is None or self._zoom_size <= self.get_fit_size():
+            return super().get_cell_size()
+        return self._zoom_size, self._zoom_size
+
+    def zoom(self, steps: int) -> bool:
         """
-        Clears and redraws the entire level (maze and entities).
+        Zooms in (positive steps) or out (negative steps) between fitting the maze
+        and the larger ZOOM_SIZES.
+
+        Parameters:
+            steps(<int>): the number of sizes to zoom by.
+
+        Returns:
+            True iff the cell size changed (the view needs redrawing).
+        """
+        fit = self.get_fit_size()
+        sizes = [None] + [size for size in ZOOM_SIZES if size > fit]
+        current = self._zoom_size if self._zoom_size in sizes else None
+        index = min(max(sizes.index(current) + steps, 0), len(sizes) - 1)
+        if sizes[index] == current:
+            return False
+        self._zoom_size = sizes[index]
+        self._drawn = None
+        return True
+
+    def set_click_callback(self, callback: Callable[[tuple[int, int]], None]) -> None:
+        """
+        Sets the function to be called with the (row, col) position of a clicked cell.
+
+        Parameters:
+            callback: a function to be called.
+        """
+        def on_click(e: tk.Event) -> None:
+            # The canvas may be scrolled, so use canvas (not window) coordinates
+            position = self.get_position(int(self.canvasx(e.x)), int(self.canvasy(e.y)))
+            if position is not None:
+                callback(position)
+        self.bind('<Button-1>', on_click)
+
+    def set_zoom_callback(self, callback: Callable[[int], None]) -> None:
+        """
+        Sets the function to be called with the number of steps to zoom by when
+        the mouse wheel is turned over the view.
+
+        Parameters:
+            callback: a function to be called.
+        """
+        self.bind('<MouseWheel>', lambda e: callback(1 if e.delta > 0 else -1))
+        # X11 reports the wheel as buttons 4 and 5
+        self.bind('<Button-4>', lambda e: callback(1))
+        self.bind('<Button-5>', lambda e: callback(-1))
+
+    def clear(self) -> None:
+        """
+            Clears everything off the canvas, including the retained tile layer.
+        """
+        super().clear()
+        self._drawn = None
+
+    def _scroll_to(self, player_pos: tuple[int, int]) -> tuple[int, int, int, int]:
+        """
+        Scrolls the view to centre the player (as far as the maze allows).
+
+        Parameters:
+            player_pos(tuple<int>): player position(row, col)
+
+        Returns:
+            The visible cells as (first row, first col, end row, end col).
+        """
+        rows, cols = self._dimensions
+        cell_width, cell_height = self.get_cell_size()
+        width, height = self._size
+        total_width, total_height = cols * cell_width, rows * cell_height
+        left = max(0, min(player_pos[1] * cell_width + (cell_width - width) // 2, total_width - width))
+        top = max(0, min(player_pos[0] * cell_height + (cell_height - height) // 2, total_height - height))
+        self.configure(scrollregion=(0, 0, max(total_width, width), max(total_height, height)))
+        self.xview_moveto(left / max(total_width, width))
+        self.yview_moveto(top / max(total_height, height))
+        return (top // cell_height, left // cell_width,
+                min(rows, -(-(top + height) // cell_height)), min(cols, -(-(left + width) // cell_width)))
+
+    def _get_region(self, visible: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """
+        Returns the cells to draw for a visible region: the region with a margin of
+        half of it on every side, so the player can move before the tiles are redrawn.
+
+        Parameters:
+            visible(tuple<int>): the visible cells (first row, first col, end row, end col).
+        """
+        rows, cols = self._dimensions
+        top, left, bottom, right = visible
+        row_margin, col_margin = (bottom - top) // 2, (right - left) // 2
+        return (max(0, top - row_margin), max(0, left - col_margin),
+                min(rows, bottom + row_margin), min(cols, right + col_margin))
+
+    def draw(self, tiles: list[list[Tile]], entities_in_rect: Callable[[tuple[int, int], tuple[int, int]], dict[tuple[int, int], Entity]], player_pos: tuple[int, int]) -> None:
+        """
+        Redraws the level (maze and entities) around the player. The tile layer
+        is only redrawn if the visible cells have left the drawn region or changed.
 
         Parameters:
             tiles(list[list[Tile]]): The tiles of the maze.
-            items(dict[tuple[int,int]]): items on the maze.
+            entities_in_rect(callable): returns the entities inside a rectangle
+                (top left, bottom right, inclusive), e.g. Model.get_entities_in_rect.
             player_pos(tuple<int>): player position(row, col)
                 
         """
-        self.clear()
-        #Tiles
-        for row, tile_row in enumerate(tiles):
-            for col, tile in enumerate(tile_row):
-                bbox = self.get_bbox((row, col))
-                tilename = str(tile.get_id())
-                self.create_rectangle(*bbox, fill=TILE_COLOURS[tilename])
-        #Player
-        self.create_oval(self.get_bbox((player_pos[0], player_pos[1])), fill='pink')
-        self.annotate_position((player_pos[0], player_pos[1]), PLAYER)
-
-        #Items
-        for item in items:
-            self.create_oval(self.get_bbox(item), fill=ENTITY_COLOURS[str(items[item])])
-            self.annotate_position((item), items[item])
+        cell_size = self.get_cell_size()
+        visible = self._scroll_to(player_pos)
+        drawn = self._drawn
+        if drawn is not None:
+            size, region, tile_ids = drawn
+            top, left, bottom, right = region
+            if size != cell_size or not (top <= visible[0] and left <= visible[1]
+                    and visible[2] <= bottom and visible[3] <= right) \
+                    or get_tile_ids(row[left:right] for row in tiles[top:bottom]) != tile_ids:
+                drawn = None
+        if drawn is None:
+            region = self._get_region(visible)
+            top, left, bottom, right = region
+            tile_ids = get_tile_ids(row[left:right] for row in tiles[top:bottom])
+            self.delete('tiles')
+            self._draw_tiles(tiles, tile_ids, region)
+            self._drawn = (cell_size, region, tile_ids)
+
+        self.delete('entities')
+        top, left, bottom, right = self._drawn[1]
+        if top < bottom and left < right:
+            entities = entities_in_rect((top, left), (bottom - 1, right - 1))
+            for position, entity in entities.items():
+                self._draw_entity(position, entity)
+        self._draw_player(player_pos)
+
+    def _draw_tiles(self, tiles: list[list[Tile]], tile_ids: tuple[str, ...], region: tuple[int, int, int, int]) -> None:
+        """
+        Draws the tile layer for a region of the maze.
+
+        Parameters:
+            tiles(list[list[Tile]]): The tiles of the maze.
+            tile_ids(tuple<str>): the IDs of the tiles in the region, one string per row.
+            region(tuple<int>): the cells to draw (first row, first col, end row, end col).
+        """
+        top, left = region[:2]
+        for row, row_ids in enumerate(tile_ids, top):
+            for col, tile_id in enumerate(row_ids, left):
+                self.create_rectangle(*self.get_bbox((row, col)), fill=TILE_COLOURS[tile_id], tags='tiles')
+
+    def _draw_entity(self, position: tuple[int, int], item: Item) -> None:
+        """
+        Draws an entity (on the entity layer) as an annotated oval.
+
+        Parameters:
+            position(tuple<int>): the (row, col) position of the entity.
+            item(Item): the entity.
+        """
+        self.create_oval(self.get_bbox(position), fill=ENTITY_COLOURS[str(item)], tags='entities')
+        self.create_text(self.get_midpoint(position), text=item, font=TEXT_FONT, tags='entities')
+
+    def _draw_player(self, player_pos: tuple[int, int]) -> None:
+        """
+        Draws the player (on the entity layer) as an annotated oval.
+
+        Parameters:
+            player_pos(tuple<int>): player position(row, col)
+        """
+        self.create_oval(self.get_bbox(player_pos), fill='pink', tags='entities')
+        self.create_text(self.get_midpoint(player_pos), text=PLAYER, font=TEXT_FONT, tags='entities')
 
 class ImageLevelView(LevelView):
     """
         ImageLevelView is a view class that inheritance from LevelView.
         Instead of entities drawn by rectangles and ovals, are done with images.
     """
-    def __init__(self, master: [tk.Tk, tk.Frame], dimensions: tuple[int, int], size: tuple[int, int], **kwargs) -> None:
+    def __init__(self, master: [tk.Tk, tk.Frame], dimensions: tuple[int, int], size: tuple[int, int], sprites: Optional[SpriteCache] = None, **kwargs) -> None:
         """
         Sets up the LevelView with the master frame, dimensions and size.
         
@@ -69,50 +257,80 @@ class ImageLevelView(LevelView):
             master(tk.Frame): is the Frame
             dimensions(tuple<int>): The dimensions of the maze.
             size(tuple<int>): width and height.
+            sprites(SpriteCache): the cache of resized images to draw with.
         """
         super().__init__(master, dimensions, size, **kwargs)
-        
+        self._sprites = SpriteCache() if sprites is None else sprites
+        # Tk only draws a PhotoImage while something references it, and the
+        # sprite cache may evict it, so the view keeps the ones it has drawn
+        self._tile_images = []
+        self._entity_images = []
 
+    def draw(self, tiles: list[list[Tile]], entities_in_rect: Callable[[tuple[int, int], tuple[int, int]], dict[tuple[int, int], Entity]], player_pos: tuple[int, int]) -> None:
+        """
+        Redraws the level around the player, keeping the images drawn.
 
-    def draw(self, tiles: list[list[Tile]], items: dict[tuple[int, int], Item], player_pos: tuple[int, int]) -> None:
+        Parameters:
+            tiles(list[list[Tile]]): The tiles of the maze.
+            entities_in_rect(callable): returns the entities inside a rectangle.
+            player_pos(tuple<int>): player position(row, col)
         """
-        Clears and redraws the entire level with images.
+        self._entity_images = []
+        super().draw(tiles, entities_in_rect, player_pos)
+
+    def _draw_tiles(self, tiles: list[list[Tile]], tile_ids: tuple[str, ...], region: tuple[int, int, int, int]) -> None:
+        """
+        Draws the tile layer for a region of the maze with images.
 
         Parameters:
             tiles(list[list[Tile]]): The tiles of the maze.
-            items(dict[tuple[int,int]]): items on the maze.
+            tile_ids(tuple<str>): the IDs of the tiles in the region, one string per row.
+            region(tuple<int>): the cells to draw (first row, first col, end row, end col).
+        """
+        # When the whole maze fits, the tiles are drawn as one background image.
+        # Zoomed in, each cell in the region shares one image per tile, sliced
+        # from the sprite cache at a zoom size (so nothing is resampled)
+        cell_size = self.get_cell_size()
+        top, left = region[:2]
+        if self._zoom_size is None or cell_size != (self._zoom_size, self._zoom_size):
+            background = self._sprites.get_background(get_tile_ids(tiles), cell_size)
+            self.create_image(0, 0, image=background, anchor=tk.NW, tags='tiles')
+            self._tile_images = [background]
+            return
+        images = {tile_id: self._sprites.get(TILE_IMAGES[tile_id], cell_size) for tile_id in set(''.join(tile_ids))}
+        self._tile_images = list(images.values())
+        for row, row_ids in enumerate(tile_ids, top):
+            for col, tile_id in enumerate(row_ids, left):
+                x_min, y_min = self.get_bbox((row, col))[:2]
+                self.create_image(x_min, y_min, image=images[tile_id], anchor=tk.NW, tags='tiles')
+
+    def _draw_entity(self, position: tuple[int, int], item: Item) -> None:
+        """
+        Draws an entity (on the entity layer) with its image. Entities without an
+        image, such as enemies, are ovals.
+
+        Parameters:
+            position(tuple<int>): the (row, col) position of the entity.
+            item(Item): the entity.
+        """
+        name = ENTITY_IMAGES.get(item.get_id())
+        if name is None:
+            super()._draw_entity(position, item)
+            return
+        photoimg = self._sprites.get(name, self.get_cell_size())
+        self._entity_images.append(photoimg)
+        self.create_image(*self.get_midpoint(position), image=photoimg, tags='entities')
+
+    def _draw_player(self, player_pos: tuple[int, int]) -> None:
+        """
+        Draws the player (on the entity layer) with its image.
+
+        Parameters:
             player_pos(tuple<int>): player position(row, col)
-                
         """
-        self.clear()
-        ent = {'C': COIN, 'M': POTION, 'H': HONEY, 'A': APPLE, 'W': WATER}
-        self._images = {}
-
-        #Tiles images
-        for row, tile_row in enumerate(tiles):
-            for col, tile in enumerate(tile_row):
-                tilename = str(tile.get_id())
-                midpoint = self.get_midpoint((row, col))
-                image = Image.open('images/'+TILE_IMAGES[tilename]).resize(self.get_cell_size())
-                photoimg = ImageTk.PhotoImage(image)
-                self._images[tilename+str(row)+str(col)] = photoimg
-                self.create_image(midpoint[0], midpoint[1], image=photoimg)
-
-        #Items images
-        for item in items:
-            midpoint = self.get_midpoint(item)
-            keyent = items[item].get_id()
-            image = Image.open('images/'+ENTITY_IMAGES[ent[keyent]]).resize(self.get_cell_size())
-            photoimg = ImageTk.PhotoImage(image)
-            self._images[ent[keyent]+str(item)] = photoimg
-            self.create_image(midpoint[0], midpoint[1], image=photoimg)
-
-        #Player image
-        midpoint = self.get_midpoint((player_pos[0], player_pos[1]))
-        image = Image.open('images/player.png').resize(self.get_cell_size())
-        photoimg = ImageTk.PhotoImage(image)
-        self._images[Player] = photoimg
-        self.create_image(midpoint[0], midpoint[1], image=photoimg)
+        photoimg = self._sprites.get(ENTITY_IMAGES[PLAYER], self.get_cell_size())
+        self._entity_images.append(photoimg)
+        self.create_image(*self.get_midpoint(player_pos), image=photoimg, tags='entities')
                 
 class StatsView(AbstractGrid):
     """
@@ -220,7 +438,7 @@ class InventoryView(tk.Frame):
         Parameters:
             inventory(dict): Inventory
         """
-        ent = {'Coin': COIN, 'Potion': POTION, 'Honey': HONEY, 'Apple': APPLE, 'Water': WATER}
+        ent = {'Coin': COIN, 'Potion': POTION, 'Honey': HONEY, 'Apple': APPLE, 'Water': WATER, 'Candy': CANDY, 'LavaShoes': LAVA_SHOES}
         if inventory != {}:
            inv = inventory.get_items()
            for element in inv:
@@ -315,15 +533,17 @@ class GraphicalInterface(UserInterface):
         the title banner and the three major widgets are display.
         And some events handling.
     """
-    def __init__(self, master: tk.Tk) -> None:
+    def __init__(self, master: tk.Tk, sprites: Optional[SpriteCache] = None) -> None:
         """
         Sets up GraphicalInterface with the master.
         
         Parameters:
             master(tk.Tk): master frame
+            sprites(SpriteCache): the cache of resized images for the level view.
         
         """
         self._master = master
+        self._sprites = sprites
         master.title("MazeRunner")
         
         self._titlelabel = tk.Label(master, text="MazeRunner", bg=THEME_COLOUR, font=BANNER_FONT)
@@ -348,7 +568,7 @@ class GraphicalInterface(UserInterface):
             self._level_view = LevelView(self._mid_frame, dimensions, size=(MAZE_WIDTH, MAZE_HEIGHT))
             self._level_view.pack(side=tk.LEFT)
         elif TASK == 2:
-            self._level_view = ImageLevelView(self._mid_frame, dimensions, size=(MAZE_WIDTH, MAZE_HEIGHT))
+            self._level_view = ImageLevelView(self._mid_frame, dimensions, size=(MAZE_WIDTH, MAZE_HEIGHT), sprites=self._sprites)
             self._level_view.pack(side=tk.LEFT)
             self._control_view.pack(side=tk.BOTTOM, expand=True, fill=tk.BOTH)
             
@@ -397,6 +617,38 @@ class GraphicalInterface(UserInterface):
         """
         self._inventory_view.set_click_callback(callback)
 
+    def set_level_click_callback(self, callback: Callable[[tuple[int, int]], None]) -> None:
+        """
+            Sets the function to be called with the (row, col) position
+            of a cell clicked in the level view.
+
+            Parameters:
+                callback: a function to be called.
+        """
+        self._level_view.set_click_callback(callback)
+
+    def set_level_zoom_callback(self, callback: Callable[[int], None]) -> None:
+        """
+            Sets the function to be called with the number of steps to zoom by
+            when the mouse wheel is turned over the level view.
+
+            Parameters:
+                callback: a function to be called.
+        """
+        self._level_view.set_zoom_callback(callback)
+
+    def zoom_level(self, steps: int) -> bool:
+        """
+            Zooms the level view in (positive steps) or out (negative steps).
+
+            Parameters:
+                steps(<int>): the number of zoom sizes to zoom by.
+
+            Returns:
+                True iff the level view needs redrawing.
+        """
+        return self._level_view.zoom(steps)
+
     def set_controlrestart_callback(self, callback: Callable[[str], None]) -> None:
         """
             Sets the function to be called when restart game button is
@@ -427,18 +679,23 @@ class GraphicalInterface(UserInterface):
         """
         self.draw_inventory(inventory)
             
-    def draw(self, maze: Maze, items: dict[tuple[int, int], Item], player_position: tuple[int, int], inventory: Inventory, player_stats: tuple[int, int, int]) -> None:
+    def draw(self, maze: Maze, items: Union[dict[tuple[int, int], Entity], Callable[[tuple[int, int], tuple[int, int]], dict[tuple[int, int], Entity]]], player_position: tuple[int, int], inventory: Inventory, player_stats: tuple[int, int, int]) -> None:
         """
             clearing the three major components and redrawing them with the new state.
 
             Parameters:
                 maze: Maze
-                items(dic): items and positon
+                items(dic): items and positon, or a function returning those
+                    inside a rectangle (e.g. Model.get_entities_in_rect), so
+                    only the drawn region is looked up.
                 player_position(tuple<int>): position of the player.
                 inventory(dic): Inventory
                 player_stats(tuple<int>): the player hp, hunger, thirst.
         """
-        self.clear_all()
+        # The level view keeps its tile layer between draws, so only the other
+        # components are cleared
+        self._stats_view.clear()
+        self._inventory_view.clear()
         self._draw_inventory(inventory)
         self._draw_level(maze, items, player_position)
         self._draw_player_stats(player_stats)
@@ -461,16 +718,19 @@ class GraphicalInterface(UserInterface):
         self._inventory_view.draw_inventory(inventory)
         self._stats_view.draw_coins(num_coins)
 
-    def _draw_level(self, maze: Maze, items: dict[tuple[int, int], Item], player_position: tuple[int, int]) -> None:
+    def _draw_level(self, maze: Maze, items: Union[dict[tuple[int, int], Entity], Callable[[tuple[int, int], tuple[int, int]], dict[tuple[int, int], Entity]]], player_position: tuple[int, int]) -> None:
         """
             This method draw the level.
 
             Parameters:
                 maze: Maze
-                items(dic): items and positon
+                items(dic): items and positon, or a function returning those
+                    inside a rectangle.
                 player_position(tuple<int>): position of the player.      
         """
         tiles = maze.get_tiles()
+        if isinstance(items, dict):
+            items = get_entities_in_rect(items)
         self._level_view.draw(tiles, items, player_position)
 
     def _draw_player_stats(self, player_stats: tuple[int, int, int]) -> None:
@@ -488,23 +748,39 @@ class GraphicalMazeRunner(MazeRunner):
         This class handle events generated by the user (keypresses and mouse clicks).
     """
 
-    def __init__(self, game_file: str, root: tk.Tk) -> None:
+    def __init__(self, game_file: str, root: tk.Tk, model: Optional[Model] = None, sprites: Optional[SpriteCache] = None, paths: Optional[PathFinder] = None) -> None:
         """
         Sets up GraphicalMazeRunner with the game_file and the root.
         
         Parameters:
             game_file(<str>): the game to be load.
             master(tk.Tk): master frame
+            model(Model): the game already loaded from game_file, if any.
+            sprites(SpriteCache): the cache of resized images, if any.
+            paths(PathFinder): the path finder preparing model's levels, if any.
         
         """
         self._root = root
-        self._model = Model(game_file)
-        self._view = GraphicalInterface(root)
+        self._sprites = SpriteCache() if sprites is None else sprites
+        self._paths = PathFinder() if paths is None else paths
+        self._model = new_model(game_file, self._sprites, self._paths) if model is None else model
+        self._view = GraphicalInterface(root, self._sprites)
+        self._walk = [] # Positions left to walk to after a click, last first
+        self._walk_job = None # The scheduled call of _walk_step, if any
+
+    def _redraw(self) -> None:
+        """
+            Redraws the view. The level view only looks up the entities in the
+            region it draws.
+        """
+        model = self._model
+        self._view.draw(model.get_current_maze(), model.get_entities_in_rect, model.get_player().get_position(), model.get_player_inventory(), model.get_player_stats())
         
     def _handle_keypress(self, e: tk.Event) -> None:
         """
             This method handles a keypress.
             If the key pressed was one of ‘w’, ‘a’, ‘s’, or ‘d’ a move is attempted.
+            The zoom keys zoom the level view in or out.
 
             Parameter:
                 e: tk.Event
@@ -512,19 +788,77 @@ class GraphicalMazeRunner(MazeRunner):
         moves = {'w': UP, 's': DOWN, 'a': LEFT, 'd': RIGHT}
         
         if e.char in moves:
+            self._walk = []
             self._model.move_player(MOVE_DELTAS.get(moves[e.char]))
-            if self._model.did_level_up():
-                self._view._level_view.set_dimensions(self._model.get_current_maze().get_dimensions())
-                self._redraw()
-                
-            if self._model.has_won():
-                messagebox.showinfo(title='title', message=WIN_MESSAGE)
-                self._root.destroy()
-            elif self._model.has_lost():
-                messagebox.showinfo(title='title', message=LOSS_MESSAGE)
-                self._root.destroy()
-            else:
-                self._redraw()
+            self._after_move()
+        elif e.char and e.char in ZOOM_IN_KEYS:
+            self._zoom(1)
+        elif e.char and e.char in ZOOM_OUT_KEYS:
+            self._zoom(-1)
+
+    def _zoom(self, steps: int) -> None:
+        """
+            Zooms the level view in (positive steps) or out (negative steps).
+
+            Parameter:
+                steps(<int>): the number of zoom sizes to zoom by.
+        """
+        if self._view.zoom_level(steps):
+            self._redraw()
+
+    def _after_move(self) -> bool:
+        """
+            Updates the view after a move, ending the game if it has been won or lost.
+
+            Returns:
+                True iff the game is still being played.
+        """
+        # The next level has been parsed (and its images prepared) in the
+        # background, so levelling up only needs the view resized before the
+        # redraw below
+        if self._model.did_level_up():
+            self._view._level_view.set_dimensions(self._model.get_current_maze().get_dimensions())
+            
+        if self._model.has_won():
+            messagebox.showinfo(title='title', message=WIN_MESSAGE)
+            self._root.destroy()
+        elif self._model.has_lost():
+            messagebox.showinfo(title='title', message=LOSS_MESSAGE)
+            self._root.destroy()
+        else:
+            self._redraw()
+            return True
+        return False
+
+    def _handle_click(self, position: tuple[int, int]) -> None:
+        """
+            Walks the player to a clicked cell along the cheapest safe path
+            (avoiding walls and locked doors, and lava where possible).
+
+            Parameter:
+                position: the (row, col) position of the clicked cell.
+        """
+        path = self._paths.find_path(self._model.get_level(), self._model.get_player().get_position(), position)
+        if not path:
+            return
+        self._walk = path[::-1]
+        if self._walk_job is None:
+            self._walk_job = self._root.after(WALK_DELAY, self._walk_step)
+
+    def _walk_step(self) -> None:
+        """
+            Takes the next step of a click-to-walk path, then schedules the one after.
+        """
+        self._walk_job = None
+        if not self._walk:
+            return
+        row, col = self._model.get_player().get_position()
+        target = self._walk.pop()
+        self._model.move_player((target[0] - row, target[1] - col))
+        if self._model.get_player().get_position() != target:
+            self._walk = [] # The path is no longer valid (e.g. after levelling up)
+        if self._after_move() and self._walk:
+            self._walk_job = self._root.after(WALK_DELAY, self._walk_step)
 
     def _apply_item(self, item_name: str) -> None:
         """
@@ -533,10 +867,7 @@ class GraphicalMazeRunner(MazeRunner):
             Paremeters:
                 item_name(<str>): name of the item to apply.
         """
-        item = self._model.get_player().get_inventory().remove_item(item_name)
-        if item is not None:
-            item.apply(self._model.get_player())
-        else:
+        if not self._model.apply_item(item_name):
             messagebox.showinfo(title='title', message=ITEM_UNAVAILABLE_MESSAGE)
         self._redraw()
 
@@ -546,9 +877,11 @@ class GraphicalMazeRunner(MazeRunner):
             This method cause the gameplay to occur.
         """
         self._view.create_interface(self._model.get_current_maze().get_dimensions())
-        self._view.draw(self._model.get_current_maze(), self._model.get_current_items(), self._model.get_player().get_position(), self._model.get_player_inventory().get_items(), self._model.get_player_stats())
+        self._view.draw(self._model.get_current_maze(), self._model.get_entities_in_rect, self._model.get_player().get_position(), self._model.get_player_inventory().get_items(), self._model.get_player_stats())
         self._view.bind_keypress(self._handle_keypress)
         self._view.set_inventory_callback(self._apply_item)
+        self._view.set_level_click_callback(self._handle_click)
+        self._view.set_level_zoom_callback(self._zoom)
 
 class UpgradedMazeRunner(GraphicalMazeRunner):
     """
@@ -556,18 +889,25 @@ class UpgradedMazeRunner(GraphicalMazeRunner):
         This class add some features like  a file menu
         and handle the controlframe buttons.
     """
-    def __init__(self, game_file: str, root: tk.Tk) -> None:
+    def __init__(self, game_file: str, root: tk.Tk, model: Optional[Model] = None, sprites: Optional[SpriteCache] = None, paths: Optional[PathFinder] = None) -> None:
         """
         Sets up UpgradedMazeRunner with the game_file and the root.
         
         Parameters:
             game_file(<str>): the game to be load.
             master(tk.Tk): master frame
+            model(Model): the game already loaded from game_file, if any.
+            sprites(SpriteCache): the cache of resized images, if any.
+            paths(PathFinder): the path finder preparing model's levels, if any.
         
         """
         self._root = root
-        self._model = Model(game_file)
-        self._view = GraphicalInterface(root)
+        self._sprites = SpriteCache() if sprites is None else sprites
+        self._paths = PathFinder() if paths is None else paths
+        self._model = new_model(game_file, self._sprites, self._paths) if model is None else model
+        self._view = GraphicalInterface(root, self._sprites)
+        self._walk = [] # Positions left to walk to after a click, last first
+        self._walk_job = None # The scheduled call of _walk_step, if any
         self.file_menu()
         self._view.set_controlrestart_callback(self._restart_game)
         self._view.set_controlnewg_callback(self._new_game)
@@ -611,36 +951,66 @@ class UpgradedMazeRunner(GraphicalMazeRunner):
         """
             Restart the current game, including game timer.
         """
-        self._model = Model(GAME_FILE)
+        self._model.close()
+        self._model = new_model(GAME_FILE, self._sprites, self._paths)
+        self._walk = []
         self._view._control_view._min = 0
         self._view._control_view._sec = 0
         self._redraw()
 
     def _new_game(self):
         """
-            This method load a new game prompted by the user.
+            This method load a new game prompted by the user. Games in the
+            catalog are listed (and filtered as the user types) from its index,
+            without parsing any game file.
         """
-        self._top = Toplevel(self._root)
-        self._top.geometry("200x100")
+        self._catalog = Catalog(GAMES_DIRECTORY)
+        self._catalog.update()
+        self._top = tk.Toplevel(self._root)
+        self._top.geometry("420x320")
         self._top.title("New Game")
-        self._promp_label = tk.Label(self._top, text=" Please enter a new\n game file path:")
+        self._promp_label = tk.Label(self._top, text="Choose a game, or enter a new game file path:")
         self._promp_label.pack()
+        self._filter = tk.Entry(self._top)
+        self._filter.pack(side=tk.TOP, fill=tk.X)
+        self._filter.bind('<KeyRelease>', lambda e: self._show_games())
+        self._games_list = tk.Listbox(self._top)
+        self._games_list.pack(side=tk.TOP, expand=True, fill=tk.BOTH)
+        self._games_list.bind('<Double-Button-1>', lambda e: self._enter())
         self._enterbutton = tk.Button(self._top, text="Enter", command=self._enter)
         self._enterbutton.pack(side=tk.BOTTOM)
         self._entry = tk.Entry(self._top)
         self._entry.pack(side=tk.BOTTOM, expand=True, fill=tk.X)
+        self._show_games()
+
+    def _show_games(self):
+        """
+            Lists the catalog games whose names contain the filter text.
+        """
+        self._shown_games = self._catalog.get_games(self._filter.get())
+        self._games_list.delete(0, tk.END)
+        for entry in self._shown_games:
+            self._games_list.insert(tk.END, describe_game(entry))
 
     def _enter(self):
         """
-            This function get the entry of the user as a string and if is a proper one
-            it load that game path. If is wrong, display a messagebox
+            This function get the entry of the user as a string (or the game
+            selected in the list) and if is a proper one it load that game path.
+            If is wrong, display a messagebox
         """
-        self._entry.get()
+        path = self._entry.get()
+        selection = self._games_list.curselection()
+        if not path and selection:
+            path = self._catalog.get_path(self._shown_games[selection[0]]['name'])
         try:
-            self._model= Model(self._entry.get())
+            model = new_model(path, self._sprites, self._paths)
+            self._model.close()
+            self._model = model
+            self._walk = []
+            self._view._level_view.set_dimensions(self._model.get_current_maze().get_dimensions())
             self._redraw()
             self._top.destroy()
-        except FileNotFoundError:
+        except (FileNotFoundError, IsADirectoryError):
             messagebox.showinfo(title='title', message='Wrong game path')
         
 
@@ -654,18 +1024,63 @@ class UpgradedMazeRunner(GraphicalMazeRunner):
             
         
 
-def play_game(root: tk.Tk):
+def play_game(root: tk.Tk, model: Optional[Model] = None, sprites: Optional[SpriteCache] = None, paths: Optional[PathFinder] = None):
     if TASK == 1:
         controller = GraphicalMazeRunner
     elif TASK == 2:
         controller = UpgradedMazeRunner   
-    app = controller(GAME_FILE, root)
+    app = controller(GAME_FILE, root, model, sprites, paths)
     app.play()
     root.mainloop()
+
+def _warm_sprites(sprites: SpriteCache, level: Level) -> None:
+    """
+        Resizes the images and draws the background for a level at the cell
+        size the level view will use for it. Runs on the prefetch thread.
+    """
+    rows, cols = level.get_dimensions()
+    cell_size = (MAZE_WIDTH // cols, MAZE_HEIGHT // rows)
+    try:
+        sprites.prepare(list(ENTITY_IMAGES.values()), cell_size)
+        sprites.prepare_background(get_tile_ids(level.get_maze().get_tiles()), cell_size)
+    except (ImportError, OSError):
+        pass # Only a warm-up; the view reports these errors when it draws
+
+def new_model(game_file: str, sprites: Optional[SpriteCache] = None, paths: Optional[PathFinder] = None) -> Model:
+    """
+        Returns a new game whose levels are parsed in the background, one level
+        ahead of the player, warming the sprite cache for each level (TASK 2)
+        and preparing the path finder for each level, off the Tk thread.
+    """
+    def on_parsed(level: Level) -> None:
+        if TASK == 2 and sprites is not None:
+            _warm_sprites(sprites, level)
+        if paths is not None:
+            paths.prepare(level)
+    return Model(game_file, levels=PrefetchedLevels(game_file, on_parsed))
     
+def _load_model(game_file: str, loaded: list, sprites: SpriteCache, paths: PathFinder) -> None:
+    """
+        Loads the game file into a Model and appends it (or the error raised
+        while loading) to loaded. Used to parse the game in a background thread.
+    """
+    try:
+        loaded.append(new_model(game_file, sprites, paths))
+    except Exception as error:
+        loaded.append(error)
+
 def main():
-    root = tk.Tk()   
-    play_game(root)
+    #Parse the game file in the background while the window is being created.
+    loaded = []
+    sprites = SpriteCache()
+    paths = PathFinder()
+    loader = threading.Thread(target=_load_model, args=(GAME_FILE, loaded, sprites, paths))
+    loader.start()
+    root = tk.Tk()
+    loader.join()
+    if isinstance(loaded[0], Exception):
+        raise loaded[0]
+    play_game(root, loaded[0], sprites, paths)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,392 @@
+""" Mazes stored in files, for levels too large to keep in memory.
+
+A ChunkedMaze keeps its tiles in a file, one byte per cell, split into square
+chunks so that the cells near the player are close together on disk. Chunks
+are read as they are needed and kept within a memory budget.
+
+load_chunked_game reads a game file into levels backed by such mazes. Call
+Level.close on each level when done with it, to write back unlocked doors and
+close its file.
+"""
+from __future__ import annotations
+import os
+import struct
+from collections import OrderedDict
+
+from game import Tile, Wall, Empty, Lava, Door, Maze, Level
+from constants import *
+
+# File layout: header, then every chunk (row-major, chunk_size ** 2 bytes each,
+# padded with walls), then the door index (count followed by (row, col) pairs)
+_MAGIC = b'MZC1'
+_HEADER = struct.Struct('<4sIII')
+_DOOR_COUNT = struct.Struct('<Q')
+_DOOR_POSITION = struct.Struct('<II')
+
+# Unlocked doors are stored with their own byte so the state survives eviction
+_UNLOCKED_DOOR = b'd'
+
+
+class ChunkedMaze(Maze):
+    """ A maze whose tiles live in a file, split into square chunks. Chunks are
+        read on demand by get_tile and kept in a least recently used cache
+        bounded by a memory budget. Chunks holding unlocked doors are written
+        back when evicted or flushed.
+
+        Tiles are shared between cells of the same kind, so the Tile instances
+        returned by get_tile must not be changed directly; use unlock_door.
+
+        Copies share the file and the chunk cache, but keep their own door
+        state, which isn't written to the file.
+    """
+    def __init__(
+        self,
+        dimensions: tuple[int, int],
+        path: str,
+        chunk_size: int = MAZE_CHUNK_SIZE,
+        cache_bytes: int = MAZE_CACHE_BYTES
+    ) -> None:
+        """ Sets up an empty chunked maze, creating (or truncating) the file at
+            path. Rows are added with add_row.
+
+        Parameters:
+            dimensions: (#rows, #columns)
+            path: The file in which to store the maze.
+            chunk_size: The side length (in cells) of each chunk.
+            cache_bytes: The memory budget for loaded chunks.
+        """
+        super().__init__(dimensions)
+        self._setup(path, chunk_size, cache_bytes)
+        self._doors = []
+        self._num_rows = 0
+
+        self._file = open(path, 'w+b')
+        rows, cols = dimensions
+        self._file.write(_HEADER.pack(_MAGIC, rows, cols, chunk_size))
+        self._write_door_index()
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        cache_bytes: int = MAZE_CACHE_BYTES
+    ) -> 'ChunkedMaze':
+        """ Opens a chunked maze previously written to path.
+
+        Parameters:
+            path: The file in which the maze is stored.
+            cache_bytes: The memory budget for loaded chunks.
+
+        Raises:
+            ValueError: If the file is not a chunked maze.
+        """
+        with open(path, 'rb') as file:
+            magic, rows, cols, chunk_size = \
+                _HEADER.unpack(file.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a chunked maze file')
+
+        maze = cls.__new__(cls)
+        Maze.__init__(maze, (rows, cols))
+        maze._setup(path, chunk_size, cache_bytes)
+        maze._num_rows = rows
+
+        maze._file = open(path, 'r+b')
+        maze._file.seek(maze._door_index_offset())
+        count, = _DOOR_COUNT.unpack(maze._file.read(_DOOR_COUNT.size))
+        data = maze._file.read(count * _DOOR_POSITION.size)
+        maze._doors = list(_DOOR_POSITION.iter_unpack(data))
+        return maze
+
+    def _setup(self, path: str, chunk_size: int, cache_bytes: int) -> None:
+        """ Sets up the chunk cache and the shared tiles for this maze.
+
+        Parameters:
+            path: The file in which the maze is stored.
+            chunk_size: The side length (in cells) of each chunk.
+            cache_bytes: The memory budget for loaded chunks.
+        """
+        self._path = path
+        self._chunk_size = chunk_size
+        self._max_chunks = max(1, cache_bytes // (chunk_size * chunk_size))
+        self._chunks = OrderedDict() # Maps chunk positions to bytearrays
+        self._dirty = set()
+        self._band = [] # Rows added but not yet written to the file
+        self._door = None # A copy's own door, which all of its doors share
+
+        locked_door, unlocked_door = Door(), Door()
+        unlocked_door.unlock()
+        self._flyweights = {
+            ord(WALL): Wall(),
+            ord(EMPTY): Empty(),
+            ord(LAVA): Lava(),
+            ord(DOOR): locked_door,
+            ord(_UNLOCKED_DOOR): unlocked_door,
+        }
+        # Anything that isn't a tile (e.g. an entity) has empty ground under it
+        tiles = {ord(tile) for tile in self.TILES}
+        self._row_table = bytes(
+            byte if byte in tiles else ord(EMPTY) for byte in range(256)
+        )
+
+    def _num_chunks(self) -> tuple[int, int]:
+        """ Returns the number of (chunk rows, chunk columns) in the maze. """
+        rows, cols = self._dimensions
+        size = self._chunk_size
+        return -(-rows // size), -(-cols // size)
+
+    def _chunk_offset(self, chunk: tuple[int, int]) -> int:
+        """ Returns the file offset of the chunk at the given chunk position.
+
+        Parameters:
+            chunk: The (chunk row, chunk column) of the chunk.
+        """
+        _, chunk_cols = self._num_chunks()
+        chunk_row, chunk_col = chunk
+        index = chunk_row * chunk_cols + chunk_col
+        return _HEADER.size + index * self._chunk_size * self._chunk_size
+
+    def _door_index_offset(self) -> int:
+        """ Returns the file offset of the door index. """
+        chunk_rows, chunk_cols = self._num_chunks()
+        cells = chunk_rows * chunk_cols * self._chunk_size * self._chunk_size
+        return _HEADER.size + cells
+
+    def _write_door_index(self) -> None:
+        """ Writes the door index after the last chunk in the file. """
+        self._file.seek(self._door_index_offset())
+        self._file.write(_DOOR_COUNT.pack(len(self._doors)))
+        for position in self._doors:
+            self._file.write(_DOOR_POSITION.pack(*position))
+        self._file.truncate()
+
+    def add_row(self, row: str) -> None:
+        """ Adds a row of tiles to the maze. Rows are written to the file once
+            a full band of chunks is complete.
+
+        Parameters:
+            row: String of the tile IDs from which to construct Tile instances.
+        """
+        row_num = self._num_rows
+        cols = self._dimensions[1]
+        data = row.encode('ascii', 'replace').translate(self._row_table)
+        data = data[:cols].ljust(cols, WALL.encode())
+        col = data.find(DOOR.encode())
+        while col != -1:
+            self._doors.append((row_num, col))
+            col = data.find(DOOR.encode(), col + 1)
+
+        self._band.append(data)
+        self._num_rows += 1
+        if len(self._band) == self._chunk_size \
+                or self._num_rows == self._dimensions[0]:
+            self._write_band(row_num // self._chunk_size)
+        if self._num_rows == self._dimensions[0]:
+            self._write_door_index()
+
+    def _write_band(self, chunk_row: int) -> None:
+        """ Splits the buffered rows into chunks and writes them to the file.
+
+        Parameters:
+            chunk_row: The chunk row that the buffered rows belong to.
+        """
+        size = self._chunk_size
+        _, chunk_cols = self._num_chunks()
+        padding = WALL.encode() * (chunk_cols * size)
+        band = [row.ljust(chunk_cols * size, WALL.encode()) for row in self._band]
+        band.extend([padding] * (size - len(band)))
+
+        data = bytearray()
+        for chunk_col in range(chunk_cols):
+            start = chunk_col * size
+            for row in band:
+                data += row[start:start + size]
+        self._file.seek(self._chunk_offset((chunk_row, 0)))
+        self._file.write(data)
+        self._band = []
+
+    def _get_chunk(self, chunk: tuple[int, int]) -> bytearray:
+        """ Returns the cells of a chunk, loading it from the file if it isn't
+            cached and evicting the least recently used chunk if needed.
+
+        Parameters:
+            chunk: The (chunk row, chunk column) of the chunk.
+        """
+        cells = self._chunks.get(chunk)
+        if cells is not None:
+            self._chunks.move_to_end(chunk)
+            return cells
+
+        self._file.seek(self._chunk_offset(chunk))
+        cells = bytearray(self._file.read(self._chunk_size * self._chunk_size))
+        self._chunks[chunk] = cells
+        if len(self._chunks) > self._max_chunks:
+            old_chunk, old_cells = self._chunks.popitem(last=False)
+            if old_chunk in self._dirty:
+                self._write_chunk(old_chunk, old_cells)
+        return cells
+
+    def _write_chunk(self, chunk: tuple[int, int], cells: bytearray) -> None:
+        """ Writes a modified chunk back to the file.
+
+        Parameters:
+            chunk: The (chunk row, chunk column) of the chunk.
+            cells: The cells of the chunk.
+        """
+        self._file.seek(self._chunk_offset(chunk))
+        self._file.write(cells)
+        self._dirty.discard(chunk)
+
+    def _locate(self, position: tuple[int, int]) -> tuple[tuple[int, int], int]:
+        """ Returns the chunk containing a position and the index of the
+            position within that chunk. Negative indices count back from the
+            end, as they do for an in-memory Maze.
+
+        Parameters:
+            position: The (row, column) position to locate.
+        """
+        row, col = position
+        rows, cols = self._dimensions
+        if row < 0:
+            row += rows
+        if col < 0:
+            col += cols
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise IndexError(f'{position} is outside the maze')
+        size = self._chunk_size
+        chunk = row // size, col // size
+        return chunk, (row % size) * size + col % size
+
+    def get_tile(self, position: tuple[int, int]) -> Tile:
+        """ Returns the Tile instance at the given position.
+
+        Parameters:
+            position: The (row, column) position from which to find the tile.
+        """
+        chunk, index = self._locate(position)
+        return self._flyweights[self._get_chunk(chunk)[index]]
+
+    def unlock_door(self) -> None:
+        """ Unlocks any doors that exist in the maze. """
+        if self._door is not None:
+            self._door.unlock()
+            return
+        for position in self._doors:
+            chunk, index = self._locate(position)
+            self._get_chunk(chunk)[index] = ord(_UNLOCKED_DOOR)
+            self._dirty.add(chunk)
+
+    def _get_row(self, row: int) -> bytes:
+        """ Returns the stored bytes of a single row, read through the cache.
+
+        Parameters:
+            row: The index of the row to read.
+        """
+        size = self._chunk_size
+        chunk_row, offset = divmod(row, size)
+        _, chunk_cols = self._num_chunks()
+        data = b''.join(
+            self._get_chunk((chunk_row, chunk_col))[
+                offset * size:(offset + 1) * size
+            ]
+            for chunk_col in range(chunk_cols)
+        )
+        return data[:self._dimensions[1]]
+
+    def get_tiles(self) -> list[list[Tile]]:
+        """ Returns the Tile instances in this maze. Each element is a row of
+            Tile instances in order.
+
+        Note: this reads the whole maze; use get_tile for large mazes.
+        """
+        flyweights = self._flyweights
+        return [
+            [flyweights[byte] for byte in self._get_row(row)]
+            for row in range(self._num_rows)
+        ]
+
+    def copy(self) -> ChunkedMaze:
+        """ Returns a maze over the same file and chunk cache with its own door
+            state. The copy can be used until this maze is closed.
+        """
+        maze = ChunkedMaze.__new__(ChunkedMaze)
+        maze.__dict__.update(self.__dict__)
+        door = Door()
+        if self._doors and not self.get_tile(self._doors[0]).is_blocking():
+            door.unlock()
+        maze._door = door
+        maze._flyweights = {**self._flyweights,
+                            ord(DOOR): door, ord(_UNLOCKED_DOOR): door}
+        return maze
+
+    def get_chunk_size(self) -> int:
+        """ Returns the side length (in cells) of each chunk. """
+        return self._chunk_size
+
+    def get_loaded_chunks(self) -> list[tuple[int, int]]:
+        """ Returns the chunks currently cached, least recently used first. """
+        return list(self._chunks)
+
+    def flush(self) -> None:
+        """ Writes every modified chunk back to the file. """
+        for chunk in list(self._dirty):
+            self._write_chunk(chunk, self._chunks[chunk])
+        self._file.flush()
+
+    def close(self) -> None:
+        """ Flushes any modified chunks and closes the file. Closing a copy
+            does nothing, as the file belongs to the maze it was copied from.
+        """
+        if self._door is not None:
+            return
+        self.flush()
+        self._file.close()
+
+    def __str__(self) -> str:
+        """ Returns the string representation of this maze. """
+        doors = DOOR.encode() + _UNLOCKED_DOOR
+        table = bytes.maketrans(doors, ''.join(
+            self._flyweights[door].get_id() for door in doors
+        ).encode())
+        return '\n'.join(
+            self._get_row(row).translate(table).decode()
+            for row in range(self._num_rows)
+        )
+
+    def __repr__(self) -> str:
+        """ Returns the computer representation of this maze. """
+        return f"ChunkedMaze({self._dimensions}, '{self._path}')"
+
+
+def load_chunked_game(
+    filename: str,
+    directory: str,
+    chunk_size: int = MAZE_CHUNK_SIZE,
+    cache_bytes: int = MAZE_CACHE_BYTES
+) -> list[Level]:
+    """ Reads a game file like load_game, but stores each level's maze in a
+        chunked file inside directory instead of in memory.
+
+    Parameters:
+        filename: The path to the game file
+        directory: The directory in which to create the maze files
+        chunk_size: The side length (in cells) of each chunk
+        cache_bytes: The memory budget for loaded chunks of each maze
+
+    Returns:
+        A list of all Level instances to play in the game
+    """
+    os.makedirs(directory, exist_ok=True)
+    levels = []
+    with open(filename, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith('Maze'):
+                _, _, dimensions = line[5:].partition(' - ')
+                dimensions = [int(item) for item in dimensions.split()]
+                path = os.path.join(directory, f'level{len(levels) + 1}.mzc')
+                maze = ChunkedMaze(dimensions, path, chunk_size, cache_bytes)
+                levels.append(Level(dimensions, maze))
+            elif len(line) > 0 and len(levels) > 0:
+                levels[-1].add_row(line)
+    return levels
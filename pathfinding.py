@@ -0,0 +1,627 @@
+""" Shortest safe paths through a level.
+
+A step onto a cell costs 1 plus the damage done by its tile, so paths avoid
+walls and locked doors and prefer to walk around lava. A distance field holds
+the cost of reaching one target from every cell. DynamicDistanceField keeps a
+field up to date as cells open, close or change cost (e.g. when doors unlock)
+by repairing only the cells whose distances change, and PathService shares
+such fields between everything asking for paths through a level (hints, the
+click-to-walk in the Tk view, solvers). FlowField is a field towards the player
+limited to a radius, shared by every enemy in a level.
+"""
+from __future__ import annotations
+import heapq
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from constants import *
+
+if TYPE_CHECKING: # game imports this module to move enemies
+    from game import Level, Maze
+
+UNREACHABLE = -1 # The distance of a cell with no path to the target
+BLOCKED = -1 # The cost of a cell that can't be stepped onto
+_MAX_TILE_COST = 1 + LAVA_DAMAGE # The cost of stepping onto lava, the dearest tile
+
+
+def cell_costs(maze: Maze) -> list[int]:
+    """ Returns the cost of stepping onto each cell of a maze (indexed row by
+        row), or BLOCKED.
+
+    Parameters:
+        maze: The maze to find the costs for.
+    """
+    return [
+        BLOCKED if tile.is_blocking() else 1 + tile.damage()
+        for row in maze.get_tiles() for tile in row
+    ]
+
+
+def _neighbours(index: int, rows: int, cols: int) -> list[int]:
+    """ Returns the indices of the cells next to a cell.
+
+    Parameters:
+        index: The index of the cell.
+        rows: The number of rows in the maze.
+        cols: The number of columns in the maze.
+    """
+    row, col = divmod(index, cols)
+    neighbours = []
+    if row > 0:
+        neighbours.append(index - cols)
+    if row < rows - 1:
+        neighbours.append(index + cols)
+    if col > 0:
+        neighbours.append(index - 1)
+    if col < cols - 1:
+        neighbours.append(index + 1)
+    return neighbours
+
+
+def distance_field(
+    costs: list[int],
+    dimensions: tuple[int, int],
+    target: int
+) -> list[int]:
+    """ Returns the cost of the cheapest path from every cell to the target,
+        or UNREACHABLE. Step costs are small integers, so cells are settled
+        with a bucket queue (Dial's algorithm) rather than a heap.
+
+    Parameters:
+        costs: The cost of stepping onto each cell, or BLOCKED.
+        dimensions: The (#rows, #columns) of the maze.
+        target: The index of the target cell.
+    """
+    rows, cols = dimensions
+    distances = [UNREACHABLE] * (rows * cols)
+    if costs[target] == BLOCKED:
+        return distances
+    buckets = [[] for _ in range(max(costs) + 1)]
+    buckets[0].append(target)
+    distances[target] = 0
+    num_queued, cost = 1, 0
+
+    while num_queued:
+        bucket = buckets[cost % len(buckets)]
+        while bucket:
+            index = bucket.pop()
+            num_queued -= 1
+            if distances[index] != cost:
+                continue # Already settled with a lower cost
+            # Moves between open cells are symmetric, so every open neighbour
+            # of this cell can step onto it
+            step = cost + costs[index]
+            for neighbour in _neighbours(index, rows, cols):
+                if costs[neighbour] != BLOCKED and (
+                    distances[neighbour] == UNREACHABLE
+                    or step < distances[neighbour]
+                ):
+                    distances[neighbour] = step
+                    buckets[step % len(buckets)].append(neighbour)
+                    num_queued += 1
+        cost += 1
+    return distances
+
+
+def bounded_distances(
+    costs: list[int],
+    dimensions: tuple[int, int],
+    target: int,
+    max_distance: int,
+    max_cost: Optional[int] = None
+) -> tuple[dict[int, int], list[int]]:
+    """ Returns the cost of the cheapest path to the target from every cell
+        within max_distance of it. Only those cells are visited, so the work
+        doesn't grow with the size of the maze.
+
+    Parameters:
+        costs: The cost of stepping onto each cell, or BLOCKED. Only the cells
+            visited are looked up.
+        dimensions: The (#rows, #columns) of the maze.
+        target: The index of the target cell.
+        max_distance: The largest distance to find.
+        max_cost: The largest cost of a cell, if not the largest in costs.
+
+    Returns:
+        The distances of the cells that were reached, and those cells in order
+        of increasing distance.
+    """
+    rows, cols = dimensions
+    distances, order = {}, []
+    if costs[target] == BLOCKED:
+        return distances, order
+    if max_cost is None:
+        max_cost = max(costs)
+    buckets = [[] for _ in range(max_cost + 1)]
+    buckets[0].append(target)
+    distances[target] = 0
+    num_queued, cost = 1, 0
+
+    while num_queued and cost <= max_distance:
+        bucket = buckets[cost % len(buckets)]
+        while bucket:
+            index = bucket.pop()
+            num_queued -= 1
+            if distances[index] != cost:
+                continue
+            order.append(index)
+            step = cost + costs[index]
+            if step > max_distance:
+                continue
+            for neighbour in _neighbours(index, rows, cols):
+                if costs[neighbour] != BLOCKED and \
+                        step < distances.get(neighbour, step + 1):
+                    distances[neighbour] = step
+                    buckets[step % len(buckets)].append(neighbour)
+                    num_queued += 1
+        cost += 1
+    return distances, order
+
+
+def follow_field(
+    costs: list[int],
+    dimensions: tuple[int, int],
+    distances: list[int],
+    start: int
+) -> Optional[list[int]]:
+    """ Returns the cells along the cheapest path from start to the target of
+        a distance field (excluding start), or None if there is no path.
+
+    Parameters:
+        costs: The cost of stepping onto each cell, or BLOCKED.
+        dimensions: The (#rows, #columns) of the maze.
+        distances: The distance field.
+        start: The index of the cell to start from.
+    """
+    if distances[start] == UNREACHABLE:
+        return None
+    rows, cols = dimensions
+    path = []
+    index = start
+    while distances[index] > 0:
+        for neighbour in _neighbours(index, rows, cols):
+            if distances[neighbour] != UNREACHABLE and \
+                    distances[neighbour] + costs[neighbour] == distances[index]:
+                break
+        path.append(neighbour)
+        index = neighbour
+    return path
+
+
+class DynamicDistanceField:
+    """ A distance field that is repaired, rather than recomputed, when the
+        costs of some cells change.
+    """
+    def __init__(
+        self,
+        costs: list[int],
+        dimensions: tuple[int, int],
+        target: int
+    ) -> None:
+        """ Computes the field for a target.
+
+        Parameters:
+            costs: The cost of stepping onto each cell, or BLOCKED. The list is
+                shared with the caller, who updates it before calling update.
+            dimensions: The (#rows, #columns) of the maze.
+            target: The index of the target cell.
+        """
+        self._costs = costs
+        self._dimensions = dimensions
+        self._target = target
+        self._distances = distance_field(costs, dimensions, target)
+
+    def get_distances(self) -> list[int]:
+        """ Returns the cost of reaching the target from each cell, or
+            UNREACHABLE.
+        """
+        return self._distances
+
+    def _get_best(self, index: int, excluded: set[int]) -> int:
+        """ Returns the cheapest distance to the target through a neighbour of a
+            cell, or UNREACHABLE.
+
+        Parameters:
+            index: The index of the cell.
+            excluded: Cells whose distances can't be relied on.
+        """
+        if index == self._target:
+            return 0
+        costs, distances = self._costs, self._distances
+        best = UNREACHABLE
+        for neighbour in _neighbours(index, *self._dimensions):
+            if neighbour in excluded or distances[neighbour] == UNREACHABLE:
+                continue
+            distance = distances[neighbour] + costs[neighbour]
+            if best == UNREACHABLE or distance < best:
+                best = distance
+        return best
+
+    def update(self, old_costs: dict[int, int]) -> None:
+        """ Repairs the field after the costs of some cells have changed.
+
+        Parameters:
+            old_costs: Maps the index of each changed cell to its cost before
+                the change (the new costs are already in the shared list).
+        """
+        rows, cols = self._dimensions
+        costs, distances = self._costs, self._distances
+
+        # Find the cells whose cheapest path relied on a cell that closed or
+        # became more expensive, in order of their old distances
+        affected = set()
+        candidates = []
+        for index, old_cost in old_costs.items():
+            new_cost = costs[index]
+            if old_cost == BLOCKED or distances[index] == UNREACHABLE:
+                continue
+            if new_cost != BLOCKED and new_cost <= old_cost:
+                continue
+            if new_cost == BLOCKED:
+                affected.add(index)
+            through = distances[index] + old_cost
+            for neighbour in _neighbours(index, rows, cols):
+                if distances[neighbour] == through:
+                    heapq.heappush(candidates, (through, neighbour))
+        while candidates:
+            distance, index = heapq.heappop(candidates)
+            if index in affected or distances[index] != distance:
+                continue
+            if self._get_best(index, affected) == distance:
+                continue # Still supported by an unaffected neighbour
+            affected.add(index)
+            through = distance + old_costs.get(index, costs[index])
+            for neighbour in _neighbours(index, rows, cols):
+                if distances[neighbour] == through:
+                    heapq.heappush(candidates, (through, neighbour))
+        for index in affected:
+            distances[index] = UNREACHABLE
+
+        # Re-seed the affected cells from their neighbours, and the cells that
+        # opened or became cheaper, then propagate the improvements outwards
+        queue = []
+        for index in affected | old_costs.keys():
+            if costs[index] == BLOCKED:
+                continue
+            best = self._get_best(index, set())
+            if best != UNREACHABLE and (distances[index] == UNREACHABLE
+                                        or best < distances[index]):
+                distances[index] = best
+            if distances[index] != UNREACHABLE:
+                queue.append((distances[index], index))
+        heapq.heapify(queue)
+        while queue:
+            distance, index = heapq.heappop(queue)
+            if distances[index] != distance:
+                continue
+            through = distance + costs[index]
+            for neighbour in _neighbours(index, rows, cols):
+                if costs[neighbour] != BLOCKED and (
+                    distances[neighbour] == UNREACHABLE
+                    or through < distances[neighbour]
+                ):
+                    distances[neighbour] = through
+                    heapq.heappush(queue, (through, neighbour))
+
+
+class PathService:
+    """ Shortest safe paths through one level, from distance fields that are
+        kept for recently requested targets and repaired as the level changes.
+    """
+    def __init__(self, level: Level, max_fields: int = PATH_CACHE_SIZE) -> None:
+        """ Sets up the service for a level.
+
+        Parameters:
+            level: The level to find paths through.
+            max_fields: The number of distance fields to keep.
+        """
+        self._level = level
+        self._dimensions = tuple(level.get_dimensions())
+        self._costs = cell_costs(level.get_maze())
+        self._max_fields = max_fields
+        self._fields = OrderedDict() # Maps target index to its distance field
+        self._door_state = self._get_door_state()
+
+    def get_level(self) -> Level:
+        """ Returns the level this service finds paths through. """
+        return self._level
+
+    def _get_door_state(self) -> tuple[bool, ...]:
+        """ Returns whether each door in the level is blocking. """
+        maze = self._level.get_maze()
+        return tuple(maze.get_tile(position).is_blocking()
+                     for position in maze.get_doors())
+
+    def _get_index(self, position: tuple[int, int]) -> Optional[int]:
+        """ Returns the index of a position, or None if it is outside the maze.
+
+        Parameters:
+            position: The (row, column) position.
+        """
+        rows, cols = self._dimensions
+        row, col = position
+        if 0 <= row < rows and 0 <= col < cols:
+            return row * cols + col
+        return None
+
+    def update_cells(self, positions: Iterable[tuple[int, int]]) -> None:
+        """ Repairs every kept field after the tiles at some positions have
+            changed. Door unlocks are picked up automatically.
+
+        Parameters:
+            positions: The (row, column) positions of the changed tiles.
+        """
+        maze = self._level.get_maze()
+        old_costs = {}
+        for position in positions:
+            index = self._get_index(position)
+            if index is None:
+                continue
+            tile = maze.get_tile(position)
+            cost = BLOCKED if tile.is_blocking() else 1 + tile.damage()
+            if cost != self._costs[index]:
+                old_costs.setdefault(index, self._costs[index])
+                self._costs[index] = cost
+        if old_costs:
+            for field in self._fields.values():
+                field.update(old_costs)
+
+    def _sync(self) -> None:
+        """ Repairs the kept fields if any doors have unlocked. """
+        door_state = self._get_door_state()
+        if door_state != self._door_state:
+            self._door_state = door_state
+            self.update_cells(self._level.get_maze().get_doors())
+
+    def get_distances(self, target: tuple[int, int]) -> list[int]:
+        """ Returns the cost of reaching a target from each cell (indexed row by
+            row), or UNREACHABLE. Every cell is UNREACHABLE from a target
+            outside the maze.
+
+        Parameters:
+            target: The (row, column) position to reach.
+        """
+        self._sync()
+        index = self._get_index(target)
+        if index is None:
+            rows, cols = self._dimensions
+            return [UNREACHABLE] * (rows * cols)
+        field = self._fields.get(index)
+        if field is None:
+            field = DynamicDistanceField(self._costs, self._dimensions, index)
+            self._fields[index] = field
+            if len(self._fields) > self._max_fields:
+                self._fields.popitem(last=False)
+        else:
+            self._fields.move_to_end(index)
+        return field.get_distances()
+
+    def get_distance(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[int]:
+        """ Returns the cost of the cheapest safe path from start to target, or
+            None if the target can't be reached.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        start_index = self._get_index(start)
+        if start_index is None or self._get_index(target) is None:
+            return None
+        distance = self.get_distances(target)[start_index]
+        return None if distance == UNREACHABLE else distance
+
+    def find_path(
+        self,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[list[tuple[int, int]]]:
+        """ Returns the positions along the cheapest safe path from start to
+            target (excluding start), or None if the target can't be reached.
+
+        Parameters:
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        if self.get_distance(start, target) is None:
+            return None
+        cols = self._dimensions[1]
+        path = follow_field(
+            self._costs,
+            self._dimensions,
+            self.get_distances(target),
+            self._get_index(start)
+        )
+        return [divmod(index, cols) for index in path]
+
+
+class PathFinder:
+    """ Finds the cheapest safe paths through whichever level is being played,
+        through a PathService for the current level (or, for very large
+        levels, a HierarchicalPathService, whose paths are near-cheapest).
+        Hierarchical services are slow to start, so they can be prepared on a
+        background thread before their level is played.
+    """
+    def __init__(
+        self,
+        max_fields: int = PATH_CACHE_SIZE,
+        hierarchical_cells: int = HPA_MIN_CELLS
+    ) -> None:
+        """ Sets up the finder.
+
+        Parameters:
+            max_fields: The number of distance fields to keep.
+            hierarchical_cells: The number of cells from which levels are
+                searched hierarchically.
+        """
+        self._max_fields = max_fields
+        self._hierarchical_cells = hierarchical_cells
+        self._service = None
+        self._prepared = OrderedDict() # Maps levels to services built ahead
+        self._lock = threading.Lock() # Guards _prepared
+
+    def get_service(self, level: Level) -> PathService:
+        """ Returns the path service for a level, replacing the previous
+            level's service if the level has changed.
+
+        Parameters:
+            level: The level being played.
+        """
+        if self._service is None or self._service.get_level() is not level:
+            with self._lock:
+                service = self._prepared.pop(level, None)
+            if service is not None:
+                self._service = service
+            elif self._is_hierarchical(level):
+                from hpa import HierarchicalPathService # hpa builds on this module
+                self._service = HierarchicalPathService(level)
+            else:
+                self._service = PathService(level, self._max_fields)
+        return self._service
+
+    def _is_hierarchical(self, level: Level) -> bool:
+        """ Returns True iff a level is large enough to search hierarchically.
+
+        Parameters:
+            level: The level to check.
+        """
+        rows, cols = level.get_dimensions()
+        return rows * cols >= self._hierarchical_cells
+
+    def prepare(self, level: Level) -> None:
+        """ Builds the service for a level before it is played, if it needs
+            building (only hierarchical services do). Can be called from a
+            background thread, e.g. as levels are prefetched.
+
+        Parameters:
+            level: A level that is about to be played.
+        """
+        if not self._is_hierarchical(level):
+            return
+        from hpa import HierarchicalPathService
+        service = HierarchicalPathService(level)
+        service.prepare()
+        with self._lock:
+            self._prepared[level] = service
+            while len(self._prepared) > PREFETCH_LEVELS + 1:
+                self._prepared.popitem(last=False)
+
+    def find_path(
+        self,
+        level: Level,
+        start: tuple[int, int],
+        target: tuple[int, int]
+    ) -> Optional[list[tuple[int, int]]]:
+        """ Returns the positions along the cheapest safe path from start to
+            target (excluding start), or None if the target can't be reached.
+
+        Parameters:
+            level: The level being played.
+            start: The (row, column) position to start from.
+            target: The (row, column) position to reach.
+        """
+        return self.get_service(level).find_path(start, target)
+
+
+class _TileCosts(dict):
+    """ The costs of the cells of a maze (by index), read from its tiles as
+        they are first looked up, so a search near one cell doesn't cost memory
+        for the whole maze.
+    """
+    def __init__(self, maze: Maze) -> None:
+        """ Sets up the costs of a maze, with none read yet.
+
+        Parameters:
+            maze: The maze to read tiles from.
+        """
+        super().__init__()
+        self._maze = maze
+        self._cols = maze.get_dimensions()[1]
+
+    def __missing__(self, index: int) -> int:
+        tile = self._maze.get_tile(divmod(index, self._cols))
+        cost = BLOCKED if tile.is_blocking() else 1 + tile.damage()
+        self[index] = cost
+        return cost
+
+
+class FlowField:
+    """ The cheapest way towards a target (the player) from every cell within a
+        radius of it. Enemies share one field per level and step downhill
+        through it, so they don't each search for the player.
+
+        The field isn't repaired when the target moves: every distance in it is
+        measured from the target, so a move changes nearly all of them and a
+        repair would touch as many cells as a fresh search. Instead it is
+        recomputed by a search bounded by the radius, which costs
+        O(r^2 log r) for a radius r however large the maze is (a few
+        thousand cells at ENEMY_SIGHT), and is skipped when neither the
+        target nor any door has changed.
+    """
+    def __init__(self, level: Level, radius: int = ENEMY_SIGHT) -> None:
+        """ Sets up an empty field for a level.
+
+        Parameters:
+            level: The level the field covers.
+            radius: The largest distance from the target to cover.
+        """
+        self._level = level
+        self._dimensions = tuple(level.get_dimensions())
+        self._costs = _TileCosts(level.get_maze())
+        self._radius = radius
+        self._target = None
+        self._distances = {}
+        self._order = []
+        self._door_state = self._get_door_state()
+
+    def _get_door_state(self) -> tuple[bool, ...]:
+        """ Returns whether each door in the level is blocking. """
+        maze = self._level.get_maze()
+        return tuple(maze.get_tile(position).is_blocking()
+                     for position in maze.get_doors())
+
+    def set_target(self, target: tuple[int, int]) -> None:
+        """ Moves the target, recomputing the field if the target has moved or
+            the level's doors have unlocked since it was last computed.
+
+        Parameters:
+            target: The (row, column) position to flow towards.
+        """
+        cols = self._dimensions[1]
+        index = target[0] * cols + target[1]
+        door_state = self._get_door_state()
+        if index == self._target and door_state == self._door_state:
+            return
+        self._door_state = door_state
+        self._target = index
+        # Only the costs of the cells near the target are kept
+        self._costs = _TileCosts(self._level.get_maze())
+        self._distances, self._order = bounded_distances(
+            self._costs, self._dimensions, index, self._radius, _MAX_TILE_COST
+        )
+
+    def get_cells(self) -> list[int]:
+        """ Returns the indices of the cells in the field, nearest first. """
+        return self._order
+
+    def get_next(self, index: int) -> Optional[int]:
+        """ Returns the index of the next cell on the cheapest way from a cell
+            to the target, or None if the cell is outside the field or is the
+            target.
+
+        Parameters:
+            index: The index of the cell.
+        """
+        distances = self._distances
+        distance = distances.get(index)
+        if not distance:
+            return None
+        for neighbour in _neighbours(index, *self._dimensions):
+            if neighbour in distances and \
+                    distances[neighbour] + self._costs[neighbour] == distance:
+                return neighbour
+        return None
@@ -0,0 +1,142 @@
+""" Levels parsed in the background while the game is being played.
+
+PrefetchedLevels reads a game file on a background thread, staying a fixed
+number of levels ahead of the one being played. By the time the player levels
+up, the next level is already parsed, so the switch only swaps which level the
+model points at.
+"""
+from __future__ import annotations
+import threading
+from collections.abc import Sequence
+from typing import Callable, Optional
+
+from game import iter_levels, Level
+from constants import *
+
+
+def count_levels(game_file: str) -> int:
+    """ Returns the number of levels in a game file by scanning its headers.
+
+    Parameters:
+        game_file: The path to the game file.
+    """
+    with open(game_file, 'r') as file:
+        return sum(1 for line in file if line.lstrip().startswith('Maze'))
+
+
+class PrefetchedLevels(Sequence):
+    """ The levels of a game file, parsed on a background thread a few levels
+        ahead of the most recently requested one.
+    """
+    def __init__(
+        self,
+        game_file: str,
+        on_parsed: Optional[Callable[[Level], None]] = None,
+        lookahead: int = PREFETCH_LEVELS
+    ) -> None:
+        """ Starts parsing the game file.
+
+        Parameters:
+            game_file: The path to the game file.
+            on_parsed: Called on the background thread with each level once it
+                is parsed (e.g. to warm caches for drawing it).
+            lookahead: The number of levels to parse beyond the one requested.
+        """
+        self._game_file = game_file
+        self._on_parsed = on_parsed
+        self._lookahead = lookahead
+        self._levels = []
+        self._length = None # Counted once the first level is parsed
+        self._wanted = 0 # The highest index requested so far
+        self._done = False
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._parse, daemon=True)
+        self._thread.start()
+
+    def _parse(self) -> None:
+        """ Parses levels as they are needed, until the file is exhausted or
+            parsing is stopped by close.
+        """
+        levels = iter_levels(self._game_file)
+        try:
+            for level in levels:
+                with self._condition:
+                    self._levels.append(level)
+                    self._condition.notify_all()
+                if self._length is None:
+                    # Counted here rather than in __len__, so the caller's
+                    # (Tk) thread never scans the file
+                    length = count_levels(self._game_file)
+                    with self._condition:
+                        self._length = length
+                        self._condition.notify_all()
+                if self._on_parsed is not None:
+                    self._on_parsed(level)
+                with self._condition:
+                    while len(self._levels) > self._wanted + self._lookahead \
+                            and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        break
+        except Exception as error:
+            self._error = error
+        finally:
+            levels.close() # Closes the game file
+        with self._condition:
+            self._done = True
+            if self._error is None and not self._closed:
+                self._length = len(self._levels)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """ Stops parsing, closing the game file. Levels already parsed can
+            still be used; later ones can't.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __len__(self) -> int:
+        """ Returns the number of levels in the game, waiting for them to be
+            counted if necessary. If parsing was stopped before they were
+            counted, only the levels parsed are.
+        """
+        with self._condition:
+            while self._length is None and not self._done:
+                self._condition.wait()
+            if self._length is not None:
+                return self._length
+            if self._error is not None:
+                raise self._error
+            return len(self._levels)
+
+    def __getitem__(self, index: int) -> Level:
+        """ Returns a level, waiting for it to be parsed if necessary.
+
+        Parameters:
+            index: The index of the level in the game.
+        """
+        if index < 0:
+            index += len(self)
+        with self._condition:
+            if index > self._wanted:
+                self._wanted = index
+                self._condition.notify_all()
+            while len(self._levels) <= index and not self._done:
+                self._condition.wait()
+            if index < len(self._levels) and index >= 0:
+                return self._levels[index]
+            if self._error is not None:
+                raise self._error
+        raise IndexError('level index out of range')
+
+    def is_parsed(self, index: int) -> bool:
+        """ Returns True iff the level at index has already been parsed.
+
+        Parameters:
+            index: The index of the level in the game.
+        """
+        with self._condition:
+            return index < len(self._levels)
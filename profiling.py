@@ -0,0 +1,227 @@
+""" Optional timing instrumentation for the game engine and views.
+
+Nothing is instrumented until enable() is called, at which point the functions
+in TARGETS (and the draw phases of every UserInterface subclass) are replaced by
+timed wrappers. disable() puts the original functions back, so a game that
+never enables profiling runs exactly the original code.
+
+Usage:
+    python profiling.py GAME_FILE MOVES [--json PATH] [--pstats PATH]
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import marshal
+from functools import wraps
+from time import perf_counter
+from typing import Callable
+
+# (module, qualified name) of each function to time. Subclasses overriding a
+# method are timed too.
+TARGETS = [
+    ('game', 'load_game'),
+    ('game', 'Maze.add_row'),
+    ('game', 'Level.add_row'),
+    ('game', 'Level.attempt_unlock_door'),
+    ('game', 'Model.move_player'),
+    ('game', 'Model.attempt_collect_item'),
+]
+
+# Methods timed on every UserInterface subclass that defines them
+DRAW_PHASES = ('draw', '_draw_level', '_draw_inventory', '_draw_player_stats')
+
+_patches = [] # (owner, attribute name, original) for every wrapped function
+_stats = {} # Maps labels to [calls, own time, total time, max time, code]
+_callers = {} # Maps (label, caller label) to [calls, own time, total time]
+_stack = [] # [label, time spent in timed callees] for each active call
+
+
+def is_enabled() -> bool:
+    """ Returns True iff profiling is currently enabled. """
+    return len(_patches) > 0
+
+
+def _timed(label: str, func: Callable) -> Callable:
+    """ Returns a wrapper around func that records its calls under label.
+
+    Parameters:
+        label: The name under which to record the calls.
+        func: The function to time.
+    """
+    code = getattr(func, '__code__', None)
+    location = (code.co_filename, code.co_firstlineno) if code else ('~', 0)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        frame = [label, 0.0]
+        _stack.append(frame)
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            _stack.pop()
+            own = elapsed - frame[1]
+            stats = _stats.get(label)
+            if stats is None:
+                stats = _stats[label] = [0, 0.0, 0.0, 0.0, location]
+            stats[0] += 1
+            stats[1] += own
+            stats[2] += elapsed
+            stats[3] = max(stats[3], elapsed)
+            if _stack:
+                caller = _stack[-1]
+                caller[1] += elapsed
+                edge = _callers.setdefault((label, caller[0]), [0, 0.0, 0.0])
+                edge[0] += 1
+                edge[1] += own
+                edge[2] += elapsed
+
+    return wrapper
+
+
+def _patch(owner: object, name: str, label: str) -> None:
+    """ Replaces owner.name with a timed wrapper, remembering the original.
+
+    Parameters:
+        owner: The module or class holding the function.
+        name: The attribute name of the function.
+        label: The name under which to record calls.
+    """
+    original = vars(owner)[name]
+    _patches.append((owner, name, original))
+    setattr(owner, name, _timed(label, original))
+
+
+def _subclasses(cls: type) -> list[type]:
+    """ Returns cls and every class that inherits from it.
+
+    Parameters:
+        cls: The class at the top of the hierarchy.
+    """
+    found = [cls]
+    for subclass in cls.__subclasses__():
+        found.extend(klass for klass in _subclasses(subclass)
+                     if klass not in found)
+    return found
+
+
+def enable() -> None:
+    """ Starts timing every target. Classes defined after this call (e.g. in
+        modules imported later) are not instrumented.
+    """
+    if is_enabled():
+        return
+    for module_name, qualified_name in TARGETS:
+        module = importlib.import_module(module_name)
+        class_name, _, name = qualified_name.rpartition('.')
+        if class_name == '':
+            _patch(module, name, name)
+            continue
+        for cls in _subclasses(getattr(module, class_name)):
+            if name in vars(cls):
+                _patch(cls, name, f'{cls.__name__}.{name}')
+
+    user_interface = importlib.import_module('game_support').UserInterface
+    for cls in _subclasses(user_interface):
+        for name in DRAW_PHASES:
+            if name in vars(cls):
+                _patch(cls, name, f'{cls.__name__}.{name}')
+
+
+def disable() -> None:
+    """ Stops timing and restores the original functions. Recorded stats are
+        kept until reset is called.
+    """
+    while _patches:
+        owner, name, original = _patches.pop()
+        setattr(owner, name, original)
+
+
+def reset() -> None:
+    """ Discards all recorded stats. """
+    _stats.clear()
+    _callers.clear()
+
+
+def get_stats() -> dict[str, dict[str, float]]:
+    """ Returns the aggregated stats for each timed function, mapping its label
+        to its number of calls and total, own and max time in seconds.
+    """
+    return {
+        label: {'calls': calls, 'total': total, 'own': own, 'max': longest}
+        for label, (calls, own, total, longest, _) in sorted(_stats.items())
+    }
+
+
+def export_json(path: str) -> None:
+    """ Writes the aggregated stats to a JSON file.
+
+    Parameters:
+        path: The file to write.
+    """
+    with open(path, 'w') as file:
+        json.dump(get_stats(), file, indent=2)
+
+
+def export_pstats(path: str) -> None:
+    """ Writes the aggregated stats in the format produced by cProfile, so they
+        can be read with pstats.Stats or tools such as snakeviz.
+
+    Parameters:
+        path: The file to write.
+    """
+    def key(label):
+        filename, line = _stats[label][4]
+        return filename, line, label
+
+    stats = {}
+    for label, (calls, own, total, _, _) in _stats.items():
+        callers = {
+            key(caller): (count, count, caller_own, caller_total)
+            for (callee, caller), (count, caller_own, caller_total)
+            in _callers.items() if callee == label
+        }
+        stats[key(label)] = (calls, calls, own, total, callers)
+    with open(path, 'wb') as file:
+        marshal.dump(stats, file)
+
+
+def main():
+    """ Replays a sequence of moves on a game with profiling enabled and
+        reports where the time went.
+    """
+    parser = argparse.ArgumentParser(description='Profile a MazeRunner game.')
+    parser.add_argument('game_file')
+    parser.add_argument('moves', help='moves to replay, e.g. "ddsswwaa"')
+    parser.add_argument('--json', help='write the stats to a JSON file')
+    parser.add_argument('--pstats', help='write a cProfile-compatible dump')
+    args = parser.parse_args()
+
+    from game import MazeRunner, TextInterface
+
+    enable()
+    runner = MazeRunner(args.game_file, TextInterface())
+    with contextlib.redirect_stdout(io.StringIO()):
+        for move in args.moves:
+            runner._redraw()
+            runner._handle_move(move)
+            if runner._model.has_won() or runner._model.has_lost():
+                break
+    disable()
+
+    for label, stats in get_stats().items():
+        print(f"{label:40} {stats['calls']:8} calls  "
+              f"{stats['total'] * 1000:10.3f} ms total  "
+              f"{stats['max'] * 1000:8.3f} ms max")
+    if args.json:
+        export_json(args.json)
+    if args.pstats:
+        export_pstats(args.pstats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+""" Bit-parallel reachability.
+
+The open (non-blocking) cells of each row of a maze are packed into a Python
+int, bit c standing for column c. A flood fill works on whole rows at a time:
+within a row, an addition (whose carry runs up each open run from its lowest
+reached cell) and a doubling shift-and-mask fill (which runs down) reach every
+cell of the runs already entered, and the reached cells of a row are carried
+into the rows above and below with a single mask. Rows are swept down and up
+the maze, skipping rows with nothing new, until no row changes. Each step costs
+a few operations on machine words in C rather than a Python step per cell.
+
+Validation, whether the door can be reached and which items can be collected
+are answered from one flood fill of a level.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from constants import *
+
+if TYPE_CHECKING:
+    from analysis_cache import AnalysisCache
+    from game import Level, Maze
+
+# Tile ids as bits of a row: blocking tiles (walls and locked doors) are 0
+_CLOSED = str.maketrans({tile: '0' for tile in (WALL, DOOR)})
+_OPEN = str.maketrans({tile: '1' for tile in (EMPTY, LAVA)})
+VALIDATION_VERSION = 1 # Bump when validate_level's results change
+
+
+class Bitboard:
+    """ The open cells of a maze as one int per row, and flood fills over
+        them. Sets of cells are lists of ints in the same layout.
+    """
+    def __init__(self, maze: Maze) -> None:
+        """ Packs the open cells of a maze.
+
+        Parameters:
+            maze: The maze to pack. Later changes to it are not seen.
+        """
+        self._dimensions = rows, cols = tuple(maze.get_dimensions())
+        # Bits run from the low end, so each row is reversed before parsing
+        lines = str(maze).translate(_CLOSED).translate(_OPEN).split('\n')
+        self._open = [int(line[::-1] or '0', 2) for line in lines[:rows]]
+        self._doors = self.pack(maze.get_doors())
+        self._shifts = [] # Shifts that double the reach of a fill each time
+        shift = 1
+        while shift < cols:
+            self._shifts.append(shift)
+            shift *= 2
+
+    def get_dimensions(self) -> tuple[int, int]:
+        """ Returns the (#rows, #columns) of the packed maze. """
+        return self._dimensions
+
+    def get_open(self) -> list[int]:
+        """ Returns the open cells. """
+        return self._open
+
+    def get_doors(self) -> list[int]:
+        """ Returns the doors (open or not). """
+        return self._doors
+
+    def pack(self, positions: Iterable[tuple[int, int]]) -> list[int]:
+        """ Returns a set of cells.
+
+        Parameters:
+            positions: The (row, column) positions of the cells.
+        """
+        bits = [0] * self._dimensions[0]
+        for row, col in positions:
+            bits[row] |= 1 << col
+        return bits
+
+    def unpack(self, bits: list[int]) -> list[tuple[int, int]]:
+        """ Returns the (row, column) positions of a set of cells, row by row.
+
+        Parameters:
+            bits: The set of cells.
+        """
+        positions = []
+        for row, row_bits in enumerate(bits):
+            if row_bits:
+                text = bin(row_bits)[:1:-1] # Lowest bit first
+                col = text.find('1')
+                while col != -1:
+                    positions.append((row, col))
+                    col = text.find('1', col + 1)
+        return positions
+
+    def count(self, bits: list[int]) -> int:
+        """ Returns the number of cells in a set.
+
+        Parameters:
+            bits: The set of cells.
+        """
+        return sum(bin(row_bits).count('1') for row_bits in bits)
+
+    def contains(self, bits: list[int], position: tuple[int, int]) -> bool:
+        """ Returns whether a set contains a cell.
+
+        Parameters:
+            bits: The set of cells.
+            position: The (row, column) position of the cell.
+        """
+        row, col = position
+        rows, cols = self._dimensions
+        return 0 <= row < rows and 0 <= col < cols and bits[row] >> col & 1 == 1
+
+    def intersects(self, bits: list[int], other: list[int]) -> bool:
+        """ Returns whether two sets share a cell.
+
+        Parameters:
+            bits: The first set of cells.
+            other: The second set of cells.
+        """
+        return any(first & second for first, second in zip(bits, other))
+
+    def spread(self, bits: list[int]) -> list[int]:
+        """ Returns the cells one step or less from a set of cells (open or
+            not).
+
+        Parameters:
+            bits: The set of cells.
+        """
+        rows, cols = self._dimensions
+        width = (1 << cols) - 1
+        spread = [(row_bits | row_bits << 1 | row_bits >> 1) & width
+                  for row_bits in bits]
+        for row in range(rows):
+            if row > 0:
+                spread[row] |= bits[row - 1]
+            if row < rows - 1:
+                spread[row] |= bits[row + 1]
+        return spread
+
+    def flood(
+        self,
+        seeds: list[int],
+        passable: Optional[list[int]] = None
+    ) -> list[int]:
+        """ Returns the cells that can be reached from a set of cells.
+
+        Parameters:
+            seeds: The cells to start from. Closed ones are ignored.
+            passable: The cells that can be walked through, if not the open
+                cells.
+        """
+        masks = self._open if passable is None else passable
+        shifts = self._shifts
+        rows = self._dimensions[0]
+        reached = [seed & mask for seed, mask in zip(seeds, masks)]
+        pending = bytearray(bool(row_bits) for row_bits in reached)
+        num_pending = sum(pending)
+        if not num_pending:
+            return reached
+        top = pending.index(1)
+        bottom = rows - 1 - pending[::-1].index(1)
+        downwards = True
+        while num_pending:
+            # Sweeping in the direction of travel carries a fill through many
+            # rows in one sweep, and only the band of rows reached is swept
+            sweep = range(top, bottom + 1) if downwards \
+                else range(bottom, top - 1, -1)
+            downwards = not downwards
+            for row in sweep:
+                if not pending[row]:
+                    continue
+                pending[row] = 0
+                num_pending -= 1
+                mask = masks[row]
+                row_bits = reached[row]
+                row_bits |= ((mask + row_bits) ^ mask) & mask
+                runs = mask
+                for shift in shifts:
+                    row_bits |= runs & (row_bits >> shift)
+                    runs &= runs >> shift
+                reached[row] = row_bits
+                for other in (row - 1, row + 1):
+                    if 0 <= other < rows:
+                        new = row_bits & masks[other] & ~reached[other]
+                        if new:
+                            reached[other] |= new
+                            if not pending[other]:
+                                pending[other] = 1
+                                num_pending += 1
+                                top = min(top, other)
+                                bottom = max(bottom, other)
+        return reached
+
+    def flood_from(
+        self,
+        position: tuple[int, int],
+        passable: Optional[list[int]] = None
+    ) -> list[int]:
+        """ Returns the cells that can be reached from a cell.
+
+        Parameters:
+            position: The (row, column) position to start from.
+            passable: The cells that can be walked through, if not the open
+                cells.
+        """
+        return self.flood(self.pack([position]), passable)
+
+
+def get_reachable(level: Level) -> list[tuple[int, int]]:
+    """ Returns the positions the player can walk to from the start of a level
+        without going through doors, row by row.
+
+    Parameters:
+        level: The level to check.
+    """
+    board = Bitboard(level.get_maze())
+    return board.unpack(board.flood_from(level.get_player_start()))
+
+
+def get_unreachable_items(level: Level) -> list[tuple[int, int]]:
+    """ Returns the positions of the items in a level that the player can't
+        reach from the start without going through doors.
+
+    Parameters:
+        level: The level to check.
+    """
+    board = Bitboard(level.get_maze())
+    reached = board.flood_from(level.get_player_start())
+    return [position for position in level.get_items()
+            if not board.contains(reached, position)]
+
+
+def can_reach_door(level: Level) -> bool:
+    """ Returns whether the player can walk from the start of a level to one of
+        its doors (once unlocked).
+
+    Parameters:
+        level: The level to check.
+    """
+    board = Bitboard(level.get_maze())
+    reached = board.flood_from(level.get_player_start())
+    return board.intersects(board.spread(reached), board.get_doors())
+
+
+def validate_level(
+    level: Level,
+    cache: Optional[AnalysisCache] = None
+) -> list[str]:
+    """ Returns the reasons a level can't be finished, if any: coins that can't
+        be collected (so the doors never unlock) or doors that can't be reached.
+
+    Parameters:
+        level: The level to check.
+        cache: Where to look up and keep the result, if anywhere.
+    """
+    if cache is not None:
+        return cache.get_or_compute('validation', VALIDATION_VERSION, level,
+                                    validate_level)
+    board = Bitboard(level.get_maze())
+    start = level.get_player_start()
+    if start is None or not board.contains(board.get_open(), start):
+        return ['The player does not start on an open cell']
+    reached = board.flood_from(start)
+    problems = [f"The coin at {position} can't be reached"
+                for position, item in level.get_items().items()
+                if item.get_id() == COIN and not board.contains(reached, position)]
+    if not board.intersects(board.spread(reached), board.get_doors()):
+        problems.append('No door can be reached')
+    return problems
@@ -0,0 +1,316 @@
+""" An asyncio server hosting many concurrent MazeRunner sessions.
+
+Each connection plays its own game over a line protocol. Clients send the same
+commands as the text game ('w', 'a', 's', 'd', a string of moves such as
+'wwddss' or 'i <item name>', plus 'q' to quit) and receive one JSON object per
+line. The first line is the full state;
+every later line is a delta holding only what the command changed:
+
+    p: player [row, column]         s: [HP, hunger, thirst]
+    i: {item name: count} changes   r: [[row, column]] of collected items
+    u: 1 if the door was unlocked   l: the new level, after levelling up
+    w: 1 if the game was won        x: 1 if the game was lost
+    en: [[row, column]] of the enemies, when they move or appear
+    e: an error message
+
+Levels are parsed once per game file and shared between sessions as templates.
+
+Usage:
+    python server.py GAME_FILE [--host HOST] [--port PORT] [--unix PATH]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+from typing import Optional
+
+from game import (load_game, Level, Model, ModelEvent, ItemCollected,
+                  DoorUnlocked, LevelChanged)
+from constants import *
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+BACKLOG = 4096 # Queued connections allowed while thousands of clients connect
+QUIT = 'q'
+
+
+def encode_level(level: Level, level_num: int) -> dict:
+    """ Returns the JSON-compatible description of a level sent to clients.
+
+    Parameters:
+        level: The level to describe.
+        level_num: The index of the level in the game.
+    """
+    return {
+        'n': level_num,
+        'm': str(level.get_maze()),
+        'it': [[row, col, item.get_id()]
+               for (row, col), item in level.get_items().items()],
+    }
+
+
+def encode_enemies(model: Model) -> list[list[int]]:
+    """ Returns the [row, column] positions of the enemies in the current level
+        of a game, in order.
+
+    Parameters:
+        model: The game whose enemies to describe.
+    """
+    return [list(position) for position in sorted(model.get_current_enemies())]
+
+
+class Session:
+    """ One player's game, reporting the changes made by each command. """
+    def __init__(
+        self,
+        game_file: str,
+        templates: Optional[list[Level]] = None
+    ) -> None:
+        """ Starts a new game.
+
+        Parameters:
+            game_file: The file containing the levels for this game.
+            templates: Levels already loaded from game_file to copy.
+        """
+        self._model = Model(game_file, templates)
+        self._level = self._model.get_level()
+        self._level_num = 0
+        self._unlocked = self._is_door_unlocked()
+        self._removed = [] # Positions of items collected since the last delta
+        self._just_unlocked = False
+        self._new_level = False
+        self._model.subscribe(self._handle_event)
+        self._remember()
+
+    def _remember(self) -> None:
+        """ Records the parts of the state that deltas are computed against. """
+        model = self._model
+        self._position = model.get_player().get_position()
+        self._stats = model.get_player_stats()
+        self._inventory = self._get_inventory_counts()
+        self._enemies = encode_enemies(model)
+        self._removed = []
+        self._just_unlocked = False
+        self._new_level = False
+
+    def _handle_event(self, event: ModelEvent) -> None:
+        """ Records the changes reported by the model that deltas describe.
+
+        Parameters:
+            event: The change made to the model.
+        """
+        if isinstance(event, ItemCollected):
+            self._removed.append(event.position)
+        elif isinstance(event, DoorUnlocked):
+            self._unlocked = self._just_unlocked = True
+        elif isinstance(event, LevelChanged) and event.level is not None:
+            self._level = event.level
+            self._level_num = event.level_num
+            self._new_level = True
+            self._unlocked = self._just_unlocked = False
+            self._removed = []
+
+    def _get_inventory_counts(self) -> dict[str, int]:
+        """ Returns the number of each item in the player's inventory. """
+        items = self._model.get_player_inventory().get_items()
+        return {name: len(instances) for name, instances in items.items()}
+
+    def _is_door_unlocked(self) -> bool:
+        """ Returns True iff the current level's door has been unlocked. """
+        maze = self._level.get_maze()
+        return any(not maze.get_tile(position).is_blocking()
+                   for position in maze.get_doors())
+
+    def close(self) -> None:
+        """ Stops following the model's events, so the session and its model
+            can be freed as soon as they are dropped.
+        """
+        self._model.unsubscribe(self._handle_event)
+
+    def is_over(self) -> bool:
+        """ Returns True iff the game has been won or lost. """
+        return self._model.has_won() or self._model.has_lost()
+
+    def get_state(self) -> dict:
+        """ Returns the full state of the game, as sent to a new client. """
+        state = {
+            'l': encode_level(self._level, self._level_num),
+            'p': list(self._position),
+            's': list(self._stats),
+            'i': self._inventory,
+        }
+        if self._enemies:
+            state['en'] = self._enemies
+        if self._unlocked:
+            state['u'] = 1
+        return state
+
+    def handle_command(self, command: str) -> dict:
+        """ Applies a command from the client and returns what changed.
+
+        Parameters:
+            command: 'w', 'a', 's', 'd', a string of moves or 'i <item name>'.
+        """
+        model = self._model
+        if command in (UP, DOWN, LEFT, RIGHT):
+            model.move_player(MOVE_DELTAS.get(command))
+        elif command and all(char in MOVE_DELTAS for char in command):
+            model.apply_moves(command)
+        elif len(command) > 1 and command.split()[0] == 'i':
+            if not model.apply_item(command.partition(' ')[-1]):
+                return {'e': ITEM_UNAVAILABLE_MESSAGE.strip()}
+        else:
+            return {'e': f'Invalid command: {command!r}'}
+        return self._get_delta()
+
+    def _get_delta(self) -> dict:
+        """ Returns the changes since the last delta and remembers the new
+            state. Collected items, unlocked doors and new levels are recorded
+            from the model's events as they happen.
+        """
+        model = self._model
+        if model.has_won():
+            return {'w': 1}
+
+        delta = {}
+        if self._new_level:
+            delta['l'] = encode_level(self._level, self._level_num)
+        elif self._removed:
+            delta['r'] = [list(position) for position in sorted(self._removed)]
+
+        position = model.get_player().get_position()
+        stats = model.get_player_stats()
+        inventory = self._get_inventory_counts()
+        enemies = encode_enemies(model)
+        if position != self._position:
+            delta['p'] = list(position)
+        if stats != self._stats:
+            delta['s'] = list(stats)
+        if inventory != self._inventory:
+            delta['i'] = {
+                name: inventory.get(name, 0)
+                for name in inventory.keys() | self._inventory.keys()
+                if inventory.get(name, 0) != self._inventory.get(name, 0)
+            }
+        if enemies != self._enemies or (self._new_level and enemies):
+            delta['en'] = enemies
+        if self._just_unlocked and not self._new_level:
+            delta['u'] = 1 # (a new level is sent with its doors as they are)
+        if model.has_lost():
+            delta['x'] = 1
+        self._remember()
+        return delta
+
+
+class GameServer:
+    """ Serves sessions of one game, sharing its parsed levels. """
+    def __init__(self, game_file: str) -> None:
+        """ Parses the game's levels once for every session to copy.
+
+        Parameters:
+            game_file: The file containing the levels for the game.
+        """
+        self._game_file = game_file
+        self._templates = load_game(game_file)
+        self._num_sessions = 0
+
+    def get_num_sessions(self) -> int:
+        """ Returns the number of sessions currently connected. """
+        return self._num_sessions
+
+    async def handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """ Plays one session over a connection until it ends.
+
+        Parameters:
+            reader: The stream of commands from the client.
+            writer: The stream of states and deltas to the client.
+        """
+        self._num_sessions += 1
+        session = self._start_session()
+        try:
+            writer.write(_encode(session.get_state()))
+            await writer.drain()
+            while not session.is_over():
+                try:
+                    line = await reader.readline()
+                except ValueError: # The line was longer than the stream limit
+                    writer.write(_encode({'e': 'Command too long'}))
+                    await writer.drain()
+                    continue
+                # Undecodable bytes make an invalid command rather than an error
+                command = line.decode(errors='replace').strip()
+                if not line or command == QUIT:
+                    break
+                writer.write(_encode(session.handle_command(command)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._num_sessions -= 1
+            self._end_session(session)
+            writer.close()
+
+    def _start_session(self) -> Session:
+        """ Returns a new session for a connection. """
+        return Session(self._game_file, self._templates)
+
+    def _end_session(self, session: Session) -> None:
+        """ Cleans up after a session's connection closes.
+
+        Parameters:
+            session: The session that ended.
+        """
+        session.close()
+
+    async def serve(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        unix_path: Optional[str] = None
+    ) -> None:
+        """ Accepts connections until cancelled.
+
+        Parameters:
+            host: The address to listen on for TCP connections.
+            port: The port to listen on for TCP connections.
+            unix_path: If given, listen on this Unix socket instead of TCP.
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(
+                self.handle_connection, unix_path, backlog=BACKLOG
+            )
+        else:
+            server = await asyncio.start_server(
+                self.handle_connection, host, port, backlog=BACKLOG
+            )
+        async with server:
+            await server.serve_forever()
+
+
+def _encode(message: dict) -> bytes:
+    """ Returns a message as a compact JSON line. """
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+def main():
+    """ Runs a game server from the command line. """
+    parser = argparse.ArgumentParser(description='Host MazeRunner sessions.')
+    parser.add_argument('game_file')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help='listen on a Unix socket at this path')
+    args = parser.parse_args()
+    try:
+        asyncio.run(GameServer(args.game_file).serve(
+            args.host, args.port, args.unix
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
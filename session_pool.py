@@ -0,0 +1,325 @@
+""" Game sessions sharded across worker processes.
+
+The parent parses the game once and places each level's tile grid in shared
+memory. Every worker maps the same read-only grids through SharedMaze, so a
+worker only holds per-session state: the player, the enemies, the items left in
+each level and whether the door is unlocked. Sessions are assigned to workers by a hash of
+their id, and commands and replies use the same states and deltas as server.py.
+"""
+from __future__ import annotations
+import gc
+import multiprocessing
+import zlib
+from multiprocessing import shared_memory
+from typing import Hashable, Optional
+
+from game import load_game, Tile, Wall, Empty, Lava, Door, Maze, Level
+from server import Session
+from constants import *
+
+
+class SharedMaze(Maze):
+    """ A read-only maze whose tile IDs live in a shared buffer. Only the door
+        state belongs to each instance, so copies are cheap.
+    """
+    def __init__(
+        self,
+        dimensions: tuple[int, int],
+        cells: memoryview,
+        doors: list[tuple[int, int]]
+    ) -> None:
+        """ Sets up a maze over a buffer holding one tile ID byte per cell,
+            row by row.
+
+        Parameters:
+            dimensions: (#rows, #columns)
+            cells: The shared tile IDs.
+            doors: The (row, column) positions of the doors in the maze.
+        """
+        super().__init__(dimensions)
+        self._cells = cells
+        self._doors = doors
+        self._door = Door()
+        self._flyweights = {
+            ord(WALL): Wall(),
+            ord(EMPTY): Empty(),
+            ord(LAVA): Lava(),
+            ord(DOOR): self._door,
+        }
+
+    def add_row(self, row: str) -> None:
+        """ Shared mazes are read-only. """
+        raise TypeError('SharedMaze is read-only')
+
+    def get_tile(self, position: tuple[int, int]) -> Tile:
+        """ Returns the Tile instance at the given position. Negative indices
+            count back from the end, as they do for an in-memory Maze.
+
+        Parameters:
+            position: The (row, column) position from which to find the tile.
+        """
+        row, col = position
+        rows, cols = self._dimensions
+        if row < 0:
+            row += rows
+        if col < 0:
+            col += cols
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise IndexError(f'{position} is outside the maze')
+        return self._flyweights[self._cells[row * cols + col]]
+
+    def get_tiles(self) -> list[list[Tile]]:
+        """ Returns the Tile instances in this maze. Each element is a row of
+            Tile instances in order.
+        """
+        rows, cols = self._dimensions
+        flyweights = self._flyweights
+        return [
+            [flyweights[byte] for byte in self._cells[row * cols:(row + 1) * cols]]
+            for row in range(rows)
+        ]
+
+    def get_cells(self) -> memoryview:
+        """ Returns the shared tile IDs. """
+        return self._cells
+
+    def unlock_door(self) -> None:
+        """ Unlocks any doors that exist in the maze. """
+        self._door.unlock()
+
+    def copy(self) -> SharedMaze:
+        """ Returns a maze over the same buffer with its own door state. """
+        maze = SharedMaze(self._dimensions, self._cells, self._doors)
+        if not self._door.is_blocking():
+            maze.unlock_door()
+        return maze
+
+    def __str__(self) -> str:
+        """ Returns the string representation of this maze. """
+        return '\n'.join(''.join(tile.get_id() for tile in row)
+                         for row in self.get_tiles())
+
+    def __repr__(self) -> str:
+        """ Returns the computer representation of this maze. """
+        return f"SharedMaze({self._dimensions})"
+
+
+def describe_level(level: Level, name: str) -> dict:
+    """ Returns everything except the tile grid needed to rebuild a level in
+        another process.
+
+    Parameters:
+        level: The level to describe.
+        name: The name of the shared memory block holding its tile grid.
+    """
+    return {
+        'name': name,
+        'dimensions': tuple(level.get_dimensions()),
+        'doors': list(level.get_maze().get_doors()),
+        'items': [(position, item.get_id())
+                  for position, item in level.get_items().items()],
+        'player_start': level.get_player_start(),
+        'enemy_starts': list(level.get_enemy_starts()),
+    }
+
+
+def publish_levels(
+    levels: list[Level]
+) -> tuple[list[shared_memory.SharedMemory], list[dict]]:
+    """ Copies each level's tile grid into a new shared memory block.
+
+    Parameters:
+        levels: The parsed levels to publish.
+
+    Returns:
+        The shared memory blocks (to be unlinked by the caller once the
+        workers are done) and a description of each level for attach_levels.
+    """
+    blocks, descriptions = [], []
+    for level in levels:
+        rows, cols = level.get_dimensions()
+        block = shared_memory.SharedMemory(create=True, size=max(1, rows * cols))
+        # Ground under entities is empty and doors are stored locked
+        data = ''.join(
+            DOOR if isinstance(tile, Door) else tile.get_id()
+            for row in level.get_maze().get_tiles() for tile in row
+        ).encode()
+        block.buf[:len(data)] = data
+        blocks.append(block)
+        descriptions.append(describe_level(level, block.name))
+    return blocks, descriptions
+
+
+def attach_levels(
+    descriptions: list[dict]
+) -> tuple[list[shared_memory.SharedMemory], list[Level]]:
+    """ Builds template levels over shared tile grids published by
+        publish_levels.
+
+    Parameters:
+        descriptions: The level descriptions returned by publish_levels.
+
+    Returns:
+        The attached shared memory blocks (to be closed by the caller) and the
+        template levels.
+    """
+    blocks, levels = [], []
+    for description in descriptions:
+        block = shared_memory.SharedMemory(name=description['name'])
+        rows, cols = description['dimensions']
+        cells = block.buf[:rows * cols]
+        maze = SharedMaze((rows, cols), cells, description['doors'])
+        level = Level((rows, cols), maze, filled=True)
+        for position, item_id in description['items']:
+            level.add_entity(position, item_id)
+        if description['player_start'] is not None:
+            level.add_player_start(description['player_start'])
+        for position in description['enemy_starts']:
+            level.add_entity(position, ENEMY)
+        blocks.append(block)
+        levels.append(level)
+    return blocks, levels
+
+
+def _worker_main(game_file: str, descriptions: list[dict], connection) -> None:
+    """ Runs the sessions of one worker until told to stop.
+
+    Parameters:
+        game_file: The file the levels were loaded from.
+        descriptions: The shared level descriptions.
+        connection: The worker's end of the pipe to the pool.
+    """
+    blocks, templates = attach_levels(descriptions)
+    sessions = {}
+    while True:
+        message = connection.recv()
+        kind, session_id = message[0], message[1]
+        if kind == 'stop':
+            break
+        elif kind == 'open':
+            sessions[session_id] = Session(game_file, templates)
+            connection.send(sessions[session_id].get_state())
+        elif kind == 'command':
+            connection.send(sessions[session_id].handle_command(message[2]))
+        elif kind == 'batch':
+            connection.send([
+                sessions[batch_id].handle_command(command)
+                for batch_id, command in message[2]
+            ])
+        elif kind == 'close':
+            session = sessions.pop(session_id, None)
+            if session is not None:
+                session.close()
+            connection.send(None)
+
+    # Drop every view of the shared buffers before closing them
+    for session in sessions.values():
+        session.close()
+    sessions.clear()
+    cells = [level.get_maze().get_cells() for level in templates]
+    templates.clear()
+    gc.collect() # Frees any mazes still held by reference cycles
+    for view in cells:
+        view.release()
+    for block in blocks:
+        block.close()
+
+
+class SessionPool:
+    """ Plays many sessions of one game across several worker processes. """
+    def __init__(self, game_file: str, num_workers: Optional[int] = None) -> None:
+        """ Parses and publishes the game, then starts the workers.
+
+        Parameters:
+            game_file: The file containing the levels for the game.
+            num_workers: The number of worker processes (default: one per CPU).
+        """
+        num_workers = num_workers or multiprocessing.cpu_count()
+        self._blocks, descriptions = publish_levels(load_game(game_file))
+        self._connections = []
+        self._workers = []
+        for _ in range(num_workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=_worker_main,
+                args=(game_file, descriptions, worker_connection),
+                daemon=True
+            )
+            worker.start()
+            self._connections.append(connection)
+            self._workers.append(worker)
+
+    def _get_connection(self, session_id: Hashable):
+        """ Returns the pipe to the worker that owns a session.
+
+        Parameters:
+            session_id: The id of the session.
+        """
+        index = zlib.crc32(repr(session_id).encode()) % len(self._connections)
+        return self._connections[index]
+
+    def open_session(self, session_id: Hashable) -> dict:
+        """ Starts a new session and returns its full state.
+
+        Parameters:
+            session_id: A unique id for the session.
+        """
+        connection = self._get_connection(session_id)
+        connection.send(('open', session_id))
+        return connection.recv()
+
+    def send_command(self, session_id: Hashable, command: str) -> dict:
+        """ Applies a command to a session and returns the resulting delta.
+
+        Parameters:
+            session_id: The id of the session.
+            command: 'w', 'a', 's', 'd', a string of moves or 'i <item name>'.
+        """
+        connection = self._get_connection(session_id)
+        connection.send(('command', session_id, command))
+        return connection.recv()
+
+    def send_commands(self, commands: list[tuple[Hashable, str]]) -> list[dict]:
+        """ Applies a batch of commands, letting every worker process its share
+            at the same time.
+
+        Parameters:
+            commands: (session id, command) pairs, applied in order per session.
+
+        Returns:
+            The delta for each command, in the same order as commands.
+        """
+        batches = {} # Maps each worker's connection to its share of commands
+        for index, (session_id, command) in enumerate(commands):
+            batch = batches.setdefault(self._get_connection(session_id), [])
+            batch.append((index, session_id, command))
+        for connection, batch in batches.items():
+            connection.send(('batch', None, [
+                (session_id, command) for _, session_id, command in batch
+            ]))
+
+        deltas = [None] * len(commands)
+        for connection, batch in batches.items():
+            for (index, _, _), delta in zip(batch, connection.recv()):
+                deltas[index] = delta
+        return deltas
+
+    def close_session(self, session_id: Hashable) -> None:
+        """ Ends a session, discarding its state.
+
+        Parameters:
+            session_id: The id of the session.
+        """
+        connection = self._get_connection(session_id)
+        connection.send(('close', session_id))
+        connection.recv()
+
+    def close(self) -> None:
+        """ Stops the workers and frees the shared level grids. """
+        for connection in self._connections:
+            connection.send(('stop', None))
+        for worker in self._workers:
+            worker.join()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
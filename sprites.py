@@ -0,0 +1,424 @@
+""" Cached tile and entity images for the image views.
+
+Images are opened once and resized once per cell size. Level backgrounds (every
+tile of a maze composed into one image) are cached too. The PIL work in
+prepare and prepare_background is safe to run on a background thread, e.g.
+while the next level is being prefetched; the Tk PhotoImages are only created
+on the Tk thread, the first time get or get_background is called.
+
+The individual images are large, so they can be packed into a texture atlas:
+one image holding every sprite pre-scaled at each of ATLAS_SIZES. When the atlas
+has been built, sprites are sliced from its nearest size instead of decoding
+and resampling the originals.
+
+Usage:
+    python sprites.py build      Builds the atlas in IMAGES_DIRECTORY
+    python sprites.py measure    Compares cold start time and memory with and
+                                 without the atlas
+"""
+from __future__ import annotations
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from time import perf_counter
+from typing import Optional
+
+from constants import *
+
+
+def get_sprite_names() -> list[str]:
+    """ Returns the file names of every tile and entity image. """
+    return sorted(set(TILE_IMAGES.values()) | set(ENTITY_IMAGES.values()))
+
+
+def build_atlas(
+    directory: str = IMAGES_DIRECTORY,
+    sizes: tuple[int, ...] = ATLAS_SIZES
+) -> str:
+    """ Packs every sprite, scaled to each size, into one atlas image with a
+        JSON index of where each sprite is.
+
+    Parameters:
+        directory: The directory containing the images (and the atlas).
+        sizes: The side lengths (in pixels) to pre-scale the sprites to.
+
+    Returns:
+        The path to the atlas image.
+    """
+    from PIL import Image
+
+    names = get_sprite_names()
+    atlas = Image.new('RGBA', (len(names) * max(sizes), sum(sizes)))
+    index = {'sizes': {}, 'sources': {}}
+    top = 0
+    for size in sizes:
+        index['sizes'][size] = top
+        top += size
+    for column, name in enumerate(names):
+        path = os.path.join(directory, name)
+        index['sources'][name] = [column, os.stat(path).st_mtime_ns]
+        with Image.open(path) as source:
+            source = source.convert('RGBA')
+            for size in sizes:
+                atlas.paste(source.resize((size, size), Image.LANCZOS),
+                            (column * max(sizes), index['sizes'][size]))
+
+    atlas_path = os.path.join(directory, ATLAS_IMAGE)
+    atlas.save(atlas_path, optimize=True)
+    with open(os.path.join(directory, ATLAS_INDEX), 'w') as file:
+        json.dump(index, file)
+    return atlas_path
+
+
+class Atlas:
+    """ Sprites sliced from a prebuilt atlas image. """
+    def __init__(self, image, index: dict) -> None:
+        """ Sets up the atlas.
+
+        Parameters:
+            image: The (loaded) PIL atlas image.
+            index: The atlas index written by build_atlas.
+        """
+        self._image = image
+        self._tops = {int(size): top for size, top in index['sizes'].items()}
+        self._sizes = sorted(self._tops)
+        self._columns = {name: column
+                         for name, (column, _) in index['sources'].items()}
+
+    @classmethod
+    def load(cls, directory: str = IMAGES_DIRECTORY) -> Optional[Atlas]:
+        """ Returns the atlas in a directory, or None if it hasn't been built or
+            any of its sprites have changed since.
+
+        Parameters:
+            directory: The directory containing the images and the atlas.
+        """
+        from PIL import Image
+
+        try:
+            with open(os.path.join(directory, ATLAS_INDEX)) as file:
+                index = json.load(file)
+            for name in get_sprite_names():
+                _, mtime = index['sources'][name]
+                if os.stat(os.path.join(directory, name)).st_mtime_ns != mtime:
+                    return None
+            image = Image.open(os.path.join(directory, ATLAS_IMAGE))
+            image.load()
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(image, index)
+
+    def get_ladder_size(self, size: tuple[int, int]) -> int:
+        """ Returns the smallest pre-scaled size covering a cell size, or the
+            largest one if none does.
+
+        Parameters:
+            size: The (width, height) of a cell in pixels.
+        """
+        for ladder_size in self._sizes:
+            if ladder_size >= max(size):
+                return ladder_size
+        return self._sizes[-1]
+
+    def get(self, name: str, size: tuple[int, int]):
+        """ Returns a sprite at a cell size, as a PIL image. It is sliced from
+            the nearest pre-scaled size, and only resampled (from that small
+            slice) if the cell size isn't on the ladder.
+
+        Parameters:
+            name: The file name of the sprite.
+            size: The (width, height) of a cell in pixels.
+        """
+        ladder_size = self.get_ladder_size(size)
+        left = self._columns[name] * self._sizes[-1]
+        top = self._tops[ladder_size]
+        sprite = self._image.crop(
+            (left, top, left + ladder_size, top + ladder_size)
+        )
+        if sprite.size != size:
+            sprite = sprite.resize(size)
+        return sprite
+
+
+class SpriteCache:
+    """ Resized images and level backgrounds, keyed by cell size. """
+    def __init__(
+        self,
+        directory: str = IMAGES_DIRECTORY,
+        max_sizes: int = SPRITE_CACHE_SIZES,
+        use_atlas: bool = True
+    ) -> None:
+        """ Sets up an empty cache.
+
+        Parameters:
+            directory: The directory containing the image files.
+            max_sizes: The number of cell sizes to keep images for.
+            use_atlas: Whether to slice sprites from the atlas (if it has been
+                built) instead of the individual images.
+        """
+        self._directory = directory
+        self._max_sizes = max_sizes
+        self._use_atlas = use_atlas
+        self._atlas = None # Loaded on first use, if use_atlas
+        self._sources = {} # Maps file names to opened images
+        self._resized = OrderedDict() # Maps cell sizes to {file name: image}
+        self._backgrounds = OrderedDict() # Maps (cell size, tile ids) to images
+        self._photos = {} # Maps the keys above to Tk PhotoImages
+        self._lock = threading.Lock()
+
+    def _get_resized(self, name: str, size: tuple[int, int]):
+        """ Returns an image file resized to a cell size, as a PIL image. The
+            caller must hold the lock.
+
+        Parameters:
+            name: The file name of the image.
+            size: The (width, height) of a cell in pixels.
+        """
+        from PIL import Image
+
+        images = self._resized.get(size)
+        if images is None:
+            images = self._resized[size] = {}
+            if len(self._resized) > self._max_sizes:
+                old_size, _ = self._resized.popitem(last=False)
+                self._forget_size(old_size)
+        else:
+            self._resized.move_to_end(size)
+        image = images.get(name)
+        if image is None and self._use_atlas:
+            if self._atlas is None:
+                self._atlas = Atlas.load(self._directory)
+                self._use_atlas = self._atlas is not None
+            if self._atlas is not None:
+                image = images[name] = self._atlas.get(name, size)
+        if image is None:
+            source = self._sources.get(name)
+            if source is None:
+                source = Image.open(os.path.join(self._directory, name))
+                source.load()
+                self._sources[name] = source
+            image = images[name] = source.resize(size)
+        return image
+
+    def _touch(self, key: tuple) -> None:
+        """ Marks the cell size (and background) of a PhotoImage as recently
+            used, so warming other sizes doesn't evict the one on screen. The
+            caller must hold the lock.
+
+        Parameters:
+            key: The key of the PhotoImage, (cell size, name or tile ids).
+        """
+        if key[0] in self._resized:
+            self._resized.move_to_end(key[0])
+        if key in self._backgrounds:
+            self._backgrounds.move_to_end(key)
+
+    def _forget_size(self, size: tuple[int, int]) -> None:
+        """ Drops the backgrounds and PhotoImages for a cell size. The caller
+            must hold the lock.
+
+        Parameters:
+            size: The (width, height) of a cell in pixels.
+        """
+        for key in [key for key in self._backgrounds if key[0] == size]:
+            del self._backgrounds[key]
+        for key in [key for key in self._photos if key[0] == size]:
+            del self._photos[key]
+
+    def _get_background(self, tile_ids: tuple[str, ...], size: tuple[int, int]):
+        """ Returns the tiles of a maze drawn into one PIL image. The caller must
+            hold the lock.
+
+        Parameters:
+            tile_ids: The IDs of the tiles, one string per row.
+            size: The (width, height) of a cell in pixels.
+        """
+        from PIL import Image
+
+        key = (size, tile_ids)
+        image = self._backgrounds.get(key)
+        if image is not None:
+            self._backgrounds.move_to_end(key)
+            return image
+        width, height = size
+        cols = max((len(row) for row in tile_ids), default=0)
+        image = Image.new('RGBA', (cols * width, len(tile_ids) * height))
+        for row, ids in enumerate(tile_ids):
+            for col, tile_id in enumerate(ids):
+                tile = self._get_resized(TILE_IMAGES[tile_id], size)
+                image.paste(tile, (col * width, row * height))
+        self._backgrounds[key] = image
+        if len(self._backgrounds) > self._max_sizes:
+            old_key, _ = self._backgrounds.popitem(last=False)
+            self._photos.pop(old_key, None)
+        return image
+
+    def prepare(self, names: list[str], size: tuple[int, int]) -> None:
+        """ Resizes images ahead of time. Safe to call from any thread.
+
+        Parameters:
+            names: The file names of the images.
+            size: The (width, height) of a cell in pixels.
+        """
+        with self._lock:
+            for name in names:
+                self._get_resized(name, size)
+
+    def prepare_background(
+        self,
+        tile_ids: tuple[str, ...],
+        size: tuple[int, int]
+    ) -> None:
+        """ Draws a maze background ahead of time. Safe to call from any thread.
+
+        Parameters:
+            tile_ids: The IDs of the tiles, one string per row.
+            size: The (width, height) of a cell in pixels.
+        """
+        with self._lock:
+            self._get_background(tile_ids, size)
+
+    def get_image(self, name: str, size: tuple[int, int]):
+        """ Returns an image file resized to a cell size, as a PIL image. Safe
+            to call from any thread.
+
+        Parameters:
+            name: The file name of the image.
+            size: The (width, height) of a cell in pixels.
+        """
+        with self._lock:
+            return self._get_resized(name, size)
+
+    def get_background_image(
+        self,
+        tile_ids: tuple[str, ...],
+        size: tuple[int, int]
+    ):
+        """ Returns the tiles of a maze drawn into one PIL image. Safe to call
+            from any thread.
+
+        Parameters:
+            tile_ids: The IDs of the tiles, one string per row.
+            size: The (width, height) of a cell in pixels.
+        """
+        with self._lock:
+            return self._get_background(tile_ids, size)
+
+    def get(self, name: str, size: tuple[int, int]):
+        """ Returns an image file resized to a cell size, as a Tk PhotoImage.
+            Must be called on the Tk thread.
+
+        Parameters:
+            name: The file name of the image.
+            size: The (width, height) of a cell in pixels.
+        """
+        from PIL import ImageTk
+
+        key = (size, name)
+        with self._lock:
+            photo = self._photos.get(key)
+            if photo is None:
+                image = self._get_resized(name, size)
+                photo = self._photos[key] = ImageTk.PhotoImage(image)
+            else:
+                self._touch(key)
+        return photo
+
+    def get_background(self, tile_ids: tuple[str, ...], size: tuple[int, int]):
+        """ Returns the tiles of a maze drawn into one Tk PhotoImage. Must be
+            called on the Tk thread.
+
+        Parameters:
+            tile_ids: The IDs of the tiles, one string per row.
+            size: The (width, height) of a cell in pixels.
+        """
+        from PIL import ImageTk
+
+        key = (size, tile_ids)
+        with self._lock:
+            photo = self._photos.get(key)
+            if photo is None:
+                image = self._get_background(tile_ids, size)
+                photo = self._photos[key] = ImageTk.PhotoImage(image)
+            else:
+                self._touch(key)
+        return photo
+
+
+def get_tile_ids(tiles: list[list['Tile']]) -> tuple[str, ...]:
+    """ Returns the IDs of a maze's tiles as one string per row, the key for
+        its background.
+
+    Parameters:
+        tiles: The tiles of the maze.
+    """
+    return tuple(''.join(tile.get_id() for tile in row) for row in tiles)
+
+
+def get_resident_bytes(cache: SpriteCache) -> int:
+    """ Returns the memory used by the decoded images a cache holds.
+
+    Parameters:
+        cache: The sprite cache to measure.
+    """
+    images = list(cache._sources.values())
+    if cache._atlas is not None:
+        images.append(cache._atlas._image)
+    for resized in cache._resized.values():
+        images.extend(resized.values())
+    return sum(image.width * image.height * len(image.getbands())
+               for image in images)
+
+
+def measure_cold_start(use_atlas: bool, size: tuple[int, int]) -> dict:
+    """ Measures preparing every sprite at one cell size in a cache that has
+        not decoded anything yet (as on the first draw).
+
+    Parameters:
+        use_atlas: Whether the cache slices sprites from the atlas.
+        size: The (width, height) of a cell in pixels.
+    """
+    import resource
+    import PIL.Image # Excluded from the timing
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = perf_counter()
+    cache = SpriteCache(use_atlas=use_atlas)
+    cache.prepare(get_sprite_names(), size)
+    elapsed = perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'resident_bytes': get_resident_bytes(cache),
+        'peak_rss_growth_kb':
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - max_rss,
+        'atlas': cache._atlas is not None,
+    }
+
+
+def main():
+    """ Builds the atlas or measures it, from the command line. """
+    command = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    if command == 'build':
+        print(f'Wrote {build_atlas()}')
+    elif command == 'measure':
+        # Each measurement runs in a fresh process, so nothing is decoded yet
+        for use_atlas in (False, True):
+            output = subprocess.run(
+                [sys.executable, __file__, '_measure', str(int(use_atlas))],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output)
+            label = 'atlas' if result['atlas'] else 'individual images'
+            print(f"{label:18} {result['seconds'] * 1000:8.1f} ms "
+                  f"{result['resident_bytes'] / 1024:10.0f} KiB decoded "
+                  f"{result['peak_rss_growth_kb']:8d} KiB peak RSS growth")
+    elif command == '_measure':
+        size = (MAZE_WIDTH // 10, MAZE_HEIGHT // 10)
+        print(json.dumps(measure_cold_start(sys.argv[2] == '1', size)))
+
+
+if __name__ == '__main__':
+    main()
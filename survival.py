@@ -0,0 +1,422 @@
+""" How much HP, hunger and thirst each level of a game costs the player.
+
+For each level a route is planned over its corridor graph: from the player's
+start to the nearest coin not yet collected, and so on until every coin is
+collected, then to the nearest door. Items on the route are collected as the
+player walks over them. The route is then walked corridor by corridor rather
+than step by step: each corridor takes its steps and lava damage off the
+player's HP, and the number of hunger and thirst ticks it crosses (one every
+STATS_TICK moves, counted over the whole game) follows from the move count.
+
+Consumables are assumed to be used as late as possible, and candy and lava
+shoes as soon as they are collected. Using food and potions late means they
+never go to waste below 0 or above the maximum. So the least HP (and the most
+hunger and thirst) a player can enter a level with is a running maximum (or
+minimum) over the route, and so is what they leave with. Levels are then
+chained from a fresh player, with no items carried between levels, to tell
+whether the whole game can be won.
+
+The route is a good route rather than the best one, and enemies are not
+modelled, so a level found to be survivable can be finished this way (without
+enemies), but one found not to be may still be possible.
+
+Routes are kept in the analysis cache, so analyzing a level again (in any
+process) skips planning its route.
+
+Usage:
+    python survival.py GAME_FILE [GAME_FILE ...] [--jobs N] [--no-cache]
+"""
+from __future__ import annotations
+import argparse
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
+
+from analysis_cache import AnalysisCache
+from corridor import CorridorGraph, get_corridor_graph
+from constants import *
+
+if TYPE_CHECKING:
+    from game import Level
+
+# How much each consumable lowers the player's hunger or thirst
+FOOD_AMOUNTS = {APPLE: -APPLE_AMOUNT, HONEY: -HONEY_AMOUNT}
+DRINK_AMOUNTS = {WATER: -WATER_AMOUNT}
+ROUTE_VERSION = 3 # Bump when plan_route's results change
+
+
+class Walk(NamedTuple):
+    """ One corridor of a route, walked from one node of a corridor graph to
+        the next.
+    """
+    position: tuple[int, int]
+    steps: int
+    damage: int
+
+
+class LevelBudget(NamedTuple):
+    """ What a level's route costs a player who enters it after a number of
+        moves. Hunger and thirst are the most a player can enter with, which
+        are negative if the level can't be survived at all.
+    """
+    steps: int
+    min_health: int
+    max_hunger: int
+    max_thirst: int
+    health_lost: int # Before potions
+    health_restored: int # By every potion on the route
+    hunger_gained: int # Before food
+    hunger_restored: int # By all the food on the route
+    thirst_gained: int
+    thirst_restored: int
+    num_enemies: int # Not counted in the budget
+
+
+class Campaign(NamedTuple):
+    """ The budgets of a game's levels, and the player's (HP, hunger, thirst)
+        on entering each of them when played in order (None for levels after
+        one that can't be survived).
+    """
+    budgets: list[Optional[LevelBudget]] # None if a level has no route
+    entry_stats: list[Optional[tuple[int, int, int]]]
+    winnable: bool
+
+
+def plan_route(
+    level: Level,
+    graph: Optional[CorridorGraph] = None
+) -> Optional[list[Walk]]:
+    """ Returns a route through a level that collects every coin then leaves
+        through a door, always going to the nearest coin next, or None if a
+        coin or the doors can't be reached. Doors stay locked until every coin
+        is collected, so the way to a coin never goes through one.
+
+    Parameters:
+        level: The level to plan a route through.
+        graph: The level's corridor graph, if already built.
+    """
+    if graph is None:
+        graph = get_corridor_graph(level)
+    items = level.get_items()
+    coins = {graph.get_node(position) for position, item in items.items()
+             if item.get_id() == COIN}
+    doors = {graph.get_node(position)
+             for position in level.get_maze().get_doors()}
+    node = graph.get_node(level.get_player_start())
+    if node is None: # The start is off the maze or inside a wall
+        return None
+    edges = {} # The edges of each node searched so far, shared by searches
+    route = []
+    while True:
+        targets = coins or doors
+        walks = _walk_to_nearest(graph, node, targets, edges,
+                                 doors if coins else ())
+        if walks is None:
+            return None
+        for walk in walks:
+            coins.discard(graph.get_node(walk.position))
+        route += walks
+        if targets is doors:
+            return route
+        node = graph.get_node(walks[-1].position)
+
+
+def _walk_to_nearest(
+    graph: CorridorGraph,
+    start: int,
+    targets: set[int],
+    edges: dict[int, list[tuple[int, int, int]]],
+    blocked: Iterable[int] = ()
+) -> Optional[list[Walk]]:
+    """ Returns the corridors along the cheapest path from a node to the
+        nearest of some nodes (Dijkstra's algorithm, stopping at the first),
+        or None if none of them can be reached.
+
+    Parameters:
+        graph: The corridor graph to search.
+        start: The node to start from.
+        targets: The nodes to reach one of.
+        edges: The edges of nodes already looked up, added to as needed.
+        blocked: Nodes that can't be walked through (such as locked doors).
+    """
+    best = {start: 0}
+    parents = {} # Maps nodes to (node, steps, damage) they were reached by
+    settled = set()
+    queue = [(0, start)]
+    while queue:
+        cost, node = heapq.heappop(queue)
+        if node in settled:
+            continue
+        if node in targets:
+            walks = []
+            while node != start:
+                previous, steps, damage = parents[node]
+                walks.append(Walk(graph.get_position(node), steps, damage))
+                node = previous
+            return walks[::-1]
+        settled.add(node)
+        if node in blocked and node != start:
+            continue
+        node_edges = edges.get(node)
+        if node_edges is None:
+            node_edges = edges[node] = graph.get_edges(node)
+        for other, steps, damage in node_edges:
+            new = cost + steps + damage
+            if other not in settled and new < best.get(other, new + 1):
+                best[other] = new
+                parents[other] = (node, steps, damage)
+                heapq.heappush(queue, (new, other))
+    return None
+
+
+def _count_ticks(first: int, last: int) -> int:
+    """ Returns the number of moves after move first, up to and including move
+        last, on which hunger and thirst go up.
+
+    Parameters:
+        first: The number of moves made before.
+        last: The number of moves made after.
+    """
+    return last // STATS_TICK - first // STATS_TICK
+
+
+def analyze_route(
+    level: Level,
+    route: list[Walk],
+    num_moves: int = 0,
+    graph: Optional[CorridorGraph] = None
+) -> LevelBudget:
+    """ Returns the budget of walking a planned route through a level.
+
+    Parameters:
+        level: The level the route goes through.
+        route: A route returned by plan_route.
+        num_moves: The number of moves made in the game before the level.
+        graph: The level's corridor graph, if already built.
+    """
+    items = level.get_items()
+    maze = level.get_maze()
+    moves = num_moves
+    position = level.get_player_start()
+    health_lost = potions = 0
+    hunger_gained = food = 0
+    thirst_gained = drinks = 0
+    min_health, max_hunger, max_thirst = 1, MAX_HUNGER - 1, MAX_THIRST - 1
+    candy_until = shoes_until = 0 # The last moves the effects are active for
+    collected = set()
+    for walk in route:
+        end = moves + walk.steps
+        damage = walk.damage
+        if shoes_until > moves and damage:
+            # Only the lava stepped on while the shoes last is spared
+            if graph is None:
+                graph = get_corridor_graph(level)
+            cells = graph.find_path(position, walk.position)
+            damage -= sum(maze.get_tile(cell).damage()
+                          for cell in cells[:shoes_until - moves])
+        ticks = _count_ticks(moves, end)
+        if candy_until > moves:
+            hunger_ticks = ticks - _count_ticks(moves, min(end, candy_until))
+        else:
+            hunger_ticks = ticks
+
+        # Consumables collected on earlier corridors are used as needed
+        health_lost += walk.steps + damage
+        hunger_gained += hunger_ticks
+        thirst_gained += ticks
+        min_health = max(min_health,
+                         health_lost - potions * POTION_AMOUNT + 1)
+        max_hunger = min(max_hunger, MAX_HUNGER - 1 - hunger_gained + food)
+        max_thirst = min(max_thirst, MAX_THIRST - 1 - thirst_gained + drinks)
+
+        moves = end
+        position = walk.position
+        item = items.get(position)
+        if item is None or position in collected:
+            continue
+        collected.add(position)
+        item_id = item.get_id()
+        if item_id == POTION:
+            potions += 1
+        elif item_id in FOOD_AMOUNTS:
+            food += FOOD_AMOUNTS[item_id]
+        elif item_id in DRINK_AMOUNTS:
+            drinks += DRINK_AMOUNTS[item_id]
+        elif item_id == CANDY:
+            candy_until = max(candy_until, moves) + CANDY_DURATION
+        elif item_id == LAVA_SHOES:
+            shoes_until = max(shoes_until, moves) + LAVA_SHOES_DURATION
+
+    return LevelBudget(
+        steps=moves - num_moves,
+        min_health=min_health,
+        max_hunger=max_hunger,
+        max_thirst=max_thirst,
+        health_lost=health_lost,
+        health_restored=potions * POTION_AMOUNT,
+        hunger_gained=hunger_gained,
+        hunger_restored=food,
+        thirst_gained=thirst_gained,
+        thirst_restored=drinks,
+        num_enemies=len(level.get_enemy_starts()),
+    )
+
+
+def analyze_level(
+    level: Level,
+    num_moves: int = 0,
+    cache: Optional[AnalysisCache] = None
+) -> Optional[LevelBudget]:
+    """ Returns the budget of a level's planned route, or None if it has no
+        route.
+
+    Parameters:
+        level: The level to analyze.
+        num_moves: The number of moves made in the game before the level.
+        cache: Where to look up and keep the level's route, if anywhere.
+    """
+    if cache is None:
+        route = plan_route(level)
+    else:
+        route = cache.get_or_compute('route', ROUTE_VERSION, level, _plan_steps)
+        if route is not None:
+            route = [Walk._make(walk) for walk in route]
+    if route is None:
+        return None
+    return analyze_route(level, route, num_moves)
+
+
+def _plan_steps(level: Level) -> Optional[list[tuple]]:
+    """ Returns a level's planned route as plain tuples, for caching. A Walk
+        pickled by `python survival.py` would belong to __main__, which other
+        importers of the cache can't load.
+
+    Parameters:
+        level: The level to plan a route through.
+    """
+    route = plan_route(level)
+    return None if route is None else [tuple(walk) for walk in route]
+
+
+def can_enter(budget: LevelBudget, stats: tuple[int, int, int]) -> bool:
+    """ Returns whether a player can finish a level along its route.
+
+    Parameters:
+        budget: The level's budget.
+        stats: The player's (HP, hunger, thirst) on entering the level.
+    """
+    health, hunger, thirst = stats
+    return health >= budget.min_health and hunger <= budget.max_hunger \
+        and thirst <= budget.max_thirst
+
+
+def get_exit_stats(
+    budget: LevelBudget,
+    stats: tuple[int, int, int]
+) -> tuple[int, int, int]:
+    """ Returns the player's (HP, hunger, thirst) on leaving a level, having
+        used every consumable collected in it.
+
+    Parameters:
+        budget: The level's budget.
+        stats: The player's (HP, hunger, thirst) on entering the level.
+    """
+    health, hunger, thirst = stats
+    return (
+        min(MAX_HEALTH, health - budget.health_lost + budget.health_restored),
+        max(0, hunger + budget.hunger_gained - budget.hunger_restored),
+        max(0, thirst + budget.thirst_gained - budget.thirst_restored),
+    )
+
+
+def analyze_campaign(
+    levels: Iterable[Level],
+    cache: Optional[AnalysisCache] = None
+) -> Campaign:
+    """ Analyzes every level of a game and plays them in order from a fresh
+        player (MAX_HEALTH, no hunger or thirst, no items).
+
+    Parameters:
+        levels: The game's levels, in order.
+        cache: Where to look up and keep the levels' routes, if anywhere.
+    """
+    budgets, entry_stats = [], []
+    stats = (MAX_HEALTH, 0, 0)
+    num_moves = 0
+    winnable = True
+    for level in levels:
+        budget = analyze_level(level, num_moves, cache)
+        budgets.append(budget)
+        entry_stats.append(stats if winnable else None)
+        if not winnable:
+            continue
+        if budget is None or not can_enter(budget, stats):
+            winnable = False
+            continue
+        stats = get_exit_stats(budget, stats)
+        num_moves += budget.steps
+    return Campaign(budgets, entry_stats, winnable)
+
+
+def analyze_game(
+    game_file: str,
+    cache: Optional[AnalysisCache] = None
+) -> Campaign:
+    """ Analyzes the levels of a game file, read one at a time.
+
+    Parameters:
+        game_file: The game file to analyze.
+        cache: Where to look up and keep the levels' routes, if anywhere.
+    """
+    from game import iter_levels
+
+    return analyze_campaign(iter_levels(game_file), cache)
+
+
+def print_campaign(game_file: str, campaign: Campaign) -> None:
+    """ Prints the budget of each level of a game and whether it can be won.
+
+    Parameters:
+        game_file: The game file analyzed.
+        campaign: The game's analysis.
+    """
+    print(game_file)
+    print(f'{"Level":>5} {"Steps":>8} {"HP":>4} {"Hunger":>6} {"Thirst":>6}'
+          f'  Entry (HP, hunger, thirst)')
+    for num, (budget, stats) in enumerate(
+        zip(campaign.budgets, campaign.entry_stats), start=1
+    ):
+        if budget is None:
+            print(f'{num:>5}  No route collects every coin and reaches a door')
+            continue
+        entry = 'not reached' if stats is None else stats
+        note = f'  ({budget.num_enemies} enemies not counted)' \
+            if budget.num_enemies else ''
+        print(f'{num:>5} {budget.steps:>8} {budget.min_health:>4} '
+              f'{budget.max_hunger:>6} {budget.max_thirst:>6}  {entry}{note}')
+    print('Winnable' if campaign.winnable else 'Not winnable', 'from',
+          f'{MAX_HEALTH} HP without carrying items')
+
+
+def main():
+    """ Prints the survival budgets of games, analyzing them in parallel. """
+    parser = argparse.ArgumentParser(
+        description='Report the HP, hunger and thirst each level needs.'
+    )
+    parser.add_argument('game_files', nargs='+')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'plan every route instead of using '
+                             f'{ANALYSIS_CACHE_FILE}')
+    args = parser.parse_args()
+    cache = None if args.no_cache else AnalysisCache()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        campaigns = pool.map(analyze_game, args.game_files,
+                             [cache] * len(args.game_files))
+        for game_file, campaign in zip(args.game_files, campaigns):
+            print_campaign(game_file, campaign)
+
+
+if __name__ == '__main__':
+    main()
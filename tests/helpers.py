@@ -0,0 +1,134 @@
+""" Random mazes and plain reference searches for the randomized tests. """
+import heapq
+import random
+from collections import deque
+
+from game import Level
+from pathfinding import BLOCKED, UNREACHABLE
+from constants import *
+
+
+def random_costs(
+    rng: random.Random,
+    dimensions: tuple[int, int],
+    wall_chance: float = 0.3,
+    lava_chance: float = 0.1
+) -> list[int]:
+    """ Returns the cost of stepping onto each cell of a random maze, or
+        BLOCKED.
+
+    Parameters:
+        rng: The random generator to use.
+        dimensions: The (#rows, #columns) of the maze.
+        wall_chance: The chance of each cell being a wall.
+        lava_chance: The chance of each open cell being lava.
+    """
+    rows, cols = dimensions
+    return [random_cost(rng, wall_chance, lava_chance)
+            for _ in range(rows * cols)]
+
+
+def random_cost(
+    rng: random.Random,
+    wall_chance: float = 0.3,
+    lava_chance: float = 0.1
+) -> int:
+    """ Returns the cost of a random cell, or BLOCKED.
+
+    Parameters:
+        rng: The random generator to use.
+        wall_chance: The chance of the cell being a wall.
+        lava_chance: The chance of an open cell being lava.
+    """
+    if rng.random() < wall_chance:
+        return BLOCKED
+    return 1 + LAVA_DAMAGE if rng.random() < lava_chance else 1
+
+
+def make_level(rows: list[str]) -> Level:
+    """ Returns a level read from its rows, as in a game file.
+
+    Parameters:
+        rows: The tile and entity IDs of each row.
+    """
+    level = Level((len(rows), len(rows[0])))
+    for row in rows:
+        level.add_row(row)
+    return level
+
+
+def random_level(rng: random.Random, dimensions: tuple[int, int]) -> Level:
+    """ Returns a level of randomly scattered walls, lava, doors and items,
+        with the player somewhere on it.
+
+    Parameters:
+        rng: The random generator to use.
+        dimensions: The (#rows, #columns) of the level.
+    """
+    rows, cols = dimensions
+    ids = (WALL, EMPTY, LAVA, DOOR, COIN, APPLE, WATER)
+    weights = (30, 50, 8, 2, 4, 3, 3)
+    grid = [rng.choices(ids, weights, k=cols) for _ in range(rows)]
+    grid[rng.randrange(rows)][rng.randrange(cols)] = PLAYER
+    return make_level([''.join(row) for row in grid])
+
+
+def dijkstra(
+    costs: list[int],
+    dimensions: tuple[int, int],
+    target: int
+) -> list[int]:
+    """ Returns the cost of the cheapest path from every cell to the target, or
+        UNREACHABLE, with a textbook Dijkstra's algorithm over the cells.
+
+    Parameters:
+        costs: The cost of stepping onto each cell, or BLOCKED.
+        dimensions: The (#rows, #columns) of the maze.
+        target: The index of the target cell.
+    """
+    rows, cols = dimensions
+    distances = [UNREACHABLE] * (rows * cols)
+    if costs[target] == BLOCKED:
+        return distances
+    distances[target] = 0
+    queue = [(0, target)]
+    while queue:
+        distance, index = heapq.heappop(queue)
+        if distance != distances[index]:
+            continue
+        row, col = divmod(index, cols)
+        for d_row, d_col in MOVE_DELTAS.values():
+            other_row, other_col = row + d_row, col + d_col
+            if not (0 <= other_row < rows and 0 <= other_col < cols):
+                continue
+            other = other_row * cols + other_col
+            # Walking from other onto index costs index's cost
+            new = distance + costs[index]
+            if costs[other] != BLOCKED and (distances[other] == UNREACHABLE
+                                            or new < distances[other]):
+                distances[other] = new
+                heapq.heappush(queue, (new, other))
+    return distances
+
+
+def flood(
+    passable: set[tuple[int, int]],
+    seeds: list[tuple[int, int]]
+) -> set[tuple[int, int]]:
+    """ Returns the cells that can be reached from some cells, with a textbook
+        breadth first search.
+
+    Parameters:
+        passable: The (row, column) positions that can be walked through.
+        seeds: The positions to start from. Impassable ones are ignored.
+    """
+    reached = {seed for seed in seeds if seed in passable}
+    queue = deque(reached)
+    while queue:
+        row, col = queue.popleft()
+        for d_row, d_col in MOVE_DELTAS.values():
+            other = (row + d_row, col + d_col)
+            if other in passable and other not in reached:
+                reached.add(other)
+                queue.append(other)
+    return reached
@@ -0,0 +1,70 @@
+""" Randomized checks of CorridorGraph queries against a plain Dijkstra's
+    algorithm over every cell.
+"""
+import random
+import unittest
+
+from benchmark import generate_maze
+from corridor import CorridorGraph
+from helpers import dijkstra, make_level, random_level
+from pathfinding import cell_costs, BLOCKED, UNREACHABLE
+
+
+class CorridorGraphTest(unittest.TestCase):
+    """ The graph finds the cheapest paths between random cells, treating
+        doors as open.
+    """
+    def _check_level(self, level, rng: random.Random) -> None:
+        """ Checks get_distance and find_path between random pairs of cells
+            of a level.
+
+        Parameters:
+            level: The level to check.
+            rng: The random generator to use.
+        """
+        maze = level.get_maze()
+        dimensions = rows, cols = maze.get_dimensions()
+        costs = cell_costs(maze)
+        for row, col in maze.get_doors():
+            costs[row * cols + col] = 1
+        graph = CorridorGraph(level)
+        for _ in range(20):
+            start = (rng.randrange(rows), rng.randrange(cols))
+            target = (rng.randrange(rows), rng.randrange(cols))
+            expected = dijkstra(costs, dimensions,
+                                target[0] * cols + target[1])
+            expected = expected[start[0] * cols + start[1]]
+            distance = graph.get_distance(start, target)
+            path = graph.find_path(start, target)
+            if expected == UNREACHABLE or \
+                    costs[start[0] * cols + start[1]] == BLOCKED:
+                self.assertIsNone(distance)
+                self.assertEqual(path, [])
+                continue
+            steps, damage = distance
+            self.assertEqual(steps + damage, expected)
+            self.assertEqual(len(path), steps)
+            if start == target:
+                continue
+            self.assertEqual(path[-1], target)
+            for previous, position in zip([start] + path, path):
+                self.assertEqual(abs(previous[0] - position[0])
+                                 + abs(previous[1] - position[1]), 1)
+            self.assertEqual(sum(costs[row * cols + col] for row, col in path),
+                             expected)
+
+    def test_random_levels(self) -> None:
+        rng = random.Random(0)
+        for _ in range(40):
+            level = random_level(rng, (rng.randint(1, 15), rng.randint(1, 15)))
+            self._check_level(level, rng)
+
+    def test_generated_mazes(self) -> None:
+        rng = random.Random(1)
+        for seed in range(10):
+            rows = generate_maze(rng.randint(5, 31), rng.randint(5, 31), seed)
+            self._check_level(make_level(rows), rng)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+""" Randomized checks of HierarchicalPathService against a plain Dijkstra's
+    algorithm over every cell. Its paths are near-cheapest rather than
+    cheapest, so they are checked to be real paths costing what get_distance
+    says, and no less than the cheapest.
+"""
+import random
+import unittest
+
+from benchmark import generate_maze
+from helpers import dijkstra, make_level, random_level
+from hpa import HierarchicalPathService
+from pathfinding import cell_costs, UNREACHABLE
+
+
+class HierarchicalPathServiceTest(unittest.TestCase):
+    """ The service finds a path between two cells iff there is one. """
+    def _check_level(
+        self,
+        level,
+        service: HierarchicalPathService,
+        rng: random.Random
+    ) -> None:
+        """ Checks get_distance and find_path between random pairs of cells
+            of a level.
+
+        Parameters:
+            level: The level the service finds paths through.
+            service: The service to check.
+            rng: The random generator to use.
+        """
+        maze = level.get_maze()
+        dimensions = rows, cols = maze.get_dimensions()
+        costs = cell_costs(maze)
+        for _ in range(20):
+            start = (rng.randrange(rows), rng.randrange(cols))
+            target = (rng.randrange(rows), rng.randrange(cols))
+            expected = dijkstra(costs, dimensions,
+                                target[0] * cols + target[1])
+            expected = expected[start[0] * cols + start[1]]
+            distance = service.get_distance(start, target)
+            path = service.find_path(start, target)
+            if expected == UNREACHABLE:
+                self.assertIsNone(distance)
+                self.assertIsNone(path)
+                continue
+            self.assertGreaterEqual(distance, expected)
+            if start == target:
+                self.assertEqual(path, [])
+                continue
+            self.assertEqual(path[-1], target)
+            for previous, position in zip([start] + path, path):
+                self.assertEqual(abs(previous[0] - position[0])
+                                 + abs(previous[1] - position[1]), 1)
+            self.assertEqual(sum(costs[row * cols + col] for row, col in path),
+                             distance)
+
+    def test_random_levels(self) -> None:
+        rng = random.Random(0)
+        for _ in range(40):
+            level = random_level(rng, (rng.randint(1, 20), rng.randint(1, 20)))
+            service = HierarchicalPathService(level, rng.randint(2, 6))
+            self._check_level(level, service, rng)
+
+    def test_generated_mazes(self) -> None:
+        rng = random.Random(1)
+        for seed in range(10):
+            rows = generate_maze(rng.randint(5, 41), rng.randint(5, 41), seed)
+            level = make_level(rows)
+            service = HierarchicalPathService(level, rng.randint(3, 8))
+            if seed % 2:
+                service.prepare()
+            self._check_level(level, service, rng)
+
+    def test_doors_unlocking(self) -> None:
+        rng = random.Random(2)
+        for _ in range(20):
+            level = random_level(rng, (rng.randint(2, 20), rng.randint(2, 20)))
+            service = HierarchicalPathService(level, rng.randint(2, 6))
+            self._check_level(level, service, rng)
+            level.get_maze().unlock_door()
+            self._check_level(level, service, rng)
+
+
+if __name__ == '__main__':
+    unittest.main()
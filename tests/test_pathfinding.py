@@ -0,0 +1,82 @@
+""" Randomized checks of the distance fields in pathfinding.py against a
+    plain Dijkstra's algorithm and against full recomputation.
+"""
+import random
+import unittest
+
+from helpers import dijkstra, random_cost, random_costs
+from pathfinding import DynamicDistanceField, distance_field, BLOCKED
+
+
+class DistanceFieldTest(unittest.TestCase):
+    """ distance_field finds the same distances as Dijkstra's algorithm. """
+    def test_matches_dijkstra(self) -> None:
+        rng = random.Random(0)
+        for _ in range(50):
+            dimensions = (rng.randint(1, 12), rng.randint(1, 12))
+            costs = random_costs(rng, dimensions)
+            target = rng.randrange(len(costs))
+            self.assertEqual(distance_field(costs, dimensions, target),
+                             dijkstra(costs, dimensions, target))
+
+
+class DynamicDistanceFieldTest(unittest.TestCase):
+    """ Repairing a field after cells change gives the same distances as
+        computing it again from scratch.
+    """
+    def _check_repairs(
+        self,
+        seed: int,
+        max_changes: int,
+        wall_chance: float
+    ) -> None:
+        """ Changes random cells of random mazes, checking the field after
+            each batch of changes.
+
+        Parameters:
+            seed: The seed for the random generator.
+            max_changes: The most cells changed in one batch.
+            wall_chance: The chance of a cell being (or becoming) a wall.
+        """
+        rng = random.Random(seed)
+        for _ in range(30):
+            dimensions = rows, cols = (rng.randint(2, 15), rng.randint(2, 15))
+            costs = random_costs(rng, dimensions, wall_chance)
+            target = rng.randrange(rows * cols)
+            costs[target] = 1
+            field = DynamicDistanceField(costs, dimensions, target)
+            for _ in range(20):
+                old_costs = {}
+                for _ in range(rng.randint(1, max_changes)):
+                    index = rng.randrange(rows * cols)
+                    if index == target:
+                        continue
+                    old_costs.setdefault(index, costs[index])
+                    costs[index] = random_cost(rng, wall_chance)
+                field.update(old_costs)
+                self.assertEqual(field.get_distances(),
+                                 distance_field(costs, dimensions, target))
+
+    def test_single_changes(self) -> None:
+        self._check_repairs(1, 1, 0.3)
+
+    def test_batched_changes(self) -> None:
+        self._check_repairs(2, 8, 0.3)
+
+    def test_open_mazes(self) -> None:
+        self._check_repairs(3, 4, 0.1)
+
+    def test_closed_mazes(self) -> None:
+        self._check_repairs(4, 4, 0.5)
+
+    def test_blocked_target(self) -> None:
+        costs = [1, BLOCKED, 1, 1]
+        field = DynamicDistanceField(costs, (2, 2), 1)
+        costs[0] = BLOCKED
+        field.update({0: 1})
+        self.assertEqual(field.get_distances(),
+                         distance_field(costs, (2, 2), 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
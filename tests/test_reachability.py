@@ -0,0 +1,59 @@
+""" Randomized checks of Bitboard flood fills against a plain breadth first
+    search.
+"""
+import random
+import unittest
+
+from benchmark import generate_maze
+from helpers import flood, make_level, random_level
+from reachability import Bitboard
+
+
+class BitboardFloodTest(unittest.TestCase):
+    """ A flood fill reaches the same cells as a breadth first search. """
+    def _check_level(self, level, rng: random.Random) -> None:
+        """ Floods a level from random cells, through its open cells and
+            through random subsets of them.
+
+        Parameters:
+            level: The level to check.
+            rng: The random generator to use.
+        """
+        maze = level.get_maze()
+        rows, cols = maze.get_dimensions()
+        board = Bitboard(maze)
+        open_cells = {(row, col) for row in range(rows) for col in range(cols)
+                      if not maze.get_tile((row, col)).is_blocking()}
+        self.assertEqual(set(board.unpack(board.get_open())), open_cells)
+        for _ in range(10):
+            seeds = [(rng.randrange(rows), rng.randrange(cols))
+                     for _ in range(rng.randint(1, 3))]
+            self.assertEqual(set(board.unpack(board.flood(board.pack(seeds)))),
+                             flood(open_cells, seeds))
+            passable = {cell for cell in open_cells if rng.random() < 0.8}
+            reached = board.flood(board.pack(seeds), board.pack(passable))
+            self.assertEqual(set(board.unpack(reached)),
+                             flood(passable, seeds))
+
+    def test_random_levels(self) -> None:
+        rng = random.Random(0)
+        for _ in range(40):
+            level = random_level(rng, (rng.randint(1, 20), rng.randint(1, 20)))
+            self._check_level(level, rng)
+
+    def test_wide_levels(self) -> None:
+        rng = random.Random(1)
+        for _ in range(10):
+            level = random_level(rng, (rng.randint(1, 10),
+                                       rng.randint(60, 200)))
+            self._check_level(level, rng)
+
+    def test_generated_mazes(self) -> None:
+        rng = random.Random(2)
+        for seed in range(10):
+            rows = generate_maze(rng.randint(5, 41), rng.randint(5, 101), seed)
+            self._check_level(make_level(rows), rng)
+
+
+if __name__ == '__main__':
+    unittest.main()